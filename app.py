@@ -1,13 +1,43 @@
-from flask import Flask, jsonify, render_template
-from database import db
-from services import AnalyticsService
+from flask import Flask, Response, has_request_context, jsonify, render_template, request, url_for
+from sqlalchemy import func
+from database import db, ensure_schema, file_lock
+from services import AnalyticsService, FeishuSyncService, FeishuAnalyticsService, LiveAnalyticsService, IngestionService, RollupService
 from feishu_service import FeishuSheetService
+from feishu_async import AsyncFeishuSheetService
+from feishu_scheduler import INTERACTIVE, BACKGROUND
+from sheet_refresher import EventBroker, SheetRefresher, StreamLimitReached
+from sheet_cache import SheetCache
+from sheet_snapshot import SnapshotStore
+from sheet_delta import SheetDeltaLog
+from drop_ingest import DropIngestor, SETTLE_SECONDS
+from migrations import upgrade_schema, schema_current
+from http_cache import conditional, compress_response
+from record_stream import StaleCursor, decode_cursor, dumps, encode_cursor, ndjson_lines, BATCH_ROWS
+from models import DailySales
+import metrics
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import click
 import os
+import threading
 
 # --- Configuration ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Renamed from hubway.db to ecommerce.db to match new scope
-DB_PATH = os.path.join(BASE_DIR, 'ecommerce.db')
+DB_PATH = os.environ.get('ECOMMERCE_DB_PATH') or os.path.join(BASE_DIR, 'ecommerce.db')
+# Serializes ingestion across CLI runs
+DB_LOCK_PATH = DB_PATH + '.lock'
+# Serializes schema setup across gunicorn workers / CLI runs; separate from the
+# ingest lock, so a worker (re)starting during a long import is not held up
+DB_SCHEMA_LOCK_PATH = DB_PATH + '.schema.lock'
+# Serializes FeishuSyncService.sync_sheet across workers (separate from the ingest lock,
+# so a long import never holds up a sheet refresh)
+FEISHU_SYNC_LOCK_PATH = DB_PATH + '.sync.lock'
+DEFAULT_EXCEL_PATH = os.path.join(BASE_DIR, '新建 Microsoft Excel 工作表 (2).xlsx')
+# `flask ingest-dir`: every new workbook dropped here is imported once (deduplicated by content)
+INGEST_DIR = os.environ.get('INGEST_DIR') or os.path.join(BASE_DIR, 'drop')
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 0))  # parser processes, 0 = one per CPU
 
 # Feishu Configuration
 FEISHU_APP_ID = "cli_a9c019d701b8dbc9"
@@ -16,6 +46,47 @@ FEISHU_SPREADSHEET_TOKEN = "HgC9sb5EPhNPFbterr9cr64onyh"
 FEISHU_SHEET_ID = "80e00b"  # 商品销售数据
 FEISHU_LIVE_SHEET_ID = "lCypKc"  # 直播间数据
 
+# Sheets are read in row blocks of FEISHU_CHUNK_ROWS, up to FEISHU_MAX_WORKERS in parallel
+FEISHU_CHUNK_ROWS = int(os.environ.get('FEISHU_CHUNK_ROWS', 1000))
+FEISHU_MAX_WORKERS = int(os.environ.get('FEISHU_MAX_WORKERS', 4))
+
+# Mirror Feishu sheets into SQLite (FeishuSyncService) and serve the dashboards from there
+FEISHU_SYNC_ENABLED = os.environ.get('FEISHU_SYNC_ENABLED', '0') == '1'
+
+# Column schema per sheet; the aggregate routes only fetch these columns
+# (the raw /data routes still read every column)
+SHEET_SCHEMAS = {
+    FEISHU_SHEET_ID: FeishuAnalyticsService.SCHEMA,
+    FEISHU_LIVE_SHEET_ID: LiveAnalyticsService.SCHEMA,
+}
+
+# Browser cache hint (Cache-Control max-age) for the JSON APIs; clients revalidate with ETags after that
+API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 30))
+
+# Sheet cache: fresh for TTL seconds, then served stale while one background refresh runs
+FEISHU_CACHE_TTL = int(os.environ.get('FEISHU_CACHE_TTL', 300))
+FEISHU_CACHE_MAX_ENTRIES = int(os.environ.get('FEISHU_CACHE_MAX_ENTRIES', 32))
+
+# Background refresh of all configured sheets (seconds, 0 = off, the default); dashboards get
+# pushes over SSE. Each worker only polls while it has SSE subscribers
+FEISHU_REFRESH_INTERVAL = int(os.environ.get('FEISHU_REFRESH_INTERVAL', 0))
+# Each SSE stream holds a server thread: keep the cap below gunicorn --threads (16 in the Procfile)
+# so the JSON APIs always have threads left; streams close after SSE_MAX_LIFETIME seconds and reconnect
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 8))
+SSE_MAX_LIFETIME = int(os.environ.get('SSE_MAX_LIFETIME', 300))
+SSE_RETRY_AFTER = int(os.environ.get('SSE_RETRY_AFTER', 30))
+
+# Analytics query backend: sqlite (default, app database) or duckdb (Parquet export of daily_sales)
+ANALYTICS_BACKEND = os.environ.get('ANALYTICS_BACKEND', 'sqlite')
+ANALYTICS_PARQUET_PATH = os.environ.get('ANALYTICS_PARQUET_PATH') or os.path.join(BASE_DIR, 'analytics', 'daily_sales.parquet')
+
+# Trend charts are downsampled to about this many points (?points= overrides, 0 = every point)
+TREND_MAX_POINTS = int(os.environ.get('TREND_MAX_POINTS', 1000))
+
+# Every successful sheet load is persisted here; workers start from it and keep
+# serving it while Feishu is unreachable
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(BASE_DIR, 'snapshots')
+
 app = Flask(__name__)
 # SQLAlchemy Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
@@ -23,15 +94,186 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize DB
 db.init_app(app)
+AnalyticsService.configure(ANALYTICS_BACKEND, parquet_path=ANALYTICS_PARQUET_PATH)
+
+# Per-stage timings -> Server-Timing header + /metrics (first, so later hooks are timed too)
+metrics.init_app(app)
+
+# Schema setup is lazy (first request per worker); Excel ingestion only runs
+# through the `flask ingest` command, never inside the web process
+@app.before_request
+def _ensure_schema():
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+
+app.after_request(compress_response)
+
+sheet_cache = SheetCache(ttl=FEISHU_CACHE_TTL, max_entries=FEISHU_CACHE_MAX_ENTRIES)
+snapshots = SnapshotStore(SNAPSHOT_DIR)
+# One writer thread: snapshots never slow down the request that loaded the sheet
+snapshot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+
+# Row hashes of recent versions of each sheet, for ?since= deltas on the /data routes
+# (kept next to the snapshots so every worker can diff against a version another one served)
+sheet_deltas = SheetDeltaLog(FeishuSyncService.ROW_KEY_COLUMNS, root=os.path.join(SNAPSHOT_DIR, 'row_hashes'))
+
+def sync_lock():
+    return file_lock(FEISHU_SYNC_LOCK_PATH)
+
+def sheet_key(sheet_id, projected=True):
+    schema = SHEET_SCHEMAS.get(sheet_id, ())
+    columns = tuple(spec.name for spec in schema) if projected and schema else None
+    return (FEISHU_SPREADSHEET_TOKEN, sheet_id, columns or '*')
+
+def save_snapshot(key, table, revision=None):
+    def write():
+        try:
+            with metrics.span('snapshot'):
+                snapshots.save(key, table, revision)
+        except Exception as e:
+            print(f"⚠️ Could not save snapshot for {key[1]}: {e}")
+    snapshot_writer.submit(write)
+
+_snapshots_seeded = False
+_seed_lock = threading.Lock()
+
+def seed_from_snapshots():
+    """
+    Serve the last snapshots right away (stale, so the first request refreshes in the background).
+    Once per worker, from the gunicorn post_worker_init hook (gunicorn.conf.py) or before
+    the dev server starts: CLI commands never load them.
+    """
+    global _snapshots_seeded
+    if _snapshots_seeded:
+        return
+    with _seed_lock:
+        if _snapshots_seeded:
+            return
+        for sheet_id in SHEET_SCHEMAS:
+            full = snapshots.load(sheet_key(sheet_id, projected=False))
+            projected = snapshots.load(sheet_key(sheet_id)) or full
+            for key, table in ((sheet_key(sheet_id, projected=False), full), (sheet_key(sheet_id), projected)):
+                if table is not None:
+                    sheet_cache.seed(key, table)
+                    metrics.SHEET_ROWS.set(len(table), sheet_id=sheet_id)
+                    print(f"📋 Serving snapshot of {sheet_id} ({len(table)} rows, revision {table.revision})")
+        _snapshots_seeded = True
+
+def load_sheet_table(sheet_id, projected=True):
+    """读取并解析飞书表格为列式 SheetTable (进程级缓存, 所有路由共享同一份数据)"""
+    schema = SHEET_SCHEMAS.get(sheet_id, ())
+    key = sheet_key(sheet_id, projected)
+    columns = None if key[2] == '*' else key[2]
+
+    def loader():
+        # A page waiting on a cache miss goes ahead of stale-refreshes queued for the rate limit
+        priority = INTERACTIVE if has_request_context() else BACKGROUND
+        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET, chunk_rows=FEISHU_CHUNK_ROWS,
+                                    max_workers=FEISHU_MAX_WORKERS, priority=priority)
+        if FEISHU_SYNC_ENABLED:
+            # Cache refreshes run outside the request, so push an app context
+            with app.app_context():
+                status = FeishuSyncService.sync_sheet(feishu, FEISHU_SPREADSHEET_TOKEN, sheet_id, lock=sync_lock)
+                table = load_mirror_table(key, status, schema)
+            revision = status.get("revision")
+        else:
+            raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, sheet_id, columns=columns)
+            table = feishu.parse_to_table(raw_data, schema)
+            revision = feishu.last_revision
+        metrics.SHEET_ROWS.set(len(table), sheet_id=sheet_id)
+        save_snapshot(key, table, revision)
+        return table
+    return sheet_cache.get(key, loader)
 
-# Auto-Import Logic
-with app.app_context():
-    db.create_all() # Ensure tables exist
-    
-    # Try importing Excel
-    from services import IngestionService
-    excel_path = os.path.join(BASE_DIR, '新建 Microsoft Excel 工作表 (2).xlsx')
-    IngestionService.import_excel_if_empty(excel_path)
+def load_mirror_table(key, status, schema):
+    """
+    The SheetTable for a synced sheet: the cached one while the mirror is still at
+    its revision (a refresh then costs one metainfo request, no SQLite read),
+    otherwise the mirror's rows loaded into a new table. Call in an app context.
+    """
+    revision = status.get("revision")
+    cached = sheet_cache.peek(key)
+    if revision is not None and getattr(cached, 'mirror_revision', None) == revision:
+        return cached
+    columns = None if key[2] == '*' else key[2]
+    table = FeishuSyncService.load_table(key[0], key[1], schema, columns)
+    table.mirror_revision = revision
+    return table
+
+# --- Background refresh + SSE push ---
+
+SHEET_DASHBOARDS = {FEISHU_SHEET_ID: 'feishu', FEISHU_LIVE_SHEET_ID: 'live'}
+
+def fetch_sheet_tables():
+    """
+    All configured sheets in one batched read (values_batch_get), or from the
+    SQLite mirror: {sheet_id: (table, revision)}
+    """
+    if FEISHU_SYNC_ENABLED:
+        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET, chunk_rows=FEISHU_CHUNK_ROWS,
+                                    max_workers=FEISHU_MAX_WORKERS, priority=BACKGROUND)
+        tables = {}
+        with app.app_context():
+            for sheet_id, schema in SHEET_SCHEMAS.items():
+                status = FeishuSyncService.sync_sheet(feishu, FEISHU_SPREADSHEET_TOKEN, sheet_id, lock=sync_lock)
+                table = load_mirror_table(sheet_key(sheet_id, projected=False), status, schema)
+                tables[sheet_id] = (table, status.get("revision"))
+        return tables
+
+    async def read_all():
+        async with AsyncFeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET, chunk_rows=FEISHU_CHUNK_ROWS,
+                                           priority=BACKGROUND) as client:
+            return await client.read_sheets(FEISHU_SPREADSHEET_TOKEN, list(SHEET_SCHEMAS))
+
+    parser = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
+    sheets, revision = asyncio.run(read_all())
+    return {
+        sheet_id: (parser.parse_to_table(raw_data, SHEET_SCHEMAS[sheet_id]), revision)
+        for sheet_id, raw_data in sheets.items()
+        if raw_data
+    }
+
+def refresh_dashboards():
+    """Refresh the sheet cache once and compute each sheet dashboard's panels"""
+    results = {}
+    for sheet_id, (table, revision) in fetch_sheet_tables().items():
+        # The full table also serves the projected (aggregate) routes
+        sheet_cache.put(sheet_key(sheet_id, projected=False), table)
+        sheet_cache.put(sheet_key(sheet_id), table)
+        metrics.SHEET_ROWS.set(len(table), sheet_id=sheet_id)
+        save_snapshot(sheet_key(sheet_id, projected=False), table, revision)
+        sheet_deltas.record(sheet_id, table)
+        name = SHEET_DASHBOARDS[sheet_id]
+        service = FeishuAnalyticsService if name == 'feishu' else LiveAnalyticsService
+        results[name] = (table.version, service.get_dashboard(table, points=TREND_MAX_POINTS))
+    return results
+
+dashboard_events = EventBroker(max_streams=SSE_MAX_STREAMS, max_lifetime=SSE_MAX_LIFETIME)
+sheet_refresher = SheetRefresher(refresh_dashboards, dashboard_events, interval=FEISHU_REFRESH_INTERVAL)
+
+# --- Data versions (ETag / Last-Modified) ---
+
+def sales_version(**_):
+    """daily_sales max id + database file mtime (changes on every committed write) + backend export"""
+    max_id = db.session.query(func.max(DailySales.id)).scalar() or 0
+    stat = os.stat(DB_PATH)
+    return f"sales-{max_id}-{stat.st_mtime_ns}-{AnalyticsService.backend.version()}", stat.st_mtime
+
+def sheet_version(sheet_id, projected=True):
+    def version_fn(**_):
+        table = load_sheet_table(sheet_id, projected)
+        return table.version, table.modified_at
+    return version_fn
+
+def dashboard_version(name):
+    if name == 'feishu':
+        return sheet_version(FEISHU_SHEET_ID)()
+    if name == 'live':
+        return sheet_version(FEISHU_LIVE_SHEET_ID)()
+    return sales_version()
+
+def analysis_version(**_):
+    """compare / rolling: version of the ?source= data"""
+    return dashboard_version(request.args.get('source') or 'sales')
 
 # --- Routes ---
 
@@ -54,137 +296,289 @@ def dashboard_feishu_test():
 
 @app.route('/dashboard/live')
 def dashboard_live():
-    return render_template('dashboard_live.html', active_page='live')
+    # No refresher, no stream: the page then doesn't try to connect
+    return render_template('dashboard_live.html', active_page='live', live_updates=FEISHU_REFRESH_INTERVAL > 0)
 
 # --- Sales Analysis Routes ---
 
+def sales_filters():
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD&category=... (all optional)"""
+    filters = {"category": request.args.get('category') or None}
+    for key in ('start', 'end'):
+        value = request.args.get(key)
+        filters[key] = date.fromisoformat(value) if value else None
+    return filters
+
+def trend_options():
+    """?points=N (默认 TREND_MAX_POINTS, 0 = 不降采样)&downsample=lttb|minmax"""
+    points = int(request.args.get('points') or TREND_MAX_POINTS)
+    if points < 0:
+        raise ValueError("points must be >= 0")
+    return {"points": points, "method": request.args.get('downsample') or 'lttb'}
+
 @app.route('/api/sales/overview')
+@conditional(sales_version, max_age=API_CACHE_MAX_AGE)
 def get_sales_overview():
     try:
-        data = AnalyticsService.get_sales_overview()
+        data = AnalyticsService.get_sales_overview(**sales_filters())
         return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sales/trend')
+@conditional(sales_version, max_age=API_CACHE_MAX_AGE)
 def get_sales_trend():
     try:
-        data = AnalyticsService.get_sales_trend()
+        data = AnalyticsService.get_sales_trend(**sales_filters(), **trend_options())
         return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sales/funnel')
+@conditional(sales_version, max_age=API_CACHE_MAX_AGE)
 def get_sales_funnel():
     try:
-        data = AnalyticsService.get_sales_funnel()
+        data = AnalyticsService.get_sales_funnel(**sales_filters())
         return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/service/metrics')
+@conditional(sales_version, max_age=API_CACHE_MAX_AGE)
 def get_service_metrics():
     try:
-        data = AnalyticsService.get_service_metrics()
+        data = AnalyticsService.get_service_metrics(**sales_filters())
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- Period-over-period / rolling window (computed server-side, one small response) ---
+
+ANALYSIS_SOURCES = ('sales', 'feishu', 'live')
+
+def analysis_source():
+    """?source=sales (daily_sales, default) | feishu | live (cached sheets; category is ignored)"""
+    source = request.args.get('source') or 'sales'
+    if source not in ANALYSIS_SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+    return source
+
+@app.route('/api/sales/compare')
+@conditional(analysis_version, max_age=API_CACHE_MAX_AGE)
+def get_sales_compare():
+    """环比: ?grain=day|week|month (默认 week)&lag=1 (同比: lag=52 周 / 12 月) + start/end/category/source"""
+    try:
+        source = analysis_source()
+        grain = request.args.get('grain') or 'week'
+        lag = int(request.args.get('lag') or 1)
+        filters = sales_filters()
+        if source == 'feishu':
+            data = FeishuAnalyticsService.get_comparison(
+                load_sheet_table(FEISHU_SHEET_ID), grain, lag, filters['start'], filters['end'])
+        elif source == 'live':
+            data = LiveAnalyticsService.get_comparison(
+                load_sheet_table(FEISHU_LIVE_SHEET_ID), grain, lag, filters['start'], filters['end'])
+        else:
+            data = AnalyticsService.get_period_comparison(grain, lag, **filters)
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/sales/rolling')
+@conditional(analysis_version, max_age=API_CACHE_MAX_AGE)
+def get_sales_rolling():
+    """滚动窗口: ?window=7 (天) + start/end/category/source"""
+    try:
+        source = analysis_source()
+        window = int(request.args.get('window') or 7)
+        filters = sales_filters()
+        if source == 'feishu':
+            data = FeishuAnalyticsService.get_rolling(
+                load_sheet_table(FEISHU_SHEET_ID), window, filters['start'], filters['end'])
+        elif source == 'live':
+            data = LiveAnalyticsService.get_rolling(
+                load_sheet_table(FEISHU_LIVE_SHEET_ID), window, filters['start'], filters['end'])
+        else:
+            data = AnalyticsService.get_rolling(window, **filters)
         return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# =============================================
+# 看板聚合 API (one request per dashboard page)
+# =============================================
+
+DASHBOARD_PANELS = {
+    'sales': AnalyticsService.PANELS,
+    'feishu': FeishuAnalyticsService.PANELS,
+    'live': LiveAnalyticsService.PANELS,
+}
+
+@app.route('/api/dashboard/<name>')
+@conditional(dashboard_version, max_age=API_CACHE_MAX_AGE)
+def get_dashboard(name):
+    """看板全部面板一次返回: ?panels=overview,trend,... (默认全部), 趋势面板按 ?points= 降采样"""
+    if name not in DASHBOARD_PANELS:
+        return jsonify({"error": f"Unknown dashboard: {name}"}), 404
+
+    requested = request.args.get('panels')
+    panels = tuple(p for p in requested.split(',') if p) if requested else DASHBOARD_PANELS[name]
+    unknown = [p for p in panels if p not in DASHBOARD_PANELS[name]]
+    if unknown:
+        return jsonify({"error": f"Unknown panels for {name}: {', '.join(unknown)}"}), 400
+
+    try:
+        if name == 'sales':
+            data = AnalyticsService.get_dashboard(panels, **sales_filters(), **trend_options())
+        elif name == 'feishu':
+            data = FeishuAnalyticsService.get_dashboard(load_sheet_table(FEISHU_SHEET_ID), panels, **trend_options())
+        else:
+            data = LiveAnalyticsService.get_dashboard(load_sheet_table(FEISHU_LIVE_SHEET_ID), panels, **trend_options())
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dashboard/<name>/stream')
+def stream_dashboard(name):
+    """SSE: 'snapshot' (all panels) on connect, then 'delta' events with only the changed panels"""
+    if name not in SHEET_DASHBOARDS.values():
+        return jsonify({"error": f"No live updates for dashboard: {name}"}), 404
+    if FEISHU_REFRESH_INTERVAL <= 0:
+        return jsonify({"error": "Background refresh is disabled (FEISHU_REFRESH_INTERVAL=0)"}), 404
+
+    try:
+        events = dashboard_events.stream(name)
+    except StreamLimitReached:
+        # Full: tell the client when to come back instead of queueing for a thread
+        response = Response(f"retry: {SSE_RETRY_AFTER * 1000}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(SSE_RETRY_AFTER)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # The refresher only polls Feishu while this worker has subscribers
+    sheet_refresher.ensure_started()
+    sheet_refresher.wake()
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def sheet_records(sheet_id):
+    """
+    原始数据: ?columns=a,b&limit=N&cursor=...&format=ndjson (all optional, default: every row as one JSON array).
+    The next page is announced in X-Next-Cursor / Link headers, the row count in X-Total-Count;
+    NDJSON (also via Accept: application/x-ndjson) is encoded and sent in batches from the
+    cached table (a cache miss still reads and parses the whole sheet first).
+
+    ?since=<revision> returns only the rows inserted / updated / deleted since then
+    (see SheetDeltaLog.delta; an empty or unknown revision resets with every row).
+    The current revision is in the X-Sheet-Revision header of every response.
+    """
+    table = load_sheet_table(sheet_id, projected=False)
+    columns = [c for c in (request.args.get('columns') or '').split(',') if c] or None
+    unknown = [c for c in columns or () if c not in table.raw]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    if 'since' in request.args:
+        if request.args.get('limit') or request.args.get('cursor'):
+            raise ValueError("since cannot be combined with limit / cursor")
+        with metrics.span('delta'):
+            delta = sheet_deltas.delta(sheet_id, table, request.args['since'], columns)
+        with metrics.span('serialize'):
+            response = Response(dumps(delta), mimetype='application/json')
+        response.headers['X-Sheet-Revision'] = table.version
+        return response
+    # Later ?since= polls diff against the version served now
+    sheet_deltas.record(sheet_id, table)
+
+    limit = int(request.args['limit']) if request.args.get('limit') else None
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be >= 1")
+    start = decode_cursor(request.args.get('cursor'), table.version)
+    stop = table.length if limit is None else min(start + limit, table.length)
+
+    batches = table.iter_records(columns, start, stop, batch_rows=BATCH_ROWS)
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        response = Response(ndjson_lines(batches), mimetype='application/x-ndjson')
+    else:
+        with metrics.span('serialize'):
+            body = dumps([record for batch in batches for record in batch])
+        response = Response(body, mimetype='application/json')
+
+    response.headers['X-Total-Count'] = str(table.length)
+    response.headers['X-Sheet-Revision'] = table.version
+    if stop < table.length:
+        cursor = encode_cursor(table.version, stop)
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **{**request.args, "cursor": cursor})}>; rel="next"'
+    return response
+
 @app.route('/api/feishu/data')
+@conditional(sheet_version(FEISHU_SHEET_ID, projected=False), max_age=API_CACHE_MAX_AGE)
 def get_feishu_data():
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        return jsonify(parsed_data)
+        return sheet_records(FEISHU_SHEET_ID)
+    except StaleCursor as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/feishu/overview')
+@conditional(sheet_version(FEISHU_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_feishu_overview():
     """飞书数据 - KPI 概览"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        # Calculate KPIs
-        total_sales = sum(float(str(row.get('支付金额', 0)).replace(',', '')) for row in parsed_data if row.get('支付金额'))
-        total_visitors = sum(int(float(str(row.get('访客数', 0)).replace(',', ''))) for row in parsed_data if row.get('访客数'))
-        total_orders = sum(int(float(str(row.get('支付子订单数', 0)).replace(',', ''))) for row in parsed_data if row.get('支付子订单数'))
-        
-        return jsonify({
-            "total_sales": round(total_sales, 2),
-            "total_visitors": total_visitors,
-            "total_orders": total_orders
-        })
+        table = load_sheet_table(FEISHU_SHEET_ID)
+        return jsonify(FeishuAnalyticsService.get_overview(table))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/feishu/trend')
+@conditional(sheet_version(FEISHU_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_feishu_trend():
     """飞书数据 - 趋势图"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        # Group by date
-        from collections import defaultdict
-        daily = defaultdict(lambda: {"sales": 0, "visitors": 0})
-        
-        for row in parsed_data:
-            date = str(row.get('日期', ''))
-            if date:
-                sales = float(str(row.get('支付金额', 0)).replace(',', '')) if row.get('支付金额') else 0
-                visitors = int(float(str(row.get('访客数', 0)).replace(',', ''))) if row.get('访客数') else 0
-                daily[date]["sales"] += sales
-                daily[date]["visitors"] += visitors
-        
-        # Sort by date
-        result = [{"date": k, "sales": v["sales"], "visitors": v["visitors"]} for k, v in sorted(daily.items())]
-        return jsonify(result)
+        table = load_sheet_table(FEISHU_SHEET_ID)
+        return jsonify(FeishuAnalyticsService.get_trend(table, **trend_options()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/feishu/funnel')
+@conditional(sheet_version(FEISHU_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_feishu_funnel():
     """飞书数据 - 转化漏斗"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        total_visitors = sum(int(float(str(row.get('访客数', 0)).replace(',', ''))) for row in parsed_data if row.get('访客数'))
-        total_cart = sum(int(float(str(row.get('加购人数', 0)).replace(',', ''))) for row in parsed_data if row.get('加购人数'))
-        total_orders = sum(int(float(str(row.get('支付子订单数', 0)).replace(',', ''))) for row in parsed_data if row.get('支付子订单数'))
-        
-        return jsonify({
-            "visitors": total_visitors,
-            "cart": total_cart,
-            "orders": total_orders
-        })
+        table = load_sheet_table(FEISHU_SHEET_ID)
+        return jsonify(FeishuAnalyticsService.get_funnel(table))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/feishu/service')
+@conditional(sheet_version(FEISHU_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_feishu_service():
     """飞书数据 - 服务指标"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        # Calculate averages
-        logistics_times = [float(str(row.get('物流到货时长(小时)', 0)).replace(',', '')) for row in parsed_data if row.get('物流到货时长(小时)')]
-        chat_times = [float(str(row.get('旺旺人工响应时长(秒)', 0)).replace(',', '')) for row in parsed_data if row.get('旺旺人工响应时长(秒)')]
-        refund_times = [float(str(row.get('退款处理时长(天)', 0)).replace(',', '')) for row in parsed_data if row.get('退款处理时长(天)')]
-        
-        return jsonify({
-            "logistics_hours": round(sum(logistics_times) / len(logistics_times), 1) if logistics_times else 0,
-            "chat_seconds": round(sum(chat_times) / len(chat_times), 1) if chat_times else 0,
-            "refund_days": round(sum(refund_times) / len(refund_times), 1) if refund_times else 0
-        })
+        table = load_sheet_table(FEISHU_SHEET_ID)
+        return jsonify(FeishuAnalyticsService.get_service_metrics(table))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -193,104 +587,130 @@ def get_feishu_service():
 # =============================================
 
 @app.route('/api/live/data')
+@conditional(sheet_version(FEISHU_LIVE_SHEET_ID, projected=False), max_age=API_CACHE_MAX_AGE)
 def get_live_data():
     """直播间原始数据"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_LIVE_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        return jsonify(parsed_data)
+        return sheet_records(FEISHU_LIVE_SHEET_ID)
+    except StaleCursor as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/live/overview')
+@conditional(sheet_version(FEISHU_LIVE_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_live_overview():
     """直播间 KPI 概览"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_LIVE_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        def safe_float(val):
-            try:
-                return float(str(val).replace(',', '').replace('#DIV/0!', '0').replace('######', '0'))
-            except:
-                return 0
-        
-        def safe_int(val):
-            return int(safe_float(val))
-        
-        # 累计指标
-        total_gmv = sum(safe_float(row.get('直播间GMV', 0)) for row in parsed_data)
-        total_uv = sum(safe_int(row.get('直播间访问人数（uv）', 0)) for row in parsed_data)
-        total_sessions = sum(safe_int(row.get('开播场次', 0)) for row in parsed_data)
-        total_fans = sum(safe_int(row.get('直播间新增粉丝数', 0)) for row in parsed_data)
-        
-        return jsonify({
-            "total_gmv": round(total_gmv, 2),
-            "total_uv": total_uv,
-            "total_sessions": total_sessions,
-            "total_fans": total_fans
-        })
+        table = load_sheet_table(FEISHU_LIVE_SHEET_ID)
+        return jsonify(LiveAnalyticsService.get_overview(table))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/live/trend')
+@conditional(sheet_version(FEISHU_LIVE_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_live_trend():
     """直播间趋势数据"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_LIVE_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        def safe_float(val):
-            try:
-                return float(str(val).replace(',', '').replace('#DIV/0!', '0').replace('######', '0'))
-            except:
-                return 0
-        
-        result = []
-        for row in parsed_data:
-            date = str(row.get('统计日期', ''))
-            if date and date != '统计日期':
-                result.append({
-                    "date": date,
-                    "gmv": safe_float(row.get('直播间GMV', 0)),
-                    "uv": safe_float(row.get('直播间访问人数（uv）', 0)),
-                    "revenue": safe_float(row.get('直播间营收', 0))
-                })
-        
-        return jsonify(result)
+        table = load_sheet_table(FEISHU_LIVE_SHEET_ID)
+        return jsonify(LiveAnalyticsService.get_trend(table, **trend_options()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/live/metrics')
+@conditional(sheet_version(FEISHU_LIVE_SHEET_ID), max_age=API_CACHE_MAX_AGE)
 def get_live_metrics():
     """直播间效率指标"""
     try:
-        feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET)
-        raw_data = feishu.get_sheet_data(FEISHU_SPREADSHEET_TOKEN, FEISHU_LIVE_SHEET_ID)
-        parsed_data = feishu.parse_to_daily_sales(raw_data)
-        
-        def safe_float(val):
-            try:
-                v = str(val).replace(',', '').replace('#DIV/0!', '0').replace('######', '0').replace('%', '')
-                return float(v)
-            except:
-                return 0
-        
-        # 计算平均值
-        gpm_list = [safe_float(row.get('GPM（千次展现成交）', 0)) for row in parsed_data if row.get('GPM（千次展现成交）')]
-        uv_value_list = [safe_float(row.get('UV价值', 0)) for row in parsed_data if row.get('UV价值')]
-        conversion_list = [safe_float(row.get('uv转化率', 0)) for row in parsed_data if row.get('uv转化率')]
-        
-        return jsonify({
-            "avg_gpm": round(sum(gpm_list) / len(gpm_list), 2) if gpm_list else 0,
-            "avg_uv_value": round(sum(uv_value_list) / len(uv_value_list), 2) if uv_value_list else 0,
-            "avg_conversion": round(sum(conversion_list) / len(conversion_list) * 100, 2) if conversion_list else 0
-        })
+        table = load_sheet_table(FEISHU_LIVE_SHEET_ID)
+        return jsonify(LiveAnalyticsService.get_metrics(table))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# =============================================
+# 监控 (Prometheus)
+# =============================================
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text format: request / stage latency histograms, Feishu calls, cache hits, sheet rows"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# =============================================
+# CLI (flask --app app <command>)
+# =============================================
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    print("Schema ready.")
+
+@app.cli.command('ingest')
+@click.argument('path', default=DEFAULT_EXCEL_PATH)
+@click.option('--mode', type=click.Choice(['if-empty', 'append', 'replace', 'upsert']), default='if-empty',
+              help='if-empty only imports into an empty table; upsert replaces rows with the same (date, category)')
+def ingest_command(path, mode):
+    """Import an Excel export into daily_sales"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    try:
+        with file_lock(DB_LOCK_PATH):
+            if mode == 'if-empty':
+                IngestionService.import_excel_if_empty(path)
+            else:
+                IngestionService.bulk_import(path, mode=mode)
+    except Exception as e:
+        print(f"❌ Import failed: {e}")
+        raise SystemExit(1)
+
+@app.cli.command('ingest-dir')
+@click.argument('directory', default=INGEST_DIR)
+@click.option('--mode', type=click.Choice(['append', 'upsert']), default='append',
+              help='upsert replaces rows with the same (date, category), e.g. for re-exported periods of one shop')
+@click.option('--workers', type=int, default=INGEST_WORKERS, help='Parser processes (0 = one per CPU)')
+@click.option('--watch', is_flag=True, help='Keep scanning the directory for new files')
+@click.option('--interval', type=float, default=10, help='Seconds between scans with --watch')
+def ingest_dir_command(directory, mode, workers, watch, interval):
+    """Import every new Excel export in a drop directory (parallel parsing, one writer)"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    os.makedirs(directory, exist_ok=True)
+    ingestor = DropIngestor(directory, workers=workers or None, mode=mode,
+                            settle=SETTLE_SECONDS if watch else 0, lock=lambda: file_lock(DB_LOCK_PATH))
+    if watch:
+        ingestor.watch(interval)
+    elif any(result['status'] == 'error' for result in ingestor.run()):
+        raise SystemExit(1)
+
+@app.cli.command('rollup')
+def rollup_command():
+    """Rebuild the sales_rollup tables from daily_sales"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    with file_lock(DB_LOCK_PATH):
+        RollupService.rebuild()
+    print("Rollups rebuilt.")
+
+@app.cli.command('analytics-export')
+def analytics_export_command():
+    """Re-export daily_sales for the columnar analytics backend (ANALYTICS_BACKEND=duckdb)"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    with file_lock(DB_LOCK_PATH):
+        AnalyticsService.backend.refresh()
+    print(f"Analytics backend '{AnalyticsService.backend.name}' is up to date.")
+
+@app.cli.command('feishu-sync')
+@click.option('--force', is_flag=True, help='Re-download even if the revision is unchanged')
+def feishu_sync_command(force):
+    """Mirror the configured Feishu sheets into SQLite"""
+    ensure_schema(app, DB_SCHEMA_LOCK_PATH, upgrade_schema, schema_current)
+    feishu = FeishuSheetService(FEISHU_APP_ID, FEISHU_APP_SECRET,
+                                chunk_rows=FEISHU_CHUNK_ROWS, max_workers=FEISHU_MAX_WORKERS)
+    for sheet_id in SHEET_SCHEMAS:
+        print(FeishuSyncService.sync_sheet(feishu, FEISHU_SPREADSHEET_TOKEN, sheet_id, force=force, lock=sync_lock))
+
 if __name__ == '__main__':
+    seed_from_snapshots()
     app.run(debug=True, port=5000)
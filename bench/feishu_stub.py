@@ -0,0 +1,183 @@
+"""
+Local Feishu stub - tenant_access_token + sheets/v2 (metainfo / values / values_batch_get)
+with injectable latency and errors, for offline benchmarks.
+
+    python -m bench.feishu_stub --rows 100k --latency 30 --error-rate 0.01
+    FEISHU_BASE_URL=http://127.0.0.1:8900/open-apis flask --app app run
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench import synth
+
+RANGE_RE = re.compile(r'^(\w+)!([A-Z]+)(\d+):([A-Z]+)(\d+)$')
+# Same token / sheet ids as app.py, so the app runs unchanged against the stub
+SPREADSHEET_TOKEN = "HgC9sb5EPhNPFbterr9cr64onyh"
+SALES_SHEET_ID = "80e00b"
+LIVE_SHEET_ID = "lCypKc"
+
+
+def _column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit_rate=0.0, token_expire=7200):
+        """
+        latency_ms / jitter_ms: 每个请求的固定延迟 + 随机抖动
+        error_rate: 返回 HTTP 500 的比例; rate_limit_rate: 返回 code=99991400 的比例
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_expire = token_expire
+
+
+class FeishuStub:
+    """ In-memory spreadsheets served over HTTP on a background thread """
+    def __init__(self, sheets, config=None, host='127.0.0.1', port=0, revision=1):
+        self.sheets = sheets
+        self.config = config or StubConfig()
+        self.revision = revision
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/open-apis"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def bump_revision(self):
+        with self._lock:
+            self.revision += 1
+
+    def _slice(self, spreadsheet_token, range_str):
+        m = RANGE_RE.match(range_str)
+        if not m:
+            return None
+        sheet_id, c1, r1, c2, r2 = m.groups()
+        rows = self.sheets.get(spreadsheet_token, {}).get(sheet_id)
+        if rows is None:
+            return None
+        first, last = _column_index(c1), _column_index(c2)
+        return [row[first:last + 1] for row in rows[int(r1) - 1:int(r2)]]
+
+    def handle(self, method, path, query, body):
+        """ -> (status, payload) """
+        cfg = self.config
+        with self._lock:
+            self.requests += 1
+        if cfg.latency_ms or cfg.jitter_ms:
+            time.sleep((cfg.latency_ms + random.uniform(0, cfg.jitter_ms)) / 1000)
+
+        if method == 'POST' and path.endswith('/auth/v3/tenant_access_token/internal'):
+            return 200, {"code": 0, "msg": "ok", "tenant_access_token": f"t-bench-{int(time.time())}",
+                         "expire": cfg.token_expire}
+
+        if random.random() < cfg.error_rate:
+            return 500, {"code": 1, "msg": "injected server error"}
+        if random.random() < cfg.rate_limit_rate:
+            return 200, {"code": 99991400, "msg": "injected rate limit"}
+
+        m = re.search(r'/sheets/v2/spreadsheets/([^/]+)/(metainfo|values_batch_get|values/(.+))$', path)
+        if method != 'GET' or not m:
+            return 404, {"code": 404, "msg": f"unknown endpoint {path}"}
+        spreadsheet_token, endpoint, range_str = m.groups()
+        if spreadsheet_token not in self.sheets:
+            return 200, {"code": 1310214, "msg": "spreadsheet not found"}
+
+        if endpoint == 'metainfo':
+            sheets = [{"sheetId": sheet_id, "rowCount": len(rows),
+                       "columnCount": max((len(r) for r in rows), default=0)}
+                      for sheet_id, rows in self.sheets[spreadsheet_token].items()]
+            return 200, {"code": 0, "data": {"properties": {"revision": self.revision}, "sheets": sheets}}
+
+        ranges = query.get('ranges', [''])[0].split(',') if endpoint == 'values_batch_get' else [range_str]
+        value_ranges = []
+        for r in ranges:
+            values = self._slice(spreadsheet_token, r)
+            if values is None:
+                return 200, {"code": 90202, "msg": f"invalid range {r}"}
+            value_ranges.append({"range": r, "values": values})
+        if endpoint == 'values_batch_get':
+            return 200, {"code": 0, "data": {"revision": self.revision, "valueRanges": value_ranges}}
+        return 200, {"code": 0, "data": {"revision": self.revision, "valueRange": value_ranges[0]}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, payload = stub.handle(method, url.path, parse_qs(url.query), body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def bench_sheets(rows):
+    """ The two dashboard sheets at `rows` rows each, under the bench spreadsheet token """
+    return {SPREADSHEET_TOKEN: {SALES_SHEET_ID: synth.sales_sheet(rows), LIVE_SHEET_ID: synth.live_sheet(rows)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='1k', help='1k / 100k / 1m or a row count')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0, help='ms per request')
+    parser.add_argument('--jitter', type=float, default=0, help='random extra ms per request')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    stub = FeishuStub(bench_sheets(synth.parse_size(args.rows)), config, port=args.port)
+    print(f"✅ Feishu stub on {stub.base_url} (spreadsheet {SPREADSHEET_TOKEN})")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Benchmark runner - 全部离线: 本地飞书 stub + 合成数据 + 临时 SQLite
+
+    python -m bench.run --sizes 1k,100k --requests 200 --concurrency 8
+    python -m bench.run --sizes 1k --latency 30 --error-rate 0.02 --output bench_output.json
+
+Reports, per data size:
+    feishu  - fetch / parse time of each sheet (sync chunked read and async batched read)
+    ingest  - Excel -> daily_sales rows/sec
+    routes  - cold (empty cache) latency, warm p50/p99 latency, throughput and the cold / warm
+              peak_mb of every GET route in app.py
+and the peak memory growth (RSS) of each stage plus the process max RSS.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import synth
+from bench.feishu_stub import FeishuStub, StubConfig, bench_sheets
+
+DASHBOARDS = ('sales', 'feishu', 'live')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_mb():
+    """ Current resident set size (Linux /proc; max RSS elsewhere) """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Stage:
+    """
+    with Stage('name') as s: ... -> s.seconds, s.peak_mb
+
+    peak_mb is the RSS growth over the stage, sampled every 10ms from a
+    thread (tracemalloc would slow the parse/ingest code it measures severalfold)
+    """
+    def __init__(self, name, interval=0.01):
+        self.name = name
+        self.interval = interval
+        self.seconds = None
+        self.peak_mb = None
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self._peak = max(self._peak, rss_mb())
+
+    def __enter__(self):
+        self._base = self._peak = rss_mb()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        self._done.set()
+        self._sampler.join()
+        self.peak_mb = max(self._peak, rss_mb()) - self._base
+
+
+def bench_feishu(appmod):
+    """ Fetch + parse each configured sheet through both clients """
+    from feishu_service import FeishuSheetService
+    from feishu_async import AsyncFeishuSheetService
+
+    results = {}
+    feishu = FeishuSheetService(appmod.FEISHU_APP_ID, appmod.FEISHU_APP_SECRET,
+                                chunk_rows=appmod.FEISHU_CHUNK_ROWS, max_workers=appmod.FEISHU_MAX_WORKERS)
+    for sheet_id, schema in appmod.SHEET_SCHEMAS.items():
+        with Stage('fetch') as fetch:
+            raw = feishu.get_sheet_data(appmod.FEISHU_SPREADSHEET_TOKEN, sheet_id)
+        with Stage('parse') as parse:
+            table = feishu.parse_to_table(raw, schema)
+        results[sheet_id] = {
+            "rows": len(table),
+            "fetch_s": fetch.seconds, "fetch_peak_mb": fetch.peak_mb,
+            "parse_s": parse.seconds, "parse_peak_mb": parse.peak_mb,
+            "parse_rows_per_s": len(table) / parse.seconds if parse.seconds else None,
+        }
+
+    async def read_all():
+        async with AsyncFeishuSheetService(appmod.FEISHU_APP_ID, appmod.FEISHU_APP_SECRET,
+                                           chunk_rows=appmod.FEISHU_CHUNK_ROWS) as client:
+            return await client.read_sheets(appmod.FEISHU_SPREADSHEET_TOKEN, list(appmod.SHEET_SCHEMAS))
+
+    with Stage('async') as batched:
+        sheets, _ = asyncio.run(read_all())
+    results["async_batched_all_sheets"] = {
+        "rows": sum(len(rows) for rows in sheets.values()),
+        "fetch_s": batched.seconds, "fetch_peak_mb": batched.peak_mb,
+    }
+    return results
+
+
+def bench_ingest(appmod, xlsx_path):
+    from services import IngestionService
+    with appmod.app.app_context():
+        appmod.ensure_schema(appmod.app, appmod.DB_SCHEMA_LOCK_PATH, appmod.upgrade_schema, appmod.schema_current)
+        with Stage('ingest') as stage:
+            written = IngestionService.bulk_import(xlsx_path, mode='replace')
+    return {
+        "rows": written, "seconds": stage.seconds, "peak_mb": stage.peak_mb,
+        "rows_per_s": written / stage.seconds if stage.seconds else None,
+    }
+
+
+def route_urls(app):
+    """ Every GET route of the app with its URL parameters filled in (SSE streams excluded) """
+    urls = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static' or rule.rule.endswith('/stream'):
+            continue
+        if 'name' in rule.arguments:
+            urls.extend(rule.rule.replace('<name>', name) for name in DASHBOARDS)
+        elif not rule.arguments:
+            urls.append(rule.rule)
+    return urls
+
+
+def bench_routes(appmod, base_url, n_requests, concurrency):
+    results = {}
+    local = threading.local()
+
+    def get(url):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(base_url + url, headers={'Accept-Encoding': 'gzip'})
+        return time.perf_counter() - started, response.status_code, len(response.content)
+
+    for url in route_urls(appmod.app):
+        # Cold: nothing cached, includes the Feishu fetch for sheet routes
+        # The server runs in this process, so the RSS growth covers request handling too
+        appmod.sheet_cache.invalidate()
+        with Stage('cold') as cold_stage:
+            cold, status, size = get(url)
+
+        with Stage('warm') as warm:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(lambda _: get(url), range(n_requests)))
+
+        latencies = [s[0] * 1000 for s in samples]
+        errors = sum(1 for s in samples if s[1] >= 400)
+        results[url] = {
+            "status": status, "bytes": size, "cold_ms": cold * 1000, "cold_peak_mb": cold_stage.peak_mb,
+            "p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99),
+            "mean_ms": statistics.fmean(latencies), "throughput_rps": n_requests / warm.seconds,
+            "peak_mb": warm.peak_mb, "errors": errors,
+        }
+        print(f"  {url:<32} cold {cold * 1000:8.1f}ms  p50 {results[url]['p50_ms']:7.1f}ms  "
+              f"p99 {results[url]['p99_ms']:7.1f}ms  {results[url]['throughput_rps']:8.1f} rps  "
+              f"peak {cold_stage.peak_mb:.0f}/{warm.peak_mb:.0f}MB  "
+              f"{'' if not errors else f'{errors} errors'}")
+    return results
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1k', help='comma list of 1k / 100k / 1m / row counts')
+    parser.add_argument('--requests', type=int, default=200, help='warm requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0, help='stub latency per Feishu call (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='stub random extra latency (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of Feishu calls answered HTTP 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share answered code 99991400')
+    parser.add_argument('--skip', default='', help='comma list of stages to skip: feishu,ingest,routes')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+                        help='where generated workbooks are cached between runs')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(',')))
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    stub = FeishuStub({}, config).start()
+    workdir = tempfile.mkdtemp(prefix='bench-')
+
+    # The app reads these at import time
+    os.environ['FEISHU_BASE_URL'] = stub.base_url
+    os.environ['ECOMMERCE_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ['FEISHU_REFRESH_INTERVAL'] = '0'
+    os.environ.setdefault('FEISHU_CACHE_TTL', '3600')
+    import app as appmod
+
+    server, base_url = serve(appmod.app)
+    report = {"config": vars(args), "sizes": {}}
+    try:
+        for label in args.sizes.split(','):
+            rows = synth.parse_size(label)
+            print(f"📋 {label}: {rows} rows")
+            result = report["sizes"][label] = {"rows": rows}
+
+            with Stage('generate') as gen:
+                stub.sheets = bench_sheets(rows)
+            stub.bump_revision()
+            result["generate_sheets_s"] = gen.seconds
+
+            if 'feishu' not in skip:
+                result["feishu"] = bench_feishu(appmod)
+                for sheet_id, r in result["feishu"].items():
+                    print(f"  feishu {sheet_id:<26} fetch {r['fetch_s']:.2f}s  "
+                          + (f"parse {r['parse_s']:.2f}s  " if 'parse_s' in r else "")
+                          + f"peak {r['fetch_peak_mb']:.0f}MB")
+            if 'ingest' not in skip:
+                xlsx = synth.cached_excel_file(args.data_dir, rows)
+                result["ingest"] = bench_ingest(appmod, xlsx)
+                print(f"  ingest {result['ingest']['rows']} rows  {result['ingest']['rows_per_s']:.0f} rows/s  "
+                      f"peak {result['ingest']['peak_mb']:.0f}MB")
+            if 'routes' not in skip:
+                result["routes"] = bench_routes(appmod, base_url, args.requests, args.concurrency)
+            result["feishu_requests"] = stub.requests
+    finally:
+        server.shutdown()
+        stub.stop()
+
+    report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"✅ Done, max RSS {report['max_rss_mb']:.0f}MB")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
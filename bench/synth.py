@@ -0,0 +1,113 @@
+"""
+Synthetic data for benchmarks - 商品销售表 / 直播间表 (飞书格式) + Excel 导入文件
+"""
+import os
+import random
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+SALES_HEADERS = ["日期", "支付金额", "访客数", "支付子订单数", "加购人数",
+                 "物流到货时长(小时)", "旺旺人工响应时长(秒)", "退款处理时长(天)", "活动节点"]
+LIVE_HEADERS = ["统计日期", "开播场次", "直播间GMV", "直播间访问人数（uv）", "直播间营收", "直播间新增粉丝数",
+                "GPM（千次展现成交）", "UV价值", "uv转化率", "店铺成交金额", "直播成交人数", "店铺转化率",
+                "店铺客单", "店铺退款率"]
+EXCEL_HEADERS = ['日期', '类别', '支付金额', '访客数', '支付转化率', '支付件数', '支付子订单数', '客单价',
+                 '成功退款金额', '浏览量', '加购人数', '加购件数', '咨询率', '老客复购金额', '老客复购人数',
+                 '老客复购率', '旺旺人工响应时长(秒)', '物流到货时长(小时)', '退款处理时长(天)',
+                 '纠纷投诉商责率', '旺旺满意度']
+CATEGORIES = ['护肤', '彩妆', '个护', '香氛']
+START_DATE = date(2020, 1, 1)
+
+
+def parse_size(label):
+    """ '1k' / '100k' / '1m' or a plain row count """
+    return SIZES.get(label.lower()) or int(label)
+
+
+def _day(i, rows_per_day):
+    return (START_DATE + timedelta(days=i // rows_per_day)).isoformat()
+
+
+def sales_sheet(rows, seed=0):
+    """
+    Feishu 商品销售 sheet: a title row, the header row, then `rows` rows of
+    strings the way the API returns them (thousand separators, blanks, errors)
+    """
+    rng = random.Random(seed)
+    rows_per_day = max(1, rows // 3000)
+    data = [["商品销售数据 (synthetic)"], list(SALES_HEADERS)]
+    for i in range(rows):
+        data.append([
+            _day(i, rows_per_day),
+            f"{rng.uniform(500, 50000):,.2f}",
+            str(rng.randint(50, 5000)),
+            str(rng.randint(1, 400)),
+            str(rng.randint(5, 800)),
+            f"{rng.uniform(12, 96):.1f}",
+            str(rng.randint(5, 120)) if rng.random() > 0.01 else "#DIV/0!",
+            f"{rng.uniform(0.5, 5):.1f}",
+            "大促" if i % 97 == 0 else "",
+        ])
+    return data
+
+
+def live_sheet(rows, seed=1):
+    """ Feishu 直播间 sheet: header row + `rows` rows """
+    rng = random.Random(seed)
+    rows_per_day = max(1, rows // 3000)
+    data = [list(LIVE_HEADERS)]
+    for i in range(rows):
+        gmv = rng.uniform(1000, 200000)
+        data.append([
+            _day(i, rows_per_day),
+            str(rng.randint(1, 3)),
+            f"{gmv:,.0f}",
+            str(rng.randint(500, 50000)),
+            f"{gmv * 0.8:.0f}",
+            str(rng.randint(0, 500)),
+            f"{rng.uniform(100, 3000):.0f}",
+            f"{rng.uniform(0.5, 10):.2f}",
+            f"{rng.uniform(0.5, 8):.2f}%",
+            f"{gmv * 1.6:.0f}",
+            str(rng.randint(10, 2000)),
+            f"{rng.uniform(0.01, 0.08):.4f}",
+            f"{rng.uniform(80, 400):.0f}",
+            f"{rng.uniform(0, 15):.1f}%" if rng.random() > 0.02 else "#DIV/0!",
+        ])
+    return data
+
+
+def excel_file(path, rows, seed=2):
+    """ Excel export in the daily_sales ingest format (write-only, streams to disk) """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(EXCEL_HEADERS)
+    rows_per_day = len(CATEGORIES)
+    for i in range(rows):
+        ws.append([
+            START_DATE + timedelta(days=i // rows_per_day), CATEGORIES[i % rows_per_day],
+            f"{rng.uniform(500, 50000):,.2f}", rng.randint(50, 5000), f"{rng.uniform(0.5, 8):.1f}%",
+            rng.randint(1, 500), rng.randint(1, 400), round(rng.uniform(50, 500), 2), rng.randint(0, 2000),
+            rng.randint(100, 20000), rng.randint(5, 800), rng.randint(5, 900), f"{rng.uniform(1, 30):.1f}%",
+            rng.randint(0, 5000), rng.randint(0, 50), f"{rng.uniform(1, 20):.1f}%", rng.randint(5, 120),
+            round(rng.uniform(12, 96), 1), round(rng.uniform(0.5, 5), 1), f"{rng.uniform(0, 1):.2f}%",
+            f"{rng.uniform(90, 100):.1f}%",
+        ])
+    wb.save(path)
+    return path
+
+
+def cached_excel_file(data_dir, rows):
+    """ Generated workbooks are reused between runs (1M rows takes minutes to write) """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"sales_{rows}.xlsx")
+    if not os.path.exists(path):
+        print(f"📋 Generating {path} ({rows} rows)...")
+        tmp = path + '.tmp'
+        excel_file(tmp, rows)
+        os.replace(tmp, path)
+    return path
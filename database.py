@@ -1,7 +1,58 @@
+from contextlib import contextmanager
+import threading
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process locking only
+    fcntl = None
+
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
+
+_schema_ready = False
+# One in-process lock per lock file, so holding one file lock never blocks another
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(lock_path):
+    """
+    Exclusive lock shared by every process on this host (flock on lock_path)
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.Lock())
+    with thread_lock, open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def ensure_schema(app, lock_path, upgrade=None, is_current=None):
+    """
+    Create missing tables (and run the upgrade callable) once per process;
+    concurrent workers serialize on the file lock so only one of them runs
+    the DDL at a time. is_current: optional read-only check that lets an
+    up-to-date database skip the lock altogether.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    if is_current:
+        with app.app_context():
+            if is_current():
+                _schema_ready = True
+                return
+    with file_lock(lock_path):
+        if not _schema_ready:
+            with app.app_context():
+                db.create_all()
+                if upgrade:
+                    upgrade()
+            _schema_ready = True
@@ -0,0 +1,91 @@
+"""
+Downsample - 趋势图降采样 (LTTB / min-max 分桶), 图表点数与历史长度无关
+
+Both samplers return indices of original points (nothing is averaged away),
+so peaks stay at their true values. Each series' overall min / max and the
+pinned rows (e.g. 活动节点 days) are always kept on top of the budget.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def _values(y):
+    return np.nan_to_num(np.asarray(y, dtype=np.float64))
+
+
+def lttb(y, n):
+    """
+    Largest-Triangle-Three-Buckets: indices of n points (x = position).
+    First and last points are always kept.
+    """
+    y = _values(y)
+    length = len(y)
+    if n >= length:
+        return np.arange(length)
+    if n < 3:
+        return np.array([0, length - 1][:max(n, 1)])
+
+    # n - 2 buckets between the first and the last point
+    edges = np.linspace(1, length - 1, n - 1).astype(np.int64)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = (next_lo + next_hi - 1) / 2, y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = length - 1, y[-1]
+        x = np.arange(lo, hi)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - x) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return np.unique(selected)
+
+
+def minmax(y, n):
+    """ Min and max of each of n / 2 equal buckets (plus first and last point) """
+    y = _values(y)
+    length = len(y)
+    if n >= length:
+        return np.arange(length)
+    buckets = max(1, n // 2)
+    edges = np.linspace(0, length, buckets + 1).astype(np.int64)
+    selected = [0, length - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            chunk = y[lo:hi]
+            selected.extend((lo + int(chunk.argmin()), lo + int(chunk.argmax())))
+    return np.unique(selected)
+
+
+def downsample_indices(series, points, pinned=None, method='lttb'):
+    """
+    Sorted indices to keep so a chart of the series draws about `points` points.
+
+    series: list of equal-length value sequences (each gets an equal share of the budget)
+    pinned: bool mask or indices that are always kept (at most points + pinned rows are returned)
+    points: None / 0 keeps everything
+    """
+    if method not in METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(METHODS)}")
+    length = len(series[0]) if series else 0
+    if not points or length <= points:
+        return np.arange(length)
+
+    keep = np.zeros(length, dtype=bool)
+    pinned = np.asarray(pinned if pinned is not None else [])
+    if pinned.size:
+        keep[pinned] = True
+    # Pinned rows come on top of at least half the budget, so a sheet full of
+    # 活动节点 rows still gets its peaks sampled
+    budget = max(3, max(points - int(keep.sum()), points // 2) // len(series))
+    sampler = lttb if method == 'lttb' else minmax
+    for values in series:
+        keep[sampler(values, budget)] = True
+        # The overall peak / trough of every series is always on the chart
+        values = _values(values)
+        keep[[values.argmin(), values.argmax()]] = True
+    return np.flatnonzero(keep)
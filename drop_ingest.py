@@ -0,0 +1,238 @@
+"""
+Drop Ingest - 监控导入目录, 按文件内容 hash 去重, 多进程解析工作簿, 单一写入者提交
+
+    flask --app app ingest-dir [drop/] [--watch]
+
+Parser processes only read workbooks (openpyxl + clean_chunk) and hand back
+cleaned rows. Every write happens in the calling process, one transaction
+per file (rows, rollups and the ingested_files record together), in the order
+files finish parsing. SQLite only ever sees one writer, and a file that fails
+leaves nothing behind and is retried on the next scan, except that a watch
+loop does not re-parse a file that failed to parse until its content changes.
+"""
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from database import db
+from models import IngestedFile
+from services import AnalyticsService, IngestionService
+
+EXTENSIONS = ('.xlsx', '.xlsm')
+# Files modified more recently than this are probably still being copied in (--watch)
+SETTLE_SECONDS = 5
+HASH_BLOCK = 1 << 20
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingestable(header):
+    """ A sheet is imported when it has a 日期 column plus at least one other daily_sales column """
+    names = {str(name).strip() for name in header}
+    return '日期' in names and len(names & set(IngestionService.EXCEL_COLUMNS)) > 1
+
+
+def parse_workbook(path, chunk_rows=None):
+    """
+    Runs in a parser process: every importable sheet of the workbook -> cleaned row chunks.
+    Returns {sheets: [(name, [rows, ...])], skipped: [sheet names], seconds}
+    """
+    started = time.perf_counter()
+    sheets, skipped = [], []
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            chunks = []
+            for chunk in IngestionService.iter_sheet_chunks(worksheet, chunk_rows):
+                if not ingestable(chunk.columns):
+                    skipped.append(worksheet.title)
+                    break
+                chunks.append(IngestionService.clean_chunk(chunk))
+            if chunks:
+                sheets.append((worksheet.title, chunks))
+    finally:
+        workbook.close()
+    return {"sheets": sheets, "skipped": skipped, "seconds": time.perf_counter() - started}
+
+
+class DropIngestor:
+    def __init__(self, directory, workers=None, mode='append', settle=SETTLE_SECONDS, lock=None):
+        """
+        workers: parser processes (default: one per CPU)
+        mode:    append / upsert per file (see IngestionService.write_rows)
+        settle:  skip files modified less than this many seconds ago
+        lock:    callable returning the context manager held around each file's write
+                 (e.g. the DB file lock shared with `flask ingest` and schema setup)
+        """
+        if mode not in ('append', 'upsert'):
+            raise ValueError(f"Unknown import mode: {mode}")
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.settle = settle
+        self.lock = lock or contextlib.nullcontext
+        # (path, size, mtime) -> sha1, so a watch loop doesn't re-read unchanged files
+        self._hashes = {}
+        # sha1 -> parse error, so a watch loop doesn't re-parse a broken file every pass
+        self._failed = {}
+
+    def scan(self):
+        """ Settled workbook files in the directory as [(path, size, sha1)], by name """
+        now = time.time()
+        files, hashes = [], {}
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            # ~$ files are Excel's lock files next to an open workbook
+            if not entry.is_file() or entry.name.startswith(('~$', '.')) or not entry.name.lower().endswith(EXTENSIONS):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime < self.settle:
+                continue
+            key = (entry.path, stat.st_size, stat.st_mtime_ns)
+            hashes[key] = self._hashes.get(key) or file_hash(entry.path)
+            files.append((entry.path, stat.st_size, hashes[key]))
+        # Only remember files that are still there (and still unchanged)
+        self._hashes = hashes
+        present = set(hashes.values())
+        self._failed = {sha1: error for sha1, error in self._failed.items() if sha1 in present}
+        return files
+
+    @staticmethod
+    def imported_hashes():
+        return {sha1 for (sha1,) in db.session.query(IngestedFile.sha1).filter(IngestedFile.status == 'ok')}
+
+    def pending(self):
+        """
+        (files to import, number of files skipped as duplicates of imported / earlier content,
+         number of files skipped because this content already failed to parse)
+        """
+        imported = self.imported_hashes()
+        pending, seen, duplicates, failed = [], set(), 0, 0
+        for path, size, sha1 in self.scan():
+            if sha1 in imported or sha1 in seen:
+                duplicates += 1
+                continue
+            seen.add(sha1)
+            if sha1 in self._failed:
+                failed += 1
+                continue
+            pending.append((path, size, sha1))
+        return pending, duplicates, failed
+
+    def run(self, quiet=False):
+        """
+        One pass over the directory: parse new files in the process pool and write
+        each one as soon as it is parsed. Returns one result dict per file.
+        quiet: say nothing when there is nothing new (watch loop)
+        """
+        pending, duplicates, failed = self.pending()
+        if duplicates and (pending or not quiet):
+            print(f"⏭️ Skipping {duplicates} file(s) whose content was already imported")
+        if failed and (pending or not quiet):
+            print(f"⏭️ Skipping {failed} file(s) that failed to parse and have not changed since")
+        if not pending:
+            if not quiet:
+                print(f"📋 No new workbooks in {self.directory}")
+            return []
+
+        workers = min(self.workers, len(pending))
+        print(f"📋 Ingesting {len(pending)} file(s) from {self.directory} with {workers} parser process(es)")
+        started = time.perf_counter()
+        results = []
+        # spawn: parser processes never inherit the app's DB connections or threads
+        # (and behave the same on Windows dev machines)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(parse_workbook, path): (path, size, sha1) for path, size, sha1 in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                result = self._write(*futures[future], future)
+                results.append(result)
+                label = f"[{done}/{len(pending)}] {os.path.basename(result['path'])}"
+                if result['status'] == 'ok':
+                    skipped = f", skipped sheets: {', '.join(result['skipped'])}" if result['skipped'] else ''
+                    print(f"✅ {label}: {result['rows']} rows from {len(result['sheets'])} sheet(s) "
+                          f"(parse {result['parse_seconds']:.2f}s, write {result['write_seconds']:.2f}s{skipped})")
+                elif result['status'] == 'duplicate':
+                    print(f"⏭️ {label}: imported meanwhile by another process")
+                else:
+                    print(f"❌ {label}: {result['error']}")
+
+        imported = [r for r in results if r['status'] == 'ok']
+        if imported:
+            # Columnar backends re-export once per pass, not once per file
+            AnalyticsService.backend.refresh()
+        failed = sum(r['status'] == 'error' for r in results)
+        rows = sum(r['rows'] for r in imported)
+        elapsed = time.perf_counter() - started
+        print(f"{'⚠️' if failed else '✅'} Imported {rows} rows from {len(imported)} file(s) in {elapsed:.2f}s "
+              f"({rows / elapsed if elapsed else 0:.0f} rows/s), {failed} failed")
+        return results
+
+    def watch(self, interval=10):
+        """ Scan every `interval` seconds until interrupted """
+        print(f"🔄 Watching {self.directory} every {interval}s (Ctrl+C to stop)")
+        while True:
+            try:
+                self.run(quiet=True)
+            except Exception as e:
+                print(f"❌ Ingest pass failed: {e}")
+            time.sleep(interval)
+
+    def _write(self, path, size, sha1, future):
+        """ Single writer: the parsed file's rows + its ingested_files record in one transaction """
+        result = {"path": path, "sha1": sha1, "status": "ok", "rows": 0, "sheets": [], "skipped": [],
+                  "error": None, "parse_seconds": 0.0, "write_seconds": 0.0}
+        parsing = True
+        try:
+            parsed = future.result()
+            result.update(sheets=[name for name, _ in parsed['sheets']], skipped=parsed['skipped'],
+                          parse_seconds=parsed['seconds'])
+            if not parsed['sheets']:
+                raise ValueError(f"No sheet with a 日期 column (sheets: {', '.join(parsed['skipped']) or 'none'})")
+            parsing = False
+            started = time.perf_counter()
+            with self.lock():
+                if sha1 in self.imported_hashes():
+                    result['status'] = 'duplicate'
+                    return result
+                chunks = (rows for _, sheet_chunks in parsed['sheets'] for rows in sheet_chunks)
+                result['rows'] = IngestionService.write_rows(chunks, self.mode)
+                self._record(result, size)
+                db.session.commit()
+            result['write_seconds'] = time.perf_counter() - started
+        except Exception as e:
+            db.session.rollback()
+            result.update(status='error', error=str(e) or type(e).__name__, rows=0)
+            if parsing:
+                # Parsing the same bytes again fails the same way; write errors (locks...) are retried
+                self._failed[sha1] = result['error']
+            try:
+                with self.lock():
+                    self._record(result, size)
+                    db.session.commit()
+            except Exception as record_error:
+                db.session.rollback()
+                print(f"⚠️ Could not record the failure of {path}: {record_error}")
+        return result
+
+    @staticmethod
+    def _record(result, size):
+        entry = db.session.query(IngestedFile).filter_by(sha1=result['sha1']).first() or IngestedFile(sha1=result['sha1'])
+        entry.path = result['path']
+        entry.size = size
+        entry.sheets = ','.join(result['sheets'])
+        entry.row_count = result['rows']
+        entry.status = result['status']
+        entry.error = result['error']
+        entry.ingested_at = datetime.now()
+        db.session.add(entry)
@@ -0,0 +1,225 @@
+"""
+Async Feishu Sheet Client - asyncio 并发读取多个表格, values_batch_get 一次请求读取多个范围
+"""
+import asyncio
+import time
+
+import aiohttp
+
+import metrics
+from feishu_service import TenantTokenManager, FEISHU_BASE_URL, INVALID_TOKEN_CODES, column_letter
+from feishu_transport import FeishuTransport, FeishuTransportError, CircuitOpenError, RATE_LIMIT_CODES, RETRY_STATUS
+from feishu_scheduler import FeishuScheduler, SchedulerTimeout, INTERACTIVE, endpoint_class
+
+
+class AsyncFeishuSheetService:
+    """
+    Usage:
+        async with AsyncFeishuSheetService(app_id, app_secret) as feishu:
+            sheets = await feishu.read_sheets(spreadsheet_token, ["80e00b", "lCypKc"])
+
+    The tenant token and the circuit breaker are shared with the synchronous
+    FeishuSheetService (same process-level TenantTokenManager / FeishuTransport).
+    """
+    def __init__(self, app_id, app_secret, chunk_rows=1000, max_ranges_per_batch=10,
+                 max_concurrency=8, connect_timeout=3.05, read_timeout=15, max_retries=3, priority=INTERACTIVE):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = FEISHU_BASE_URL
+        self.chunk_rows = chunk_rows
+        self.max_ranges_per_batch = max_ranges_per_batch
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.priority = priority
+        # Same per-process rate limit buckets as the synchronous client
+        self.scheduler = FeishuScheduler.for_base_url(self.base_url)
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.transport = FeishuTransport.for_base_url(self.base_url)
+        # One breaker per base URL: sync and async reads open / recover it together
+        self.breaker = self.transport.breaker
+        self.token_manager = TenantTokenManager.for_app(self.base_url, app_id, app_secret, self.transport)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Per endpoint class: this client's coroutines queue for the rate limit in FIFO order
+        self._slot_locks = {}
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def _get_token(self, stale_token=None):
+        # Token refreshes are rare; run the shared sync manager off the event loop
+        return await asyncio.to_thread(self.token_manager.get_token, stale_token)
+
+    async def _wait_for_slot(self, url, endpoint):
+        lock = self._slot_locks.setdefault(endpoint_class(url), asyncio.Lock())
+        try:
+            async with lock:
+                waited = await self.scheduler.acquire_async(url, self.priority)
+        except SchedulerTimeout as e:
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='queue_timeout')
+            raise FeishuTransportError(str(e))
+        metrics.FEISHU_QUEUE_SECONDS.observe(waited, endpoint_class=endpoint_class(url), priority=self.priority)
+
+    async def _get_json(self, url, params=None):
+        """
+        GET with the tenant token: retries 429/5xx/rate-limit responses with
+        jittered exponential backoff and retries once on an invalid token.
+        Non-JSON bodies and exhausted retries raise FeishuTransportError,
+        an open circuit CircuitOpenError (same as FeishuTransport.request_json).
+        """
+        token = await self._get_token()
+        if not token:
+            raise FeishuTransportError("No tenant access token")
+
+        endpoint = metrics.feishu_endpoint(url)
+        # Queue for the rate limit before taking the breaker's half-open probe,
+        # so a queue timeout never leaves the breaker probing
+        await self._wait_for_slot(url, endpoint)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='circuit_open')
+            raise
+
+        try:
+            token_retried = False
+            reason = None
+            attempt = 0
+            first = True
+            while attempt <= self.max_retries:
+                if not first:
+                    await self._wait_for_slot(url, endpoint)
+                first = False
+                headers = {"Authorization": f"Bearer {token}"}
+                started = time.perf_counter()
+                data = None
+                retry_after = None
+                try:
+                    async with self._semaphore, self._session.get(url, headers=headers, params=params) as response:
+                        outcome = f"http_{response.status}"
+                        if response.status in RETRY_STATUS:
+                            retry_after = response.headers.get("Retry-After")
+                        else:
+                            try:
+                                data = await response.json(content_type=None)
+                            except ValueError:
+                                # e.g. an HTML error page from a gateway
+                                metrics.FEISHU_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                                metrics.FEISHU_REQUESTS.inc(endpoint=endpoint, outcome='invalid_json')
+                                metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='invalid_json')
+                                raise FeishuTransportError(f"GET {url} returned non-JSON body (HTTP {response.status})")
+                            outcome = 'rate_limited' if data.get("code") in RATE_LIMIT_CODES else \
+                                'ok' if data.get("code") == 0 else 'api_error'
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = outcome = type(e).__name__
+                metrics.FEISHU_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                metrics.FEISHU_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+                if data is not None:
+                    code = data.get("code")
+                    if code in INVALID_TOKEN_CODES and not token_retried:
+                        token_retried = True
+                        token = await self._get_token(stale_token=token)
+                        continue
+                    if code not in RATE_LIMIT_CODES:
+                        self.breaker.record_success()
+                        return data
+                    reason = f"rate limited (code={code})"
+                elif outcome.startswith('http_'):
+                    reason = f"HTTP {response.status}"
+
+                if attempt < self.max_retries:
+                    # Same backoff settings (and Retry-After handling) as the sync client
+                    delay = self.transport.backoff(attempt, retry_after)
+                    print(f"⚠️ Feishu {reason}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                attempt += 1
+
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='retries_exhausted')
+            raise FeishuTransportError(f"GET {url} failed after {self.max_retries + 1} attempts: {reason}")
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (e.g. a sibling read failed): not a Feishu failure, just free the probe
+            self.breaker.release_probe()
+            raise
+
+    async def get_meta(self, spreadsheet_token):
+        """ {sheet_id: (row_count, column_count)} plus the spreadsheet revision """
+        data = await self._get_json(f"{self.base_url}/sheets/v2/spreadsheets/{spreadsheet_token}/metainfo")
+        if data.get("code") != 0:
+            raise FeishuTransportError(f"Metainfo Error: code={data.get('code')}, msg={data.get('msg')}")
+        sheets = {
+            sheet["sheetId"]: (sheet.get("rowCount", 0), sheet.get("columnCount", 0))
+            for sheet in data.get("data", {}).get("sheets", [])
+        }
+        return sheets, data.get("data", {}).get("properties", {}).get("revision")
+
+    async def batch_get(self, spreadsheet_token, ranges):
+        """
+        Read many A1 ranges of one spreadsheet. Ranges are packed into
+        values_batch_get calls of max_ranges_per_batch, sent concurrently.
+        Returns the values of each range, in request order.
+        """
+        url = f"{self.base_url}/sheets/v2/spreadsheets/{spreadsheet_token}/values_batch_get"
+        batches = [ranges[i:i + self.max_ranges_per_batch] for i in range(0, len(ranges), self.max_ranges_per_batch)]
+
+        async def fetch(batch):
+            data = await self._get_json(url, params={"ranges": ",".join(batch), "valueRenderOption": "ToString"})
+            if data.get("code") != 0:
+                raise FeishuTransportError(f"API Error: code={data.get('code')}, msg={data.get('msg')}")
+            return [vr.get("values") or [] for vr in data.get("data", {}).get("valueRanges", [])]
+
+        results = await asyncio.gather(*(fetch(batch) for batch in batches))
+        return [values for batch in results for values in batch]
+
+    async def read_sheets(self, spreadsheet_token, sheet_ids, range_notation=None):
+        """
+        Read several sheets of one spreadsheet: one metainfo call, then every
+        row block of every sheet through values_batch_get.
+        Returns ({sheet_id: raw rows}, revision).
+        """
+        revision = None
+        if range_notation:
+            plan = {sheet_id: [f"{sheet_id}!{range_notation}"] for sheet_id in sheet_ids}
+        else:
+            dims, revision = await self.get_meta(spreadsheet_token)
+            plan = {}
+            for sheet_id in sheet_ids:
+                if sheet_id not in dims:
+                    # A fixed window would silently cut the sheet at its last row (as in the sync client)
+                    raise RuntimeError(f"Metainfo unavailable for sheet {sheet_id}, cannot size the read")
+                rows, cols = dims[sheet_id]
+                plan[sheet_id] = [
+                    f"{sheet_id}!A{start}:{column_letter(max(cols, 1) - 1)}{min(start + self.chunk_rows - 1, rows)}"
+                    for start in range(1, rows + 1, self.chunk_rows)
+                ]
+
+        ranges = [r for sheet_ranges in plan.values() for r in sheet_ranges]
+        values = await self.batch_get(spreadsheet_token, ranges) if ranges else []
+
+        result, offset = {}, 0
+        for sheet_id, sheet_ranges in plan.items():
+            result[sheet_id] = [row for block in values[offset:offset + len(sheet_ranges)] for row in block]
+            offset += len(sheet_ranges)
+        return result, revision
+
+    async def read_many(self, targets):
+        """
+        targets: {spreadsheet_token: [sheet_id, ...]} - every spreadsheet is
+        read concurrently. Returns {(spreadsheet_token, sheet_id): raw rows}.
+        """
+        tokens = list(targets)
+        results = await asyncio.gather(*(self.read_sheets(token, targets[token]) for token in tokens))
+        return {
+            (token, sheet_id): rows
+            for token, (sheets, _) in zip(tokens, results)
+            for sheet_id, rows in sheets.items()
+        }
@@ -0,0 +1,199 @@
+"""
+Feishu Scheduler - 按接口类别的令牌桶限流 + 优先级排队 + 相同请求合并 (single-flight)
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# 优先级: 数值越小越先执行 (页面请求优先于后台刷新)
+INTERACTIVE = 0
+BACKGROUND = 10
+
+# Endpoint classes with their default rate (requests/s) and burst; override with
+# FEISHU_QPS_<CLASS> / FEISHU_BURST_<CLASS>
+ENDPOINT_LIMITS = {
+    "auth": (5, 5),
+    "meta": (20, 20),
+    "read": (50, 50),
+}
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+def endpoint_class(url):
+    """ Feishu URL -> rate limit class """
+    if "/auth/" in url:
+        return "auth"
+    if url.rstrip("/").endswith("/metainfo"):
+        return "meta"
+    return "read"
+
+
+class TokenBucket:
+    """
+    rate 个令牌/秒, 最多积累 burst 个; 等待者按 (priority, 到达顺序) 出队,
+    所以排队时高优先级请求总是先拿到令牌
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """ Block until a token is granted; returns the seconds spent waiting """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == ticket and self._tokens >= 1:
+                        self._tokens -= 1
+                        return time.monotonic() - started
+                    wait = (1 - self._tokens) / self.rate if self._waiters[0] == ticket else None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise SchedulerTimeout(f"No Feishu rate limit token within {timeout}s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def try_acquire(self, priority=INTERACTIVE):
+        """
+        Take a token without blocking: 0 when granted, else the seconds until
+        one may be free. Blocked acquire() callers of the same or a higher
+        priority keep their place ahead of this caller.
+        """
+        with self._cond:
+            self._refill()
+            ahead = bool(self._waiters) and self._waiters[0][0] <= priority
+            if not ahead and self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return max(1 - self._tokens, 1 if ahead else 0) / self.rate
+
+    async def acquire_async(self, priority=INTERACTIVE, timeout=None):
+        """
+        acquire() for coroutines: sleeps on the event loop instead of blocking a
+        thread. Callers serialize their coroutines on an asyncio.Lock, so only one
+        of them polls the bucket at a time.
+        """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            wait = self.try_acquire(priority)
+            if not wait:
+                return time.monotonic() - started
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SchedulerTimeout(f"No Feishu rate limit token within {timeout}s")
+                wait = min(wait, remaining)
+            await asyncio.sleep(wait)
+
+    def queued(self):
+        with self._cond:
+            return len(self._waiters)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class FeishuScheduler:
+    """
+    Process-wide gate in front of the Feishu API (one per base URL):
+    every HTTP attempt takes a token from its endpoint class bucket, and
+    identical concurrent GETs share one in-flight call.
+    """
+    _schedulers = {}
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, limits=None, max_wait=30):
+        """
+        limits: {endpoint class: (rate, burst)}
+        max_wait: 排队超过该秒数则放弃 (SchedulerTimeout)
+        """
+        limits = limits or ENDPOINT_LIMITS
+        self.buckets = {name: TokenBucket(rate, burst) for name, (rate, burst) in limits.items()}
+        self.max_wait = max_wait
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        limits = {
+            name: (float(os.environ.get(f"FEISHU_QPS_{name.upper()}", rate)),
+                   float(os.environ.get(f"FEISHU_BURST_{name.upper()}", burst)))
+            for name, (rate, burst) in ENDPOINT_LIMITS.items()
+        }
+        return cls(limits, max_wait=float(os.environ.get("FEISHU_QUEUE_MAX_WAIT", 30)))
+
+    @classmethod
+    def for_base_url(cls, base_url):
+        with cls._schedulers_lock:
+            scheduler = cls._schedulers.get(base_url)
+            if scheduler is None:
+                scheduler = cls._schedulers[base_url] = cls.from_env()
+            return scheduler
+
+    def acquire(self, url, priority=INTERACTIVE):
+        """ Wait for a rate limit token for this URL's endpoint class """
+        bucket = self.buckets.get(endpoint_class(url)) or self.buckets["read"]
+        return bucket.acquire(priority, timeout=self.max_wait)
+
+    async def acquire_async(self, url, priority=INTERACTIVE):
+        """ acquire() without blocking the event loop (same buckets as the threads) """
+        bucket = self.buckets.get(endpoint_class(url)) or self.buckets["read"]
+        return await bucket.acquire_async(priority, timeout=self.max_wait)
+
+    def coalesce(self, key, fn):
+        """
+        Run fn() once for concurrent callers with the same key; the others
+        wait and get the same result (or exception)
+        """
+        with self._lock:
+            call = self._inflight.get(key)
+            owner = call is None
+            if owner:
+                call = self._inflight[key] = _Call()
+
+        if not owner:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
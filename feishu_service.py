@@ -1,80 +1,309 @@
 """
 Feishu Sheet Service - 飞书在线表格数据读取 (使用 HTTP API)
 """
-import requests
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-class FeishuSheetService:
-    def __init__(self, app_id, app_secret):
-        """
-        Initialize Feishu client
-        """
+import metrics
+from feishu_transport import FeishuTransport, FeishuTransportError
+from feishu_scheduler import INTERACTIVE
+from sheet_table import SheetTable
+
+# 飞书开放平台地址 (本地压测时指向 bench/feishu_stub.py)
+FEISHU_BASE_URL = os.environ.get('FEISHU_BASE_URL', 'https://open.feishu.cn/open-apis').rstrip('/')
+
+# 99991663: token 无效, 99991664: token 已过期
+INVALID_TOKEN_CODES = (99991663, 99991664)
+
+HEADER_PROBE_ROWS = 10
+
+# Known column names to detect header row
+KNOWN_HEADERS = ['统计日期', '日期', '开播场次', '直播间访问人数', '访客数', '支付金额', '活动节点']
+
+
+def column_letter(index):
+    """ 0 -> A, 25 -> Z, 26 -> AA """
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+@metrics.timed('header')
+def find_header_row(raw_data):
+    """
+    Find the header row (the row that contains known column names)
+    """
+    for i, row in enumerate(raw_data):
+        row_str = ' '.join([str(cell) for cell in row if cell])
+        if any(h in row_str for h in KNOWN_HEADERS):
+            return i
+    return None
+
+
+class TenantTokenManager:
+    """
+    进程级 tenant_access_token 管理: 按 Feishu 返回的 expire 提前刷新,
+    并发线程共享同一次刷新 (single-flight)
+    """
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, base_url, app_id, app_secret, transport, refresh_margin=300):
+        self.base_url = base_url
+        self.transport = transport
         self.app_id = app_id
         self.app_secret = app_secret
-        self.base_url = "https://open.feishu.cn/open-apis"
-        self.access_token = None
-    
-    def _get_tenant_access_token(self):
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_app(cls, base_url, app_id, app_secret, transport):
+        """ One shared manager per (base_url, app_id) in this process """
+        key = (base_url, app_id)
+        with cls._managers_lock:
+            manager = cls._managers.get(key)
+            if manager is None:
+                manager = cls(base_url, app_id, app_secret, transport)
+                cls._managers[key] = manager
+            return manager
+
+    def _is_fresh(self):
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    def get_token(self, stale_token=None):
         """
-        获取 tenant_access_token
+        Return a valid token. Pass stale_token when Feishu rejected it, so that
+        only the first caller refreshes and the others reuse the new token.
         """
-        if self.access_token:
-            return self.access_token
-        
+        token = self._token
+        if self._is_fresh() and token != stale_token:
+            return token
+
+        with self._lock:
+            if self._is_fresh() and self._token != stale_token:
+                return self._token
+            self._fetch_token()
+            return self._token
+
+    def _fetch_token(self):
         url = f"{self.base_url}/auth/v3/tenant_access_token/internal"
         payload = {
             "app_id": self.app_id,
             "app_secret": self.app_secret
         }
-        
-        response = requests.post(url, json=payload)
-        data = response.json()
-        
+
+        data = self.transport.request_json("POST", url, json=payload)
+
         if data.get("code") == 0:
-            self.access_token = data.get("tenant_access_token")
-            print(f"✅ Got access token: {self.access_token[:20]}...")
-            return self.access_token
+            self._token = data.get("tenant_access_token")
+            self._expires_at = time.monotonic() + int(data.get("expire", 7200))
+            print(f"✅ Got access token: {self._token[:20]}... (expires in {data.get('expire')}s)")
         else:
+            self._token = None
+            self._expires_at = 0
             print(f"❌ Failed to get token: {data}")
-            return None
-    
-    def get_sheet_data(self, spreadsheet_token, sheet_id, range_notation="A1:DZ1000"):
+
+
+class FeishuSheetService:
+    def __init__(self, app_id, app_secret, chunk_rows=1000, max_workers=4, priority=INTERACTIVE):
         """
-        Read data from Feishu Sheet
+        Initialize Feishu client
+
+        chunk_rows: 每次请求读取的行数
+        max_workers: 分块并发读取的最大并发数
+        priority: 限流排队优先级 (feishu_scheduler.INTERACTIVE / BACKGROUND)
         """
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = FEISHU_BASE_URL
+        self.transport = FeishuTransport.for_base_url(self.base_url)
+        self.token_manager = TenantTokenManager.for_app(self.base_url, app_id, app_secret, self.transport)
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+        self.priority = priority
+        # Spreadsheet revision seen by the last chunked read (None if unknown)
+        self.last_revision = None
+
+    def _get_tenant_access_token(self, stale_token=None):
+        """
+        获取 tenant_access_token (进程内共享, 过期前自动刷新)
+        """
+        with metrics.span('token'):
+            return self.token_manager.get_token(stale_token)
+
+    def _get_json(self, url, params=None):
+        """
+        GET with the tenant token; retries once with a fresh token if Feishu
+        reports the token as invalid or expired. Identical concurrent GETs
+        share one in-flight call.
+        """
+        scheduler = self.transport.scheduler
+        if scheduler is None:
+            return self._fetch_json(url, params)
+        key = (url, tuple(sorted((params or {}).items())))
+        owner = []
+
+        def call():
+            owner.append(True)
+            return self._fetch_json(url, params)
+
+        data = scheduler.coalesce(key, call)
+        if not owner:
+            metrics.FEISHU_COALESCED.inc(endpoint=metrics.feishu_endpoint(url))
+        return data
+
+    def _fetch_json(self, url, params=None):
         token = self._get_tenant_access_token()
         if not token:
-            return []
-        
-        # API: 读取单个范围
-        range_str = f"{sheet_id}!{range_notation}"
+            return None
+
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            data = self.transport.request_json("GET", url, headers=headers, params=params, priority=self.priority)
+            if data.get("code") not in INVALID_TOKEN_CODES or attempt:
+                return data
+
+            print(f"⚠️ Token rejected (code={data.get('code')}), refreshing and retrying")
+            token = self._get_tenant_access_token(stale_token=token)
+            if not token:
+                return data
+
+    def get_sheet_meta(self, spreadsheet_token, sheet_id):
+        """
+        读取表格元信息: 真实行数/列数 + 表格 revision
+        """
+        url = f"{self.base_url}/sheets/v2/spreadsheets/{spreadsheet_token}/metainfo"
+        data = self._get_json(url)
+        if data is None or data.get("code") != 0:
+            print(f"❌ Metainfo Error: {data}")
+            return None
+
+        revision = data.get("data", {}).get("properties", {}).get("revision")
+        for sheet in data.get("data", {}).get("sheets", []):
+            if sheet.get("sheetId") == sheet_id:
+                return {
+                    "row_count": sheet.get("rowCount", 0),
+                    "column_count": sheet.get("columnCount", 0),
+                    "revision": revision
+                }
+        print(f"❌ Sheet {sheet_id} not found in spreadsheet metainfo")
+        return None
+
+    def _read_range(self, spreadsheet_token, range_str):
+        """
+        Read one A1 range, raising on API errors
+        """
         url = f"{self.base_url}/sheets/v2/spreadsheets/{spreadsheet_token}/values/{range_str}"
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
         params = {
             "valueRenderOption": "ToString"
         }
-        
+        data = self._get_json(url, params=params)
+        if data is None:
+            raise RuntimeError("No tenant access token")
+        if data.get("code") != 0:
+            raise RuntimeError(f"API Error: code={data.get('code')}, msg={data.get('msg')}")
+        return data.get("data", {}).get("valueRange", {}).get("values", [])
+
+    @metrics.timed('feishu')
+    def get_sheet_data(self, spreadsheet_token, sheet_id, range_notation=None, columns=None, meta=None):
+        """
+        Read data from Feishu Sheet
+
+        range_notation: 读取固定范围 (旧行为); 为空时按元信息中的真实尺寸分块并发读取
+        columns: 只读取这些表头对应的列 (列投影), 为空时读取全部列
+        meta: 调用方已读取的 get_sheet_meta 结果, 避免重复请求 metainfo
+
+        Every failure is raised, never turned into an empty sheet: rate limiting /
+        network failures (FeishuTransportError) as well as API error codes
+        (permissions, auth, a missing token), so callers keep their last good data.
+        """
         try:
-            response = requests.get(url, headers=headers, params=params)
-            data = response.json()
-            
-            if data.get("code") == 0:
-                values = data.get("data", {}).get("valueRange", {}).get("values", [])
-                print(f"✅ Successfully read {len(values)} rows from Feishu")
-                return values
+            if range_notation:
+                values = self._read_range(spreadsheet_token, f"{sheet_id}!{range_notation}")
             else:
-                print(f"❌ API Error: code={data.get('code')}, msg={data.get('msg')}")
-                return []
-                
+                values = self._read_sheet_chunked(spreadsheet_token, sheet_id, columns, meta)
+            print(f"✅ Successfully read {len(values)} rows from Feishu")
+            return values
         except Exception as e:
-            print(f"❌ Exception: {e}")
+            print(f"❌ Feishu read failed: {e}")
+            raise
+
+    def _read_sheet_chunked(self, spreadsheet_token, sheet_id, columns=None, meta=None):
+        meta = meta or self.get_sheet_meta(spreadsheet_token, sheet_id)
+        if not meta:
+            # A fixed window would silently cut the sheet (and the mirror) at its last row
+            raise RuntimeError(f"Metainfo unavailable for sheet {sheet_id}, cannot size the read")
+        self.last_revision = meta["revision"]
+
+        row_count, column_count = meta["row_count"], meta["column_count"]
+        if not row_count or not column_count:
             return []
+
+        spans = [(0, column_count - 1)]
+        if columns:
+            spans = self._project_columns(spreadsheet_token, sheet_id, column_count, columns) or spans
+
+        blocks = [(start, min(start + self.chunk_rows - 1, row_count))
+                  for start in range(1, row_count + 1, self.chunk_rows)]
+        ranges = [f"{sheet_id}!{column_letter(c1)}{r1}:{column_letter(c2)}{r2}"
+                  for r1, r2 in blocks for c1, c2 in spans]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ranges))) as pool:
+            results = list(pool.map(lambda r: self._read_range(spreadsheet_token, r), ranges))
+
+        # Stitch column spans side by side, then row blocks top to bottom
+        values = []
+        for b, (r1, r2) in enumerate(blocks):
+            parts = results[b * len(spans):(b + 1) * len(spans)]
+            height = max(len(part) for part in parts)
+            for i in range(height):
+                row = []
+                for (c1, c2), part in zip(spans, parts):
+                    cells = list(part[i]) if i < len(part) else []
+                    width = c2 - c1 + 1
+                    row.extend(cells[:width] + [None] * (width - len(cells)))
+                values.append(row)
+        return values
+
+    def _project_columns(self, spreadsheet_token, sheet_id, column_count, columns):
+        """
+        Probe the top rows for the header row and return contiguous
+        (first, last) column index spans covering the wanted columns.
+        """
+        probe = self._read_range(
+            spreadsheet_token,
+            f"{sheet_id}!A1:{column_letter(column_count - 1)}{HEADER_PROBE_ROWS}"
+        )
+        header_row_index = find_header_row(probe)
+        if header_row_index is None:
+            return None
+
+        headers = probe[header_row_index]
+        wanted = set(columns)
+        indexes = sorted(i for i, h in enumerate(headers) if h is not None and str(h).strip() in wanted)
+        if not indexes:
+            return None
+
+        spans = []
+        for i in indexes:
+            if spans and i == spans[-1][1] + 1:
+                spans[-1] = (spans[-1][0], i)
+            else:
+                spans.append((i, i))
+        return spans
     
+    @metrics.timed('parse')
     def parse_to_daily_sales(self, raw_data):
         """
         Convert raw Feishu data to DailySales format
@@ -86,17 +315,7 @@ class FeishuSheetService:
             print(f"⚠️ Insufficient data: {len(raw_data) if raw_data else 0} rows")
             return records
         
-        # Known column names to detect header row
-        known_headers = ['统计日期', '日期', '开播场次', '直播间访问人数', '访客数', '支付金额', '活动节点']
-        
-        # Find the header row (the row that contains known column names)
-        header_row_index = 0
-        for i, row in enumerate(raw_data):
-            row_str = ' '.join([str(cell) for cell in row if cell])
-            if any(h in row_str for h in known_headers):
-                header_row_index = i
-                break
-        
+        header_row_index = find_header_row(raw_data) or 0
         headers = raw_data[header_row_index]
         print(f"📋 Found headers at row {header_row_index}: {headers[:10]}...")  # Only show first 10
         
@@ -112,3 +331,24 @@ class FeishuSheetService:
         print(f"✅ Parsed {len(records)} records")
         return records
 
+    def parse_headers(self, raw_data):
+        """ Column names in sheet order, as parse_to_table names them (same header detection) """
+        if not raw_data:
+            return []
+        header_row_index = find_header_row(raw_data) or 0
+        return list(dict.fromkeys(str(h) for h in raw_data[header_row_index] if h))
+
+    @metrics.timed('parse')
+    def parse_to_table(self, raw_data, schema=()):
+        """
+        Convert raw Feishu data to a columnar SheetTable, cleaning the schema
+        columns once (same header detection as parse_to_daily_sales)
+        """
+        if not raw_data or len(raw_data) < 2:
+            print(f"⚠️ Insufficient data: {len(raw_data) if raw_data else 0} rows")
+            return SheetTable([], {}, schema)
+
+        header_row_index = find_header_row(raw_data) or 0
+        table = SheetTable.from_rows(raw_data[header_row_index], raw_data[header_row_index + 1:], schema)
+        print(f"✅ Parsed {len(table)} rows x {len(table.headers)} columns")
+        return table
@@ -0,0 +1,197 @@
+"""
+Feishu Transport - 连接池 + 超时 + 重试退避 + 熔断
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from feishu_scheduler import FeishuScheduler, SchedulerTimeout, INTERACTIVE, endpoint_class
+
+# 99991400: 应用频控, 90217: 表格接口请求过于频繁
+RATE_LIMIT_CODES = (99991400, 90217)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class FeishuTransportError(Exception):
+    pass
+
+
+class CircuitOpenError(FeishuTransportError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后熔断 reset_timeout 秒, 期间直接失败;
+    之后放行一次试探请求 (half-open), 成功则恢复
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError("Feishu circuit is open, failing fast")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """ The call was abandoned (cancelled): neither outcome, the next call may probe again """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"🔌 Feishu circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+class FeishuTransport:
+    """
+    Process-wide HTTP client for one Feishu base URL: pooled keep-alive
+    connections, (connect, read) timeouts, exponential backoff with full
+    jitter on 429/5xx/rate-limit codes, a circuit breaker, and the
+    FeishuScheduler rate limit (every attempt waits for a token).
+    """
+    _transports = {}
+    _transports_lock = threading.Lock()
+
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=15,
+                 max_retries=3, backoff_base=0.5, backoff_max=8, breaker=None, scheduler=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def for_base_url(cls, base_url):
+        with cls._transports_lock:
+            transport = cls._transports.get(base_url)
+            if transport is None:
+                transport = cls(scheduler=FeishuScheduler.for_base_url(base_url))
+                cls._transports[base_url] = transport
+            return transport
+
+    def backoff(self, attempt, retry_after=None):
+        """ Seconds to wait before retry `attempt` + 1: Retry-After when given, else full jitter """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _observe(endpoint, started, outcome):
+        metrics.FEISHU_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        metrics.FEISHU_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+    def _wait_for_slot(self, url, endpoint, priority):
+        if self.scheduler is None:
+            return
+        try:
+            waited = self.scheduler.acquire(url, priority)
+        except SchedulerTimeout as e:
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='queue_timeout')
+            raise FeishuTransportError(str(e))
+        metrics.FEISHU_QUEUE_SECONDS.observe(waited, endpoint_class=endpoint_class(url), priority=priority)
+
+    def request_json(self, method, url, timeout=None, priority=INTERACTIVE, **kwargs):
+        """
+        Send the request and return the decoded JSON body.
+        Raises FeishuTransportError once retries are exhausted, the rate limit
+        queue times out or the request cannot be sent, or CircuitOpenError
+        while the breaker is open.
+        """
+        endpoint = metrics.feishu_endpoint(url)
+        # Queue for the rate limit before taking the breaker's half-open probe,
+        # so a queue timeout never leaves the breaker probing
+        self._wait_for_slot(url, endpoint, priority)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='circuit_open')
+            raise
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        reason = None
+
+        # Every exit records an outcome, otherwise a half-open breaker stays probing for good
+        try:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                if attempt:
+                    self._wait_for_slot(url, endpoint, priority)
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    reason = f"{type(e).__name__}: {e}"
+                    outcome = type(e).__name__
+                except requests.RequestException as e:
+                    # Not worth retrying (invalid URL, too many redirects, ...)
+                    self._observe(endpoint, started, type(e).__name__)
+                    metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='request_error')
+                    raise FeishuTransportError(f"{method} {url} failed: {type(e).__name__}: {e}")
+                else:
+                    outcome = f"http_{response.status_code}"
+                    if response.status_code in RETRY_STATUS:
+                        reason = f"HTTP {response.status_code}"
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        try:
+                            data = response.json()
+                        except ValueError:
+                            self._observe(endpoint, started, 'invalid_json')
+                            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='invalid_json')
+                            raise FeishuTransportError(f"{method} {url} returned non-JSON body (HTTP {response.status_code})")
+                        if data.get("code") in RATE_LIMIT_CODES:
+                            reason = f"rate limited (code={data.get('code')})"
+                            outcome = 'rate_limited'
+                        else:
+                            self._observe(endpoint, started, 'ok' if data.get("code") == 0 else 'api_error')
+                            self.breaker.record_success()
+                            return data
+                self._observe(endpoint, started, outcome)
+
+                if attempt < self.max_retries:
+                    delay = self.backoff(attempt, retry_after)
+                    print(f"⚠️ Feishu {reason}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                    time.sleep(delay)
+
+            metrics.FEISHU_ERRORS.inc(endpoint=endpoint, reason='retries_exhausted')
+            raise FeishuTransportError(f"{method} {url} failed after {self.max_retries + 1} attempts: {reason}")
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # KeyboardInterrupt / SystemExit mid-call: no verdict on Feishu, just free the probe
+            self.breaker.release_probe()
+            raise
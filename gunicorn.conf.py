@@ -0,0 +1,10 @@
+"""
+gunicorn settings (picked up from the working directory; the Procfile also passes -c)
+"""
+
+
+def post_worker_init(worker):
+    # Each worker serves the last on-disk snapshots before its first request;
+    # CLI commands (flask --app app ...) never run this hook, so never load them
+    from app import seed_from_snapshots
+    seed_from_snapshots()
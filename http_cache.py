@@ -0,0 +1,93 @@
+"""
+HTTP caching helpers - ETag / Last-Modified 条件请求 + gzip/brotli 压缩
+"""
+import gzip
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import jsonify, request, make_response
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def conditional(version_fn, max_age=30):
+    """
+    Decorate a JSON view with conditional GET support.
+
+    version_fn(**view_kwargs) returns (version, last_modified) for the data the
+    view reads, cheaply and without computing the response. A matching
+    If-None-Match / If-Modified-Since answers 304 without calling the view.
+
+    When version_fn fails the view is not called: it would read the same data
+    (e.g. retry an unreachable Feishu a second time) and fail the same way.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version, last_modified = version_fn(**kwargs)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                print(f"❌ Could not compute data version for {request.path}: {e}")
+                return jsonify({"error": str(e)}), 500
+
+            if isinstance(last_modified, (int, float)):
+                last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+            last_modified = last_modified.replace(microsecond=0) if last_modified else None
+            etag = str(version)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif last_modified and request.if_modified_since:
+                not_modified = last_modified <= request.if_modified_since
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                # Weak: the body may be served gzip/brotli encoded
+                response.set_etag(etag, weak=True)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.cache_control.private = True
+                response.cache_control.max_age = max_age
+            return response
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """
+    after_request hook: brotli/gzip encode large text responses when the
+    client accepts it
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    with metrics.span('compress'):
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(body, quality=5))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(body, compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            return response
+
+    response.vary.add('Accept-Encoding')
+    return response
@@ -1,17 +1,42 @@
-import pandas as pd
+"""
+Peek at Excel exports before ingesting them: columns, first row and dtypes of
+every sheet, and whether `flask ingest-dir` would import the sheet.
+
+    python inspect_excel.py [file.xlsx | directory ...]   (default: INGEST_DIR, i.e. drop/)
+"""
 import os
+import sys
+
+import pandas as pd
+
+from drop_ingest import EXTENSIONS, ingestable
+
+DEFAULT_DIR = os.environ.get('INGEST_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drop')
+
+
+def workbook_paths(args):
+    for arg in args or [DEFAULT_DIR]:
+        if os.path.isdir(arg):
+            for name in sorted(os.listdir(arg)):
+                if name.lower().endswith(EXTENSIONS) and not name.startswith('~$'):
+                    yield os.path.join(arg, name)
+        else:
+            yield arg
+
+
+for excel_path in workbook_paths(sys.argv[1:]):
+    try:
+        # Read the first few rows of every sheet to understand structure
+        for sheet_name, df in pd.read_excel(excel_path, sheet_name=None, nrows=5).items():
+            status = 'will be imported' if ingestable(df.columns) else 'skipped (no 日期 column)'
+            print(f"\n=== {excel_path} [{sheet_name}]: {status}")
+            print("Columns:", df.columns.tolist())
+            if len(df):
+                print("\nFirst row sample:")
+                print(df.iloc[0])
 
-excel_path = r'c:\Users\Administrator\Desktop\电商bi看板搭建\新建 Microsoft Excel 工作表 (2).xlsx'
-
-try:
-    # Read the first few rows to understand structure
-    df = pd.read_excel(excel_path, nrows=5)
-    print("Columns:", df.columns.tolist())
-    print("\nFirst row sample:")
-    print(df.iloc[0])
-    
-    # Check data types
-    print("\nData Types:")
-    print(df.dtypes)
-except Exception as e:
-    print(f"Error reading Excel: {e}")
+            # Check data types
+            print("\nData Types:")
+            print(df.dtypes)
+    except Exception as e:
+        print(f"Error reading Excel {excel_path}: {e}")
@@ -0,0 +1,245 @@
+"""
+Metrics - 请求分阶段耗时 (Server-Timing) + Prometheus 文本格式指标 (进程内, 无额外依赖)
+
+    with metrics.span('parse'):
+        ...
+
+Spans feed the `stage_duration_seconds` histogram and, inside a Flask request,
+the response's Server-Timing header. Counters / histograms are per process:
+with several gunicorn workers each worker reports its own series.
+"""
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value:g}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, series):
+        counts, total, count = series
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', f'{bound:g}')])} {n}"
+            for bound, n in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total:g}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Flask request latency', ('route', 'method', 'status')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'stage_duration_seconds', 'Time spent per processing stage (token, feishu, header, parse, aggregate, serialize, ...)',
+    ('stage',)))
+FEISHU_REQUESTS = REGISTRY.register(Counter(
+    'feishu_requests_total', 'Feishu API HTTP attempts by endpoint and outcome', ('endpoint', 'outcome')))
+FEISHU_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'feishu_request_duration_seconds', 'Feishu API HTTP attempt latency', ('endpoint',)))
+FEISHU_ERRORS = REGISTRY.register(Counter(
+    'feishu_errors_total', 'Feishu calls that failed after retries', ('endpoint', 'reason')))
+FEISHU_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    'feishu_queue_wait_seconds', 'Time waiting for a Feishu rate limit token', ('endpoint_class', 'priority'),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+FEISHU_COALESCED = REGISTRY.register(Counter(
+    'feishu_coalesced_total', 'Feishu GETs answered by an identical in-flight call', ('endpoint',)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'sheet_cache_requests_total', 'Sheet cache lookups: hit, stale (served while refreshing), miss, coalesced',
+    ('result',)))
+SHEET_ROWS = REGISTRY.register(Gauge(
+    'sheet_rows', 'Rows in the latest loaded table per sheet', ('sheet_id',)))
+
+FEISHU_ENDPOINT_RE = re.compile(r'/(tenant_access_token|metainfo|values_batch_get|values)\b')
+
+
+def feishu_endpoint(url):
+    """ URL -> low-cardinality endpoint label """
+    m = FEISHU_ENDPOINT_RE.search(url)
+    return m.group(1) if m else 'other'
+
+
+# --- Spans ---
+
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+_active = threading.local()
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a stage. Nested spans of the same stage (e.g. get_dashboard calling
+    get_overview) are only counted once, by the outermost one.
+    """
+    active = getattr(_active, 'stages', None)
+    if active is None:
+        active = _active.stages = set()
+    if stage in active:
+        yield
+        return
+
+    active.add(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        active.discard(stage)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            total, count = spans.get(stage, (0.0, 0))
+            spans[stage] = (total + elapsed, count + 1)
+
+
+def timed(stage):
+    """ Decorator form of span() """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Flask integration ---
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """ jsonify() with a 'serialize' span """
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_token = _request_spans.set({})
+
+
+def _finish_request(response):
+    started = g.pop('_metrics_started', None)
+    token = g.pop('_metrics_token', None)
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    spans = _request_spans.get() or {}
+    _request_spans.reset(token)
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+
+    timings = [f"{stage};dur={total * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else '')
+               for stage, (total, count) in spans.items()]
+    timings.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def init_app(app):
+    """
+    Register the request timing hooks and the timed JSON provider.
+    Call before registering other after_request hooks so their time
+    (e.g. compression) is included in the total.
+    """
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,133 @@
+"""
+Schema migrations for existing ecommerce.db files (SQLite, no Alembic)
+"""
+import re
+
+from sqlalchemy import inspect, text
+from database import db
+from sheet_table import clean_column
+from models import DailySales, FeishuSyncState, SalesRollupState
+from services import RollupService
+
+# Parsed dates (clean_column leaves text it can't parse as is)
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+DATE_BATCH = 5000
+
+RATE_COLUMNS = ('pay_conversion_rate', 'consult_rate', 'old_buyer_rate', 'dispute_rate', 'chat_satisfaction')
+
+# Nullable columns added to existing tables after they were first created
+ADDED_COLUMNS = ((FeishuSyncState, 'headers'),)
+
+
+def _rate_sql(column):
+    """ '12.3%' -> 0.123, '12.3' -> 0.123 (above 1: a percentage, as clean_column), '0.123' -> 0.123, junk -> 0.0 """
+    value = f"REPLACE(TRIM({column}), ',', '')"
+    number = f"CAST({value} AS REAL)"
+    return (f"CASE WHEN {value} LIKE '%\\%' ESCAPE '\\' "
+            f"THEN CAST(REPLACE({value}, '%', '') AS REAL) / 100.0 "
+            f"WHEN {number} > 1 THEN {number} / 100.0 "
+            f"ELSE {number} END")
+
+
+def _migrate_daily_sales_types(conn):
+    """
+    String date / rate columns -> DATE / REAL.
+    SQLite cannot ALTER COLUMN, so the table is rebuilt and the rows copied.
+    Dates go through the same clean_column('date') normalization as ingest
+    (SQLite's date() turns '2024/1/5' or '2024年1月5日' into NULL). Rows whose
+    non-empty date still can't be parsed are reported, and the old table is
+    kept as daily_sales_unmigrated instead of being dropped.
+    """
+    print("Migrating daily_sales to typed date/rate columns...")
+    columns = [c.name for c in DailySales.__table__.columns]
+    select_exprs = []
+    for name in columns:
+        if name == 'date':
+            select_exprs.append("NULL")
+        elif name in RATE_COLUMNS:
+            select_exprs.append(_rate_sql(name))
+        else:
+            select_exprs.append(name)
+
+    conn.execute(text("ALTER TABLE daily_sales RENAME TO daily_sales_old"))
+    DailySales.__table__.create(conn)
+    conn.execute(text(
+        f"INSERT INTO daily_sales ({', '.join(columns)}) "
+        f"SELECT {', '.join(select_exprs)} FROM daily_sales_old"
+    ))
+
+    ids, raw_dates = [], []
+    for row_id, value in conn.execute(text("SELECT id, date FROM daily_sales_old")):
+        ids.append(row_id)
+        raw_dates.append(value)
+    iso = clean_column(raw_dates, 'date')
+    updates, failed = [], []
+    for row_id, raw, value in zip(ids, raw_dates, iso):
+        if ISO_DATE.match(value):
+            updates.append({"id": row_id, "date": value[:10]})
+        elif value:
+            failed.append(raw)
+    for i in range(0, len(updates), DATE_BATCH):
+        conn.execute(text("UPDATE daily_sales SET date = :date WHERE id = :id"), updates[i:i + DATE_BATCH])
+
+    if failed:
+        examples = ', '.join(repr(value) for value in list(dict.fromkeys(failed))[:5])
+        conn.execute(text("ALTER TABLE daily_sales_old RENAME TO daily_sales_unmigrated"))
+        print(f"⚠️ {len(failed)} daily_sales rows have a date that could not be parsed (e.g. {examples}); "
+              f"they are kept with an empty date, the original table is kept as daily_sales_unmigrated")
+    else:
+        conn.execute(text("DROP TABLE daily_sales_old"))
+
+
+def _missing_columns(inspector):
+    """ [(model, column name)] of ADDED_COLUMNS the database doesn't have yet """
+    return [(model, name) for model, name in ADDED_COLUMNS
+            if name not in {c['name'] for c in inspector.get_columns(model.__tablename__)}]
+
+
+def schema_current():
+    """
+    True when every table exists and daily_sales needs no upgrade (read-only
+    check, so workers can skip the schema lock on an up-to-date database)
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    if not set(db.metadata.tables) <= tables:
+        return False
+    date_type = next(c['type'] for c in inspector.get_columns('daily_sales') if c['name'] == 'date')
+    indexes = {index['name'] for index in inspector.get_indexes('daily_sales')}
+    return (str(date_type).upper().startswith('DATE')
+            and all(index.name in indexes for index in DailySales.__table__.indexes)
+            and not _missing_columns(inspector))
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the current models. Safe to run repeatedly;
+    call after db.create_all() inside an app context.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for model, name in _missing_columns(inspector):
+            column = model.__table__.columns[name]
+            conn.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN {name} "
+                              f"{column.type.compile(dialect=conn.dialect)}"))
+    if 'daily_sales' not in inspector.get_table_names():
+        return
+
+    date_type = next(c['type'] for c in inspector.get_columns('daily_sales') if c['name'] == 'date')
+    migrated = False
+    with db.engine.begin() as conn:
+        if not str(date_type).upper().startswith('DATE'):
+            _migrate_daily_sales_types(conn)
+            migrated = True
+        for index in DailySales.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+    if migrated:
+        RollupService.rebuild()
+        print("daily_sales migration completed.")
+    elif db.session.get(SalesRollupState, 1) is None and db.session.query(DailySales.id).first() is not None:
+        # Rollups built before the watermark existed can't be trusted, rebuild once
+        print("Rebuilding sales rollups (no rollup watermark yet)...")
+        RollupService.rebuild()
@@ -1,15 +1,20 @@
 from database import db
 
 # Mapping 'Sales' from Excel
+# Rate columns hold fractions (0.123 = 12.3%); see migrations.py for the
+# upgrade from the old string-typed schema
 class DailySales(db.Model):
     __tablename__ = 'daily_sales'
+    __table_args__ = (
+        db.Index('ix_daily_sales_date_category', 'date', 'category'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.String)          # 日期
+    date = db.Column(db.Date)            # 日期
     category = db.Column(db.String)      # 类别
     payment_amount = db.Column(db.Float) # 支付金额
     visitors = db.Column(db.Integer)     # 访客数
-    pay_conversion_rate = db.Column(db.String) # 支付转化率
+    pay_conversion_rate = db.Column(db.Float) # 支付转化率
 
     # --- Finance & Sales Depth ---
     item_count = db.Column(db.Integer)     # 支付件数
@@ -21,16 +26,103 @@ class DailySales(db.Model):
     # --- Conversion Funnel ---
     add_to_cart_users = db.Column(db.Integer)   # 加购人数
     add_to_cart_count = db.Column(db.Integer)   # 加购件数
-    consult_rate = db.Column(db.String)         # 咨询率
+    consult_rate = db.Column(db.Float)          # 咨询率
 
     # --- Retention (Old Customers) ---
     old_buyer_pay_amount = db.Column(db.Float)  # 老客复购金额
     old_buyer_pay_count = db.Column(db.Integer) # 老客复购人数
-    old_buyer_rate = db.Column(db.String)       # 老客复购率
+    old_buyer_rate = db.Column(db.Float)        # 老客复购率
     
     # --- Service & Logistics ---
     chat_response_time = db.Column(db.Float)    # 旺旺人工响应时长(秒)
     logistics_time = db.Column(db.Float)        # 物流到货时长(小时)
     refund_duration = db.Column(db.Float)       # 退款处理时长(天)
-    dispute_rate = db.Column(db.String)         # 纠纷投诉商责率
-    chat_satisfaction = db.Column(db.String)    # 旺旺满意度
+    dispute_rate = db.Column(db.Float)          # 纠纷投诉商责率
+    chat_satisfaction = db.Column(db.Float)     # 旺旺满意度
+
+
+# Mirror of Feishu sheet rows (see FeishuSyncService)
+class FeishuSheetRow(db.Model):
+    __tablename__ = 'feishu_sheet_rows'
+    __table_args__ = (
+        db.UniqueConstraint('spreadsheet_token', 'sheet_id', 'row_key', name='uq_feishu_sheet_row'),
+        db.Index('ix_feishu_sheet_rows_sheet_index', 'spreadsheet_token', 'sheet_id', 'row_index'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_token = db.Column(db.String, nullable=False)
+    sheet_id = db.Column(db.String, nullable=False)
+    row_key = db.Column(db.String, nullable=False)    # 日期 + 序号, 无日期列时为行号
+    row_index = db.Column(db.Integer, nullable=False) # 在表格中的顺序
+    row_hash = db.Column(db.String, nullable=False)   # 行内容 sha1, 用于增量比对
+    data = db.Column(db.Text, nullable=False)         # JSON: {表头: 值}
+
+
+class FeishuSyncState(db.Model):
+    __tablename__ = 'feishu_sync_state'
+    __table_args__ = (
+        db.UniqueConstraint('spreadsheet_token', 'sheet_id', name='uq_feishu_sync_state'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_token = db.Column(db.String, nullable=False)
+    sheet_id = db.Column(db.String, nullable=False)
+    revision = db.Column(db.Integer)       # 上次同步时的表格 revision
+    row_count = db.Column(db.Integer)
+    headers = db.Column(db.Text)           # JSON: 表头 (按表格列顺序), 行数据按此顺序还原
+    synced_at = db.Column(db.DateTime)     # 同步水位
+
+
+# Pre-aggregated daily_sales at day/week/month x category grain (see RollupService)
+class SalesRollup(db.Model):
+    __tablename__ = 'sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('grain', 'period_start', 'category', name='uq_sales_rollup'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    grain = db.Column(db.String, nullable=False)        # day / week (周一开始) / month
+    period_start = db.Column(db.Date, nullable=False)   # 周期第一天
+    category = db.Column(db.String)
+    row_count = db.Column(db.Integer)
+
+    # --- Sums ---
+    payment_amount = db.Column(db.Float)
+    visitors = db.Column(db.Integer)
+    item_count = db.Column(db.Integer)
+    order_count = db.Column(db.Integer)
+    success_refund_amount = db.Column(db.Float)
+    add_to_cart_users = db.Column(db.Integer)
+
+    # --- Sum / count pairs for averages ---
+    logistics_time_sum = db.Column(db.Float)
+    logistics_time_count = db.Column(db.Integer)
+    chat_response_time_sum = db.Column(db.Float)
+    chat_response_time_count = db.Column(db.Integer)
+    refund_duration_sum = db.Column(db.Float)
+    refund_duration_count = db.Column(db.Integer)
+
+
+# Watermark of the rows sales_rollup covers: readers only use the rollups while
+# daily_sales_max_id still matches daily_sales (see RollupService.available)
+class SalesRollupState(db.Model):
+    __tablename__ = 'sales_rollup_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    daily_sales_max_id = db.Column(db.Integer)   # max(daily_sales.id) 在上次刷新时的值
+    refreshed_at = db.Column(db.DateTime)
+
+
+# Workbooks imported from the drop directory (see drop_ingest), keyed by content hash
+class IngestedFile(db.Model):
+    __tablename__ = 'ingested_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha1 = db.Column(db.String, nullable=False, unique=True)  # 文件内容 sha1, 相同内容只导入一次
+    path = db.Column(db.String, nullable=False)                # 最近一次导入时的路径
+    size = db.Column(db.Integer)
+    sheets = db.Column(db.String)          # 导入的工作表名, 逗号分隔
+    row_count = db.Column(db.Integer)
+    status = db.Column(db.String, nullable=False)  # ok / error (error 的文件下次扫描会重试)
+    error = db.Column(db.Text)
+    ingested_at = db.Column(db.DateTime)
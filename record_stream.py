@@ -0,0 +1,57 @@
+"""
+Record Stream - 原始数据分页游标 + NDJSON 流式输出
+
+Rows are encoded with orjson when it is installed (several times faster than
+the json module on wide sheets), one batch at a time, so neither the record
+list nor the response body is ever built for the whole sheet.
+
+Only the encoding is streamed: the rows come from the cached SheetTable, which
+is always read and parsed in full first (its content version is the ETag and the
+cursor's version, its length the X-Total-Count), also on a cache miss.
+"""
+import base64
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+BATCH_ROWS = 1000
+
+
+class StaleCursor(Exception):
+    """ The cursor was issued for an older version of the sheet """
+
+
+def dumps(obj):
+    """ JSON bytes (UTF-8, no ASCII escaping) """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def encode_cursor(version, offset):
+    return base64.urlsafe_b64encode(f"{version[:16]}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, version):
+    """ Cursor -> row offset (0 for no cursor); StaleCursor when the sheet changed since """
+    if not cursor:
+        return 0
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        cursor_version, offset = text.rsplit(':', 1)
+        offset = int(offset)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if cursor_version != version[:16]:
+        raise StaleCursor("The sheet changed since this cursor was issued, start again without cursor")
+    return max(offset, 0)
+
+
+def ndjson_lines(batches):
+    """ Record batches -> NDJSON chunks (one chunk per batch) """
+    for records in batches:
+        if records:
+            yield b'\n'.join(dumps(record) for record in records) + b'\n'
@@ -1,135 +1,1235 @@
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, insert, delete, select, literal, tuple_, Integer
+from datetime import datetime, date, timedelta
+from openpyxl import load_workbook
+import contextlib
+import hashlib
+import json
+import time
+import numpy as np
 import pandas as pd
 import os
-from models import DailySales
+import threading
+from models import DailySales, FeishuSheetRow, FeishuSyncState, SalesRollup, SalesRollupState
 from database import db
+from sheet_table import ColumnSpec, SheetTable, clean_column
+from downsample import downsample_indices
+import metrics
+
+try:
+    import duckdb
+except ImportError:  # optional: pip install duckdb (ANALYTICS_BACKEND=duckdb)
+    duckdb = None
 
 class IngestionService:
+    # Excel column -> (DailySales field, kind)
+    EXCEL_COLUMNS = {
+        '日期': ('date', 'date'),
+        '类别': ('category', 'text'),
+        '支付金额': ('payment_amount', 'float'),
+        '访客数': ('visitors', 'int'),
+        '支付转化率': ('pay_conversion_rate', 'rate'),  # '12.3%' -> 0.123
+
+        # Finance
+        '支付件数': ('item_count', 'int'),
+        '支付子订单数': ('order_count', 'int'),
+        '客单价': ('avg_order_value', 'float'),
+        '成功退款金额': ('success_refund_amount', 'float'),
+        '浏览量': ('item_view_count', 'int'),
+
+        # Funnel
+        '加购人数': ('add_to_cart_users', 'int'),
+        '加购件数': ('add_to_cart_count', 'int'),
+        '咨询率': ('consult_rate', 'rate'),
+
+        # Retention
+        '老客复购金额': ('old_buyer_pay_amount', 'float'),
+        '老客复购人数': ('old_buyer_pay_count', 'int'),
+        '老客复购率': ('old_buyer_rate', 'rate'),
+
+        # Service
+        '旺旺人工响应时长(秒)': ('chat_response_time', 'float'),
+        '物流到货时长(小时)': ('logistics_time', 'float'),
+        '退款处理时长(天)': ('refund_duration', 'float'),
+        '纠纷投诉商责率': ('dispute_rate', 'rate'),
+        '旺旺满意度': ('chat_satisfaction', 'rate'),
+    }
+    CHUNK_ROWS = 5000
+    # SQLite bind-parameter budget per (date, category) IN clause
+    KEY_BATCH = 400
+
+    @staticmethod
+    def iter_sheet_chunks(worksheet, chunk_rows=None):
+        """ Stream one (read-only) worksheet as DataFrames of chunk_rows rows, header row -> columns """
+        chunk_rows = chunk_rows or IngestionService.CHUNK_ROWS
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else '' for h in header]
+        batch = []
+        for row in rows:
+            if not any(cell is not None for cell in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+
+    @staticmethod
+    def iter_excel_chunks(file_path, chunk_rows=None):
+        """
+        Stream the first worksheet as DataFrames of chunk_rows rows
+        (openpyxl read-only mode, the workbook is never fully loaded)
+        """
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from IngestionService.iter_sheet_chunks(workbook.active, chunk_rows)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _to_date(value):
+        try:
+            return date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def clean_chunk(df):
+        """
+        Vectorized column cleaning: Excel DataFrame -> list of DailySales row dicts
+        """
+        columns = {}
+        for excel_name, (field, kind) in IngestionService.EXCEL_COLUMNS.items():
+            raw = df[excel_name] if excel_name in df.columns else pd.Series([None] * len(df), dtype=object)
+            if kind == 'float':
+                columns[field] = np.nan_to_num(clean_column(raw.to_numpy(), 'number')).tolist()
+            elif kind == 'int':
+                columns[field] = np.nan_to_num(clean_column(raw.to_numpy(), 'number')).astype(np.int64).tolist()
+            elif kind == 'rate':
+                columns[field] = np.nan_to_num(clean_column(raw.to_numpy(), 'percent')).tolist()
+            elif kind == 'date':
+                iso = clean_column(raw.to_numpy(), 'date')
+                columns[field] = [IngestionService._to_date(value) for value in iso]
+            else:
+                columns[field] = clean_column(raw.to_numpy(), kind).tolist()
+
+        fields = list(columns)
+        return [dict(zip(fields, values)) for values in zip(*columns.values())]
+
+    @staticmethod
+    def write_rows(chunks, mode='append'):
+        """
+        Write chunks of cleaned rows (clean_chunk output) into daily_sales and
+        refresh the rollups they touch, without committing (the caller commits
+        or rolls back, so rows and rollups land in one transaction).
+
+        mode: append  - insert every row
+              replace - wipe daily_sales first
+              upsert  - replace existing rows that share a (date, category) with these rows
+        Returns the number of rows written.
+        """
+        if mode not in ('append', 'replace', 'upsert'):
+            raise ValueError(f"Unknown import mode: {mode}")
+
+        written = 0
+        undated = 0
+        replaced_keys = set()
+        touched_dates = set()
+        # Before any write: were the rollups in step with daily_sales?
+        rollups_current = RollupService.available()
+        if mode == 'replace':
+            db.session.execute(delete(DailySales))
+
+        for rows in chunks:
+            if mode == 'upsert':
+                # Rows without a valid date never match an upsert key, so re-importing
+                # the same file would insert them again every time: skip them
+                dated = [r for r in rows if r['date'] is not None]
+                undated += len(rows) - len(dated)
+                rows = dated
+            if not rows:
+                continue
+
+            if mode == 'upsert':
+                # Only delete keys first seen in this import, so rows from
+                # earlier chunks of the same file are kept
+                new_keys = list({(r['date'], r['category']) for r in rows} - replaced_keys)
+                for i in range(0, len(new_keys), IngestionService.KEY_BATCH):
+                    batch = new_keys[i:i + IngestionService.KEY_BATCH]
+                    db.session.execute(
+                        delete(DailySales).where(tuple_(DailySales.date, DailySales.category).in_(batch))
+                    )
+                replaced_keys.update(new_keys)
+
+            # executemany-style batched insert
+            db.session.execute(insert(DailySales), rows)
+            written += len(rows)
+            touched_dates.update(r['date'] for r in rows)
+
+        if undated:
+            print(f"⚠️ Skipped {undated} rows without a valid 日期 (upsert needs a date to match existing rows)")
+        # Keep the rollups in the same transaction as the rows they summarize
+        RollupService.refresh(None if mode == 'replace' else touched_dates, current=rollups_current)
+        return written
+
+    @staticmethod
+    def bulk_import(file_path, mode='append', chunk_rows=None):
+        """
+        Stream an Excel export into daily_sales in one transaction
+        (mode: append / replace / upsert, see write_rows). Returns the number of rows written.
+        """
+        started = time.perf_counter()
+        try:
+            chunks = (IngestionService.clean_chunk(chunk)
+                      for chunk in IngestionService.iter_excel_chunks(file_path, chunk_rows))
+            written = IngestionService.write_rows(chunks, mode)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        elapsed = time.perf_counter() - started
+        print(f"Imported {written} rows from {file_path} ({mode}) in {elapsed:.2f}s "
+              f"({written / elapsed if elapsed else 0:.0f} rows/s)")
+        # Columnar backends re-export the committed rows (no-op for SQLite)
+        AnalyticsService.backend.refresh()
+        return written
+
     @staticmethod
     def import_excel_if_empty(file_path):
         """
         Check if DailySales is empty. If so, load from Excel.
+        A missing file or a failed import raises, so the command exits non-zero.
         """
         if db.session.query(DailySales).first() is not None:
             print("DailySales table already has data. Skipping import.")
             return
 
         if not os.path.exists(file_path):
-            print(f"Excel file not found: {file_path}")
-            return
+            raise FileNotFoundError(f"Excel file not found: {file_path}")
+
+        print(f"Importing data from {file_path}...")
+        IngestionService.bulk_import(file_path, mode='append')
+        print("Import completed successfully.")
+
+class RollupService:
+    GRAINS = ('day', 'week', 'month')
+
+    @staticmethod
+    def period_expr(grain, column=DailySales.date):
+        """ SQLite expression mapping a date to the first day of its period """
+        if grain == 'day':
+            return func.date(column)
+        if grain == 'week':
+            return func.date(column, 'weekday 0', '-6 days')
+        return func.date(column, 'start of month')
+
+    @staticmethod
+    def shift_expr(grain, period, n):
+        """ SQLite expression for the first day n periods before the period starting on `period` """
+        if grain == 'day':
+            return func.date(period, f'-{int(n)} days')
+        if grain == 'week':
+            return func.date(period, f'-{7 * int(n)} days')
+        return func.date(period, f'-{int(n)} months')
+
+    @staticmethod
+    def period_start(grain, day):
+        if grain == 'day':
+            return day
+        if grain == 'week':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    @staticmethod
+    def period_offset(grain, day, n):
+        """ First day of the period n periods before the one containing day """
+        day = RollupService.period_start(grain, day)
+        if grain == 'day':
+            return day - timedelta(days=n)
+        if grain == 'week':
+            return day - timedelta(weeks=n)
+        months = day.year * 12 + day.month - 1 - n
+        return date(months // 12, months % 12 + 1, 1)
+
+    @staticmethod
+    def refresh(dates=None, current=None):
+        """
+        Recompute the rollup rows covering the given YYYY-MM-DD dates
+        (every period when dates is None) and move the watermark up to the
+        current rows. Does not commit.
+
+        A partial refresh only moves the watermark when the rollups were
+        current before the rows changed (current: available() taken before the
+        writes); otherwise they stay flagged until a full rebuild.
+
+        Rows without a date belong to no period and are not rolled up;
+        unfiltered totals read them from daily_sales (SQLiteAnalyticsBackend.undated).
+        """
+        if dates is None:
+            current = True
+        elif current is None:
+            current = RollupService.available()
+        days = None
+        if dates is not None:
+            days = set()
+            for value in dates:
+                try:
+                    days.add(date.fromisoformat(str(value)[:10]))
+                except ValueError:
+                    continue
+            if not days:
+                if current:
+                    RollupService._mark_current()
+                return
+
+        for grain in RollupService.GRAINS:
+            period = RollupService.period_expr(grain)
+            query = select(
+                literal(grain), period, DailySales.category, func.count(),
+                func.sum(DailySales.payment_amount), func.sum(DailySales.visitors),
+                func.sum(DailySales.item_count), func.sum(DailySales.order_count),
+                func.sum(DailySales.success_refund_amount), func.sum(DailySales.add_to_cart_users),
+                func.sum(DailySales.logistics_time), func.count(DailySales.logistics_time),
+                func.sum(DailySales.chat_response_time), func.count(DailySales.chat_response_time),
+                func.sum(DailySales.refund_duration), func.count(DailySales.refund_duration),
+            ).where(period.isnot(None)).group_by(period, DailySales.category)
+
+            stale = delete(SalesRollup).where(SalesRollup.grain == grain)
+            if days is not None:
+                periods = sorted({RollupService.period_start(grain, d) for d in days})
+                stale = stale.where(SalesRollup.period_start.in_(periods))
+                query = query.where(period.in_([p.isoformat() for p in periods]))
+
+            db.session.execute(stale)
+            db.session.execute(insert(SalesRollup).from_select([
+                'grain', 'period_start', 'category', 'row_count',
+                'payment_amount', 'visitors', 'item_count', 'order_count',
+                'success_refund_amount', 'add_to_cart_users',
+                'logistics_time_sum', 'logistics_time_count',
+                'chat_response_time_sum', 'chat_response_time_count',
+                'refund_duration_sum', 'refund_duration_count',
+            ], query))
+
+        if current:
+            RollupService._mark_current()
+
+    @staticmethod
+    def _mark_current():
+        state = db.session.get(SalesRollupState, 1) or SalesRollupState(id=1)
+        state.daily_sales_max_id = db.session.query(func.max(DailySales.id)).scalar()
+        state.refreshed_at = datetime.now()
+        db.session.add(state)
+
+    @staticmethod
+    def rebuild():
+        """ Recompute every rollup from daily_sales """
+        RollupService.refresh()
+        db.session.commit()
+
+    @staticmethod
+    def available():
+        """
+        True when the rollups cover the rows in daily_sales: the watermark of the
+        last refresh matches max(daily_sales.id). Rows written without refreshing
+        the rollups (older tooling, manual SQL) move max(id) away from it, and
+        readers fall back to daily_sales until `flask rollup` rebuilds them.
+        """
+        state = db.session.get(SalesRollupState, 1)
+        max_id = db.session.query(func.max(DailySales.id)).scalar()
+        # No watermark yet: only an empty table is covered
+        return max_id is None if state is None else state.daily_sales_max_id == max_id
+
+
+class WindowAnalytics:
+    """
+    环比 / 滚动窗口 - shared by the SQL (AnalyticsService) and SheetTable
+    (Feishu / live) sources so both answer with the same row shape.
+    """
+    MAX_WINDOW = 366
+
+    @staticmethod
+    def check(grain=None, lag=1, window=1):
+        if grain is not None and grain not in RollupService.GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(RollupService.GRAINS)}")
+        if lag < 1:
+            raise ValueError("lag must be >= 1")
+        if not 1 <= window <= WindowAnalytics.MAX_WINDOW:
+            raise ValueError(f"window must be between 1 and {WindowAnalytics.MAX_WINDOW} days")
+
+    @staticmethod
+    def _iso(value):
+        return str(value)[:10] if value is not None else None
+
+    @staticmethod
+    def comparison_rows(rows, names, first=None):
+        """
+        rows: period, previous_period, <name>, <name>_previous (sorted by period)
+        Adds <name>_change / <name>_change_pct; drops periods before first (lookback only).
+        """
+        result = []
+        for row in rows:
+            period = WindowAnalytics._iso(row['period'])
+            if first and period < first.isoformat():
+                continue
+            item = {"period": period, "previous_period": WindowAnalytics._iso(row['previous_period'])}
+            for name in names:
+                current, previous = row[name] or 0, row[f'{name}_previous']
+                item[name] = current
+                item[f'{name}_previous'] = previous
+                item[f'{name}_change'] = None if previous is None else round(current - previous, 2)
+                item[f'{name}_change_pct'] = round((current - previous) / previous * 100, 2) if previous else None
+            result.append(item)
+        return result
+
+    @staticmethod
+    def rolling_rows(rows, names, first=None):
+        """ rows: date, <name>, <name>_avg, <name>_sum (sorted by date) """
+        result = []
+        for row in rows:
+            day = WindowAnalytics._iso(row['date'])
+            if first and day < first.isoformat():
+                continue
+            item = {"date": day}
+            for name in names:
+                item[name] = row[name] or 0
+                item[f'{name}_avg'] = round(row[f'{name}_avg'] or 0, 2)
+                item[f'{name}_sum'] = round(row[f'{name}_sum'] or 0, 2)
+            result.append(item)
+        return result
+
+    @staticmethod
+    def _cast(table, series):
+        """ Series key -> int / float: integer-kind columns sum to ints, like the SQL INTEGER columns """
+        def kind(column):
+            spec = table.schema.get(column)
+            return spec.kind if spec else 'number'
+        return {name: int if kind(column) == 'integer' else float for name, column in series.items()}
+
+    @staticmethod
+    def _daily_frame(table, date_column, series, start=None, end=None):
+        """ Per-day sums of the series columns, indexed by date (rows without a valid date dropped) """
+        dates, sums = table.group_sum(date_column, list(series.values()))
+        index = pd.to_datetime(pd.Index(dates, dtype=object), errors='coerce', format='%Y-%m-%d')
+        frame = pd.DataFrame({key: sums[column] for key, column in series.items()}, index=index)
+        frame = frame[frame.index.notna()]
+        if start:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        if end:
+            frame = frame[frame.index <= pd.Timestamp(end)]
+        return frame
+
+    @staticmethod
+    def table_comparison(table, date_column, series, grain='week', lag=1, start=None, end=None):
+        """ comparison_rows() computed on a SheetTable (same semantics as the SQL period_lag) """
+        WindowAnalytics.check(grain, lag)
+        lookback = RollupService.period_offset(grain, start, lag) if start else None
+        last = RollupService.period_offset(grain, end, -1) - timedelta(days=1) if end else None
+        frame = WindowAnalytics._daily_frame(table, date_column, series, lookback, last)
+        if grain == 'week':
+            frame.index = frame.index.to_period('W-SUN').start_time
+        elif grain == 'month':
+            frame.index = frame.index.to_period('M').start_time
+        totals = frame.groupby(level=0).sum().sort_index()
+        # The period `lag` grains earlier on the calendar, NaN when it has no rows
+        offset = {"day": pd.DateOffset(days=lag), "week": pd.DateOffset(weeks=lag), "month": pd.DateOffset(months=lag)}[grain]
+        previous_periods = totals.index - offset
+        previous = totals.reindex(previous_periods)
+        cast = WindowAnalytics._cast(table, series)
+
+        rows = []
+        for period, previous_period, (_, values) in zip(totals.index, previous_periods, previous.iterrows()):
+            row = {"period": period.date(), "previous_period": previous_period.date()}
+            for name in series:
+                row[name] = cast[name](totals.at[period, name])
+                row[f'{name}_previous'] = None if pd.isna(values[name]) else cast[name](values[name])
+            rows.append(row)
+        first = RollupService.period_start(grain, start) if start else None
+        return WindowAnalytics.comparison_rows(rows, series, first)
+
+    @staticmethod
+    def table_rolling(table, date_column, series, window=7, start=None, end=None):
+        """ rolling_rows() computed on a SheetTable: calendar window of `window` days ending on each date """
+        WindowAnalytics.check(window=window)
+        lookback = start - timedelta(days=window - 1) if start else None
+        frame = WindowAnalytics._daily_frame(table, date_column, series, lookback, end).sort_index()
+        rolling = frame.rolling(f'{window}D')
+        averages, sums = rolling.mean(), rolling.sum()
+        cast = WindowAnalytics._cast(table, series)
+
+        rows = []
+        for day in frame.index:
+            row = {"date": day.date()}
+            for name in series:
+                row[name] = cast[name](frame.at[day, name])
+                row[f'{name}_avg'] = float(averages.at[day, name])
+                row[f'{name}_sum'] = cast[name](sums.at[day, name])
+            rows.append(row)
+        return WindowAnalytics.rolling_rows(rows, series, start)
+
+
+class SQLiteAnalyticsBackend:
+    """
+    Default query backend: SQLAlchemy queries on the app database. Answers from
+    sales_rollup when it has been built, falling back to scanning daily_sales.
+    """
+    name = 'sqlite'
 
+    def refresh(self):
+        """ Nothing to export, queries read the tables directly """
+
+    def version(self):
+        return ''
+
+    @staticmethod
+    def _source(start=None, end=None, category=None, grain=None):
+        """
+        Pick the narrowest table for the filters and return
+        (model, date column, filter conditions). Per-period queries (grain
+        given) leave out rows without a date; plain totals keep them unless
+        a date range is requested.
+        """
+        if RollupService.available():
+            # Month grain covers the whole history in a handful of rows; date
+            # ranges (and trends) need the day grain to stay exact
+            grain = grain or ('day' if (start or end) else 'month')
+            model, date_col = SalesRollup, SalesRollup.period_start
+            conditions = [SalesRollup.grain == grain]
+        else:
+            model, date_col = DailySales, DailySales.date
+            conditions = [DailySales.date.isnot(None)] if grain else []
+
+        if start:
+            conditions.append(date_col >= start)
+        if end:
+            conditions.append(date_col <= end)
+        if category:
+            conditions.append(model.category == category)
+        return model, date_col, conditions
+
+    @staticmethod
+    def _measures(model, names=None):
+        """ Additive measures (AnalyticsService.MEASURES) as labeled SQL expressions """
+        if model is SalesRollup:
+            measures = [
+                func.sum(SalesRollup.payment_amount).label('sales'),
+                func.sum(SalesRollup.visitors).label('visitors'),
+                func.sum(SalesRollup.order_count).label('orders'),
+                func.sum(SalesRollup.add_to_cart_users).label('cart'),
+                func.sum(SalesRollup.logistics_time_sum).label('logistics_sum'),
+                func.sum(SalesRollup.logistics_time_count).label('logistics_count'),
+                func.sum(SalesRollup.chat_response_time_sum).label('chat_sum'),
+                func.sum(SalesRollup.chat_response_time_count).label('chat_count'),
+                func.sum(SalesRollup.refund_duration_sum).label('refund_sum'),
+                func.sum(SalesRollup.refund_duration_count).label('refund_count'),
+            ]
+        else:
+            measures = [
+                func.sum(DailySales.payment_amount).label('sales'),
+                func.sum(DailySales.visitors).label('visitors'),
+                func.sum(DailySales.order_count).label('orders'), # Approximation of pay users
+                func.sum(DailySales.add_to_cart_users).label('cart'),
+                func.sum(DailySales.logistics_time).label('logistics_sum'),
+                func.count(DailySales.logistics_time).label('logistics_count'),
+                func.sum(DailySales.chat_response_time).label('chat_sum'),
+                func.count(DailySales.chat_response_time).label('chat_count'),
+                func.sum(DailySales.refund_duration).label('refund_sum'),
+                func.count(DailySales.refund_duration).label('refund_count'),
+            ]
+        return [m for m in measures if names is None or m.name in names]
+
+    def totals(self, start=None, end=None, category=None):
+        model, _, conditions = self._source(start, end, category)
+        totals = db.session.query(*self._measures(model)).filter(*conditions).one()._asdict()
+        if model is SalesRollup and not (start or end):
+            # sales_rollup has no period for undated rows; the date index finds them in daily_sales
+            totals = AnalyticsService._add_totals(totals, self.undated(category))
+        return totals
+
+    def undated(self, category=None):
+        """ Measures of the rows without a date (in unfiltered totals, in no period) """
+        conditions = [DailySales.date.is_(None)]
+        if category:
+            conditions.append(DailySales.category == category)
+        return db.session.query(*self._measures(DailySales)).filter(*conditions).one()._asdict()
+
+    def daily(self, start=None, end=None, category=None, names=None):
+        """ Per-day measures ordered by date: [{date, <measure>...}] """
+        model, date_col, conditions = self._source(start, end, category, grain='day')
+        rows = db.session.query(date_col.label('date'), *self._measures(model, names)) \
+            .filter(*conditions).group_by(date_col).order_by(date_col).all()
+        return [row._asdict() for row in rows]
+
+    def period_lag(self, grain, lag, start=None, end=None, category=None, names=()):
+        """
+        Per-period totals with the values of the period `lag` grains earlier on the
+        calendar (a self-join on the shifted period start, so a period without
+        rows gives NULL previous values instead of comparing with an older one)
+        """
+        model, date_col, conditions = self._source(start, end, category, grain=grain)
+        period = date_col if model is SalesRollup else RollupService.period_expr(grain, date_col)
+        totals = select(period.label('period'), *self._measures(model, names)) \
+            .where(*conditions).group_by(period)
+        current, previous = totals.subquery('current'), totals.subquery('previous')
+
+        previous_period = RollupService.shift_expr(grain, current.c.period, lag)
+        columns = [current.c.period, previous_period.label('previous_period')]
+        for name in names:
+            columns += [current.c[name], previous.c[name].label(f'{name}_previous')]
+        query = select(*columns) \
+            .select_from(current.outerjoin(previous, previous.c.period == previous_period)) \
+            .order_by(current.c.period)
+        return db.session.execute(query).mappings().all()
+
+    def rolling(self, window, start=None, end=None, category=None, names=()):
+        """ Per-day totals with AVG/SUM over the `window` calendar days ending on each date """
+        model, date_col, conditions = self._source(start, end, category, grain='day')
+        daily = select(date_col.label('date'), *self._measures(model, names)) \
+            .where(*conditions).group_by(date_col).subquery()
+
+        # RANGE over julianday: a calendar window even when some days have no rows
+        order = func.julianday(daily.c.date)
+        frame = (-(window - 1), 0)
+        columns = [daily.c.date]
+        for name in names:
+            columns += [
+                daily.c[name],
+                func.avg(daily.c[name]).over(order_by=order, range_=frame).label(f'{name}_avg'),
+                func.sum(daily.c[name]).over(order_by=order, range_=frame).label(f'{name}_sum'),
+            ]
+        return db.session.execute(select(*columns).order_by(daily.c.date)).mappings().all()
+
+
+class DuckDBAnalyticsBackend:
+    """
+    Columnar query backend: daily_sales exported to Parquet and scanned by an
+    embedded DuckDB, which only reads the columns a query references. SQLite
+    stays the source of truth; refresh() re-exports after every import.
+    """
+    name = 'duckdb'
+    MEASURES = {
+        "sales": "SUM(payment_amount)",
+        "visitors": "SUM(visitors)",
+        "orders": "SUM(order_count)",
+        "cart": "SUM(add_to_cart_users)",
+        "logistics_sum": "SUM(logistics_time)",
+        "logistics_count": "COUNT(logistics_time)",
+        "chat_sum": "SUM(chat_response_time)",
+        "chat_count": "COUNT(chat_response_time)",
+        "refund_sum": "SUM(refund_duration)",
+        "refund_count": "COUNT(refund_duration)",
+    }
+    PERIODS = {
+        "day": "date",
+        "week": "CAST(date_trunc('week', date) AS DATE)",   # ISO week, starts on Monday like sales_rollup
+        "month": "CAST(date_trunc('month', date) AS DATE)",
+    }
+
+    def __init__(self, path):
+        if duckdb is None:
+            raise RuntimeError("ANALYTICS_BACKEND=duckdb needs the duckdb package (pip install duckdb)")
+        self.path = path
+        self._local = threading.local()
+        self._export_lock = threading.Lock()
+
+    def _connection(self):
+        # DuckDB connections are not shared between threads
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = duckdb.connect()
+        return con
+
+    def _source_sql(self):
+        return "read_parquet('{}')".format(self.path.replace("'", "''"))
+
+    @metrics.timed('export')
+    def refresh(self):
+        """ Export daily_sales to Parquet (written aside, then atomically replaced) """
+        # Nullable Int64 keeps integer columns integers (JSON 12, not 12.0) when some rows are NULL
+        integers = {c.name: 'Int64' for c in DailySales.__table__.columns if isinstance(c.type, Integer)}
+        frame = pd.read_sql(select(DailySales.__table__), db.session.connection(), dtype=integers)
+        frame['date'] = pd.to_datetime(frame['date'], errors='coerce')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        con = duckdb.connect()
         try:
-            print(f"Importing data from {file_path}...")
-            df = pd.read_excel(file_path)
-            
-            # Map columns: Excel -> Model
-            for _, row in df.iterrows():
-                # Helper to clean numbers (remove , and %)
-                def clean_float(val):
-                    try:
-                        return float(str(val).replace(',', '').replace('%', ''))
-                    except:
-                        return 0.0
-                
-                def clean_int(val):
-                    try:
-                        return int(clean_float(val))
-                    except:
-                        return 0
-
-                record = DailySales(
-                    date = str(row.get('日期', '')),
-                    category = str(row.get('类别', '')),
-                    payment_amount = clean_float(row.get('支付金额', 0)),
-                    visitors = clean_int(row.get('访客数', 0)),
-                    pay_conversion_rate = str(row.get('支付转化率', '0%')),
-                    
-                    # Finance
-                    item_count = clean_int(row.get('支付件数', 0)),
-                    order_count = clean_int(row.get('支付子订单数', 0)),
-                    avg_order_value = clean_float(row.get('客单价', 0)),
-                    success_refund_amount = clean_float(row.get('成功退款金额', 0)),
-                    item_view_count = clean_int(row.get('浏览量', 0)),
-
-                    # Funnel
-                    add_to_cart_users = clean_int(row.get('加购人数', 0)),
-                    add_to_cart_count = clean_int(row.get('加购件数', 0)),
-                    consult_rate = str(row.get('咨询率', '0%')),
-
-                    # Retention
-                    old_buyer_pay_amount = clean_float(row.get('老客复购金额', 0)),
-                    old_buyer_pay_count = clean_int(row.get('老客复购人数', 0)),
-                    old_buyer_rate = str(row.get('老客复购率', '0%')),
-
-                    # Service
-                    chat_response_time = clean_float(row.get('旺旺人工响应时长(秒)', 0)),
-                    logistics_time = clean_float(row.get('物流到货时长(小时)', 0)),
-                    refund_duration = clean_float(row.get('退款处理时长(天)', 0)),
-                    dispute_rate = str(row.get('纠纷投诉商责率', '0%')),
-                    chat_satisfaction = str(row.get('旺旺满意度', '0%'))
-                )
-                db.session.add(record)
-            
-            db.session.commit()
-            print("Import completed successfully.")
-            
-        except Exception as e:
-            print(f"Error during import: {e}")
-            db.session.rollback()
+            con.register('daily_sales', frame)
+            con.execute("COPY (SELECT * REPLACE (CAST(date AS DATE) AS date) FROM daily_sales) TO '{}' (FORMAT PARQUET)"
+                        .format(tmp.replace("'", "''")))
+        finally:
+            con.close()
+        os.replace(tmp, self.path)
+        print(f"✅ Exported {len(frame)} daily_sales rows to {self.path}")
+
+    def version(self):
+        try:
+            return str(os.stat(self.path).st_mtime_ns)
+        except FileNotFoundError:
+            return ''
+
+    def _query(self, sql, params=()):
+        if not os.path.exists(self.path):
+            with self._export_lock:
+                if not os.path.exists(self.path):
+                    self.refresh()
+        cursor = self._connection().execute(sql.replace('{source}', self._source_sql()), list(params))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _where(start=None, end=None, category=None, dated=True):
+        # Per-date queries leave out rows without a date; plain totals keep them
+        clauses, params = ["date IS NOT NULL"] if dated else [], []
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _measures(self, names=None):
+        return ", ".join(f"{sql} AS {name}" for name, sql in self.MEASURES.items() if names is None or name in names)
+
+    def totals(self, start=None, end=None, category=None):
+        where, params = self._where(start, end, category, dated=False)
+        return self._query(f"SELECT {self._measures()} FROM {{source}} {where}", params)[0]
+
+    def undated(self, category=None):
+        clauses, params = ["date IS NULL"], []
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        where = "WHERE " + " AND ".join(clauses)
+        return self._query(f"SELECT {self._measures()} FROM {{source}} {where}", params)[0]
+
+    def daily(self, start=None, end=None, category=None, names=None):
+        where, params = self._where(start, end, category)
+        return self._query(
+            f"SELECT date, {self._measures(names)} FROM {{source}} {where} GROUP BY date ORDER BY date", params)
+
+    def period_lag(self, grain, lag, start=None, end=None, category=None, names=()):
+        where, params = self._where(start, end, category)
+        shift = {"day": f"INTERVAL {int(lag)} DAY", "week": f"INTERVAL {7 * int(lag)} DAY",
+                 "month": f"INTERVAL {int(lag)} MONTH"}[grain]
+        values = ", ".join(f"cur.{name}, prev.{name} AS {name}_previous" for name in names)
+        # Joined on the calendar: a period without rows leaves NULLs, not the one before it
+        return self._query(f"""
+            WITH totals AS (
+                SELECT CAST({self.PERIODS[grain]} AS DATE) AS period, {self._measures(names)}
+                FROM {{source}} {where} GROUP BY 1
+            )
+            SELECT cur.period, CAST(cur.period - {shift} AS DATE) AS previous_period, {values}
+            FROM totals cur LEFT JOIN totals prev ON prev.period = CAST(cur.period - {shift} AS DATE)
+            ORDER BY cur.period
+        """, params)
+
+    def rolling(self, window, start=None, end=None, category=None, names=()):
+        where, params = self._where(start, end, category)
+        windows = ", ".join(f"{name}, AVG({name}) OVER w AS {name}_avg, SUM({name}) OVER w AS {name}_sum"
+                            for name in names)
+        return self._query(f"""
+            WITH daily AS (
+                SELECT date, {self._measures(names)} FROM {{source}} {where} GROUP BY date
+            )
+            SELECT date, {windows}
+            FROM daily WINDOW w AS (ORDER BY date RANGE BETWEEN INTERVAL {int(window) - 1} DAYS PRECEDING AND CURRENT ROW)
+            ORDER BY date
+        """, params)
+
 
 class AnalyticsService:
+    """
+    Sales/service KPIs on top of a query backend: SQLite (default) or DuckDB
+    over Parquet (ANALYTICS_BACKEND=duckdb), both answering with the same
+    results up to float rounding in the last bits (summation order differs).
+    Every query accepts optional start/end dates (inclusive) and a category filter.
+    """
+    PANELS = ('overview', 'trend', 'funnel', 'service')
+    # Additive measures every backend computes
+    MEASURES = ('sales', 'visitors', 'orders', 'cart', 'logistics_sum', 'logistics_count',
+                'chat_sum', 'chat_count', 'refund_sum', 'refund_count')
+    # Measures available to the comparison / rolling queries
+    SERIES = ('sales', 'visitors', 'orders')
+    BACKENDS = ('sqlite', 'duckdb')
+
+    backend = SQLiteAnalyticsBackend()
+
     @staticmethod
-    def get_sales_overview():
+    def configure(name='sqlite', parquet_path=None):
+        """ Select the query backend (app start-up) """
+        if name == 'sqlite':
+            AnalyticsService.backend = SQLiteAnalyticsBackend()
+        elif name == 'duckdb':
+            AnalyticsService.backend = DuckDBAnalyticsBackend(parquet_path)
+        else:
+            raise ValueError(f"Unknown analytics backend: {name} (expected one of {', '.join(AnalyticsService.BACKENDS)})")
+        return AnalyticsService.backend
+
+    @staticmethod
+    def _totals(start=None, end=None, category=None):
+        return AnalyticsService.backend.totals(start, end, category)
+
+    @staticmethod
+    def _add_totals(a, b):
+        """ Measure-wise sum of two totals dicts (None only when both are None) """
+        return {k: None if a[k] is None and b[k] is None else (a[k] or 0) + (b[k] or 0) for k in a}
+
+    @staticmethod
+    def _overview(t):
+        return {
+            "total_sales": t['sales'] if t['sales'] else 0,
+            "total_visitors": t['visitors'] if t['visitors'] else 0,
+            "total_orders": t['orders'] if t['orders'] else 0
+        }
+
+    @staticmethod
+    def _funnel(t):
+        return {
+            "visitors": t['visitors'] or 0,
+            "cart": t['cart'] or 0,
+            "orders": t['orders'] or 0
+        }
+
+    @staticmethod
+    def _service(t):
+        def avg(key):
+            return round(t[f'{key}_sum'] / t[f'{key}_count'], 1) if t[f'{key}_count'] else 0
+        return {
+            "logistics_hours": avg('logistics'),
+            "chat_seconds": avg('chat'),
+            "refund_days": avg('refund')
+        }
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_sales_overview(start=None, end=None, category=None):
         """
         Get total sales summary for the Sales Dashboard.
         """
-        # Sum of payment amount
-        total_sales = db.session.query(func.sum(DailySales.payment_amount)).scalar()
-        total_visitors = db.session.query(func.sum(DailySales.visitors)).scalar()
-        total_orders = db.session.query(func.sum(DailySales.order_count)).scalar()
-        
+        return AnalyticsService._overview(AnalyticsService._totals(start, end, category))
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_sales_trend(start=None, end=None, category=None, points=None, method='lttb'):
+        """ Daily Sales trend, downsampled to about `points` days """
+        rows = AnalyticsService.backend.daily(start, end, category, names=('sales', 'visitors'))
+        return AnalyticsService._trend(rows, points, method)
+
+    @staticmethod
+    def _trend(rows, points=None, method='lttb'):
+        """ Per-day rows -> trend points (sales and visitors peaks both survive downsampling) """
+        keep = downsample_indices([[row['sales'] or 0 for row in rows], [row['visitors'] or 0 for row in rows]],
+                                  points, method=method)
+        return [
+            {"date": row['date'].isoformat() if row['date'] else None,
+             "sales": row['sales'], "visitors": row['visitors']}
+            for row in (rows[i] for i in keep)
+        ]
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_sales_funnel(start=None, end=None, category=None):
+        """ Aggregate Funnel: Visitors -> AddCart -> PayUsers """
+        return AnalyticsService._funnel(AnalyticsService._totals(start, end, category))
+    
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_service_metrics(start=None, end=None, category=None):
+        """ Service & Logistics KPIs (Avg) """
+        return AnalyticsService._service(AnalyticsService._totals(start, end, category))
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_period_comparison(grain='week', lag=1, start=None, end=None, category=None):
+        """
+        Period-over-period (环比, or 同比 with lag=52 weeks / 12 months): per-period
+        totals next to the period `lag` grains earlier on the calendar (NULL previous
+        values and changes when that period has no rows), from one self-join query.
+        Periods are always whole (end selects the period containing it); the `lag`
+        periods before start are read only to fill the first comparisons.
+        """
+        WindowAnalytics.check(grain, lag)
+        lookback = RollupService.period_offset(grain, start, lag) if start else None
+        last = RollupService.period_offset(grain, end, -1) - timedelta(days=1) if end else None
+        rows = AnalyticsService.backend.period_lag(grain, lag, lookback, last, category, AnalyticsService.SERIES)
+
+        first = RollupService.period_start(grain, start) if start else None
+        return WindowAnalytics.comparison_rows(rows, AnalyticsService.SERIES, first)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_rolling(window=7, start=None, end=None, category=None):
+        """
+        Daily totals with the moving average / sum over the `window` calendar
+        days ending on each date (AVG/SUM OVER a RANGE frame, days without data don't count).
+        """
+        WindowAnalytics.check(window=window)
+        lookback = start - timedelta(days=window - 1) if start else None
+        rows = AnalyticsService.backend.rolling(window, lookback, end, category, AnalyticsService.SERIES)
+        return WindowAnalytics.rolling_rows(rows, AnalyticsService.SERIES, start)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_dashboard(panels=PANELS, start=None, end=None, category=None, points=None, method='lttb'):
+        """
+        All requested panels from a single query: when the trend is
+        requested the per-day rows are also summed into the totals (plus the
+        rows without a date when no date range is given, as in _totals).
+        """
+        if 'trend' in panels:
+            rows = AnalyticsService.backend.daily(start, end, category)
+            totals = {k: sum(row[k] or 0 for row in rows) if rows else None for k in AnalyticsService.MEASURES}
+            if not (start or end):
+                totals = AnalyticsService._add_totals(totals, AnalyticsService.backend.undated(category))
+        else:
+            totals = AnalyticsService._totals(start, end, category)
+
+        result = {}
+        for panel in panels:
+            if panel == 'overview':
+                result[panel] = AnalyticsService._overview(totals)
+            elif panel == 'funnel':
+                result[panel] = AnalyticsService._funnel(totals)
+            elif panel == 'service':
+                result[panel] = AnalyticsService._service(totals)
+            elif panel == 'trend':
+                result[panel] = AnalyticsService._trend(rows, points, method)
+        return result
+
+
+class FeishuSyncService:
+    # Columns used to build a stable row key; rows without one fall back to their position
+    ROW_KEY_COLUMNS = ('统计日期', '日期')
+
+    @staticmethod
+    def _row_keys(records):
+        keys = []
+        seen = {}
+        for i, record in enumerate(records):
+            base = next((str(record[c]) for c in FeishuSyncService.ROW_KEY_COLUMNS if record.get(c)), None)
+            if base is None:
+                keys.append(f"#{i}")
+                continue
+            n = seen.get(base, 0)
+            seen[base] = n + 1
+            keys.append(f"{base}#{n}")
+        return keys
+
+    @staticmethod
+    @metrics.timed('sync')
+    def sync_sheet(feishu, spreadsheet_token, sheet_id, force=False, lock=None):
+        """
+        Mirror one Feishu sheet into feishu_sheet_rows.
+        Skips the download when the spreadsheet revision is unchanged, otherwise
+        upserts only rows whose content hash changed and deletes vanished rows.
+
+        lock: callable returning a context manager shared by every process syncing
+              this database (e.g. the DB file lock); the sync state is read inside
+              it, so a worker that waited sees the other worker's sync as unchanged
+        """
+        with (lock or contextlib.nullcontext)():
+            return FeishuSyncService._sync_sheet(feishu, spreadsheet_token, sheet_id, force)
+
+    @staticmethod
+    def _sync_sheet(feishu, spreadsheet_token, sheet_id, force):
+        state = FeishuSyncState.query.filter_by(
+            spreadsheet_token=spreadsheet_token, sheet_id=sheet_id
+        ).populate_existing().first()
+        meta = feishu.get_sheet_meta(spreadsheet_token, sheet_id)
+        if not meta:
+            # Without the real sheet size the read could be partial and rows past it deleted
+            raise RuntimeError(f"Metainfo unavailable for sheet {sheet_id}, not syncing")
+        revision = meta.get("revision")
+
+        # A mirror synced before header order was stored re-syncs once to record it
+        if not force and state and revision is not None and state.revision == revision and state.headers is not None:
+            print(f"⏭️ Sheet {sheet_id} unchanged at revision {revision}, skipping sync")
+            return {"status": "unchanged", "revision": revision}
+
+        # Reuse the metainfo read above (one metainfo request per sync, not two)
+        raw_data = feishu.get_sheet_data(spreadsheet_token, sheet_id, meta=meta)
+        if not raw_data:
+            # Never wipe the mirror because of a failed fetch
+            return {"status": "error", "revision": state.revision if state else None}
+        records = feishu.parse_to_daily_sales(raw_data)
+        headers = feishu.parse_headers(raw_data)
+
+        existing = {
+            row.row_key: row
+            for row in db.session.query(
+                FeishuSheetRow.id, FeishuSheetRow.row_key, FeishuSheetRow.row_index, FeishuSheetRow.row_hash
+            ).filter_by(spreadsheet_token=spreadsheet_token, sheet_id=sheet_id)
+        }
+
+        inserts, updates = [], []
+        keys = FeishuSyncService._row_keys(records)
+        for index, (key, record) in enumerate(zip(keys, records)):
+            data = json.dumps(record, ensure_ascii=False, sort_keys=True)
+            row_hash = hashlib.sha1(data.encode('utf-8')).hexdigest()
+            old = existing.pop(key, None)
+            if old is None:
+                inserts.append({
+                    "spreadsheet_token": spreadsheet_token, "sheet_id": sheet_id, "row_key": key,
+                    "row_index": index, "row_hash": row_hash, "data": data
+                })
+            elif old.row_hash != row_hash:
+                updates.append({"id": old.id, "row_index": index, "row_hash": row_hash, "data": data})
+            elif old.row_index != index:
+                updates.append({"id": old.id, "row_index": index})
+        deleted_ids = [row.id for row in existing.values()]
+
+        try:
+            if inserts:
+                db.session.execute(insert(FeishuSheetRow), inserts)
+            if updates:
+                db.session.bulk_update_mappings(FeishuSheetRow, updates)
+            if deleted_ids:
+                db.session.execute(delete(FeishuSheetRow).where(FeishuSheetRow.id.in_(deleted_ids)))
+
+            if state is None:
+                state = FeishuSyncState(spreadsheet_token=spreadsheet_token, sheet_id=sheet_id)
+                db.session.add(state)
+            state.revision = revision
+            state.row_count = len(records)
+            state.headers = json.dumps(headers, ensure_ascii=False)
+            state.synced_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        print(f"✅ Synced sheet {sheet_id} @ revision {revision}: "
+              f"{len(inserts)} inserted, {len(updates)} updated, {len(deleted_ids)} deleted")
+        return {
+            "status": "synced",
+            "revision": revision,
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "deleted": len(deleted_ids)
+        }
+
+    @staticmethod
+    @metrics.timed('db')
+    def load_records(spreadsheet_token, sheet_id, columns=None):
+        """ Read the mirrored records back in sheet order """
+        rows = db.session.query(FeishuSheetRow.data).filter_by(
+            spreadsheet_token=spreadsheet_token, sheet_id=sheet_id
+        ).order_by(FeishuSheetRow.row_index)
+
+        records = [json.loads(row.data) for row in rows]
+        if columns:
+            records = [{c: r[c] for c in columns if c in r} for r in records]
+        return records
+
+    @staticmethod
+    def load_table(spreadsheet_token, sheet_id, schema=(), columns=None):
+        """
+        The mirrored sheet as a SheetTable with its columns in sheet order, so it
+        matches (content version included) the table parsed from a direct read
+        """
+        records = FeishuSyncService.load_records(spreadsheet_token, sheet_id, columns)
+        state = FeishuSyncState.query.filter_by(spreadsheet_token=spreadsheet_token, sheet_id=sheet_id).first()
+        headers = json.loads(state.headers) if state and state.headers else []
+        if columns:
+            headers = [h for h in headers if h in columns]
+        with metrics.span('parse'):
+            return SheetTable.from_records(records, schema, headers)
+
+
+class FeishuAnalyticsService:
+    """ 飞书商品销售数据 - 聚合全部基于 SheetTable 列运算 """
+    SCHEMA = (
+        ColumnSpec('日期', 'date'),
+        ColumnSpec('支付金额'),
+        ColumnSpec('访客数', 'integer'),
+        ColumnSpec('支付子订单数', 'integer'),
+        ColumnSpec('加购人数', 'integer'),
+        ColumnSpec('物流到货时长(小时)'),
+        ColumnSpec('旺旺人工响应时长(秒)'),
+        ColumnSpec('退款处理时长(天)'),
+        ColumnSpec('活动节点', 'text'),
+    )
+    PANELS = ('overview', 'trend', 'funnel', 'service')
+    # comparison / rolling series -> sheet column
+    SERIES = {"sales": '支付金额', "visitors": '访客数', "orders": '支付子订单数'}
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_overview(table):
         return {
-            "total_sales": total_sales if total_sales else 0,
-            "total_visitors": total_visitors if total_visitors else 0,
-            "total_orders": total_orders if total_orders else 0
+            "total_sales": round(table.sum('支付金额'), 2),
+            "total_visitors": int(table.sum('访客数')),
+            "total_orders": int(table.sum('支付子订单数'))
         }
 
     @staticmethod
-    def get_sales_trend():
-        """ Daily Sales trend """
-        results = db.session.query(
-            DailySales.date,
-            func.sum(DailySales.payment_amount).label('sales'),
-            func.sum(DailySales.visitors).label('visitors')
-        ).group_by(DailySales.date).order_by(DailySales.date).all()
-        return [{"date": row[0], "sales": row[1], "visitors": row[2]} for row in results]
+    @metrics.timed('aggregate')
+    def get_trend(table, points=None, method='lttb'):
+        """ Daily sales/visitors, grouped by date; downsampled to about `points` days, 活动节点 days always kept """
+        dates, sums = table.group_sum('日期', ['支付金额', '访客数'])
+        events = np.unique(table.column('日期')[table.column('活动节点') != ''].astype(str))
+        pinned = np.flatnonzero(np.isin(np.asarray(dates, dtype=str), events))
+        keep = downsample_indices([sums['支付金额'], sums['访客数']], points, pinned, method)
+        return [
+            {"date": dates[i], "sales": float(sums['支付金额'][i]), "visitors": int(sums['访客数'][i])}
+            for i in keep
+        ]
 
     @staticmethod
-    def get_sales_funnel():
-        """ Aggregate Funnel: Visitors -> AddCart -> PayUsers """
-        res = db.session.query(
-            func.sum(DailySales.visitors).label('visitors'),
-            func.sum(DailySales.add_to_cart_users).label('cart'),
-            func.sum(DailySales.order_count).label('orders') # Approximation
-        ).one()
-        
+    @metrics.timed('aggregate')
+    def get_funnel(table):
         return {
-            "visitors": res.visitors or 0,
-            "cart": res.cart or 0,
-            "orders": res.orders or 0
+            "visitors": int(table.sum('访客数')),
+            "cart": int(table.sum('加购人数')),
+            "orders": int(table.sum('支付子订单数'))
         }
-    
+
     @staticmethod
-    def get_service_metrics():
-        """ Service & Logistics KPIs (Avg) """
-        res = db.session.query(
-            func.avg(DailySales.logistics_time).label('logistics'),
-            func.avg(DailySales.chat_response_time).label('chat'),
-            func.avg(DailySales.refund_duration).label('refund')
-        ).one()
-        
+    @metrics.timed('aggregate')
+    def get_service_metrics(table):
+        return {
+            "logistics_hours": round(table.mean('物流到货时长(小时)'), 1),
+            "chat_seconds": round(table.mean('旺旺人工响应时长(秒)'), 1),
+            "refund_days": round(table.mean('退款处理时长(天)'), 1)
+        }
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_comparison(table, grain='week', lag=1, start=None, end=None):
+        """ 环比 per day/week/month, see AnalyticsService.get_period_comparison """
+        return WindowAnalytics.table_comparison(table, '日期', FeishuAnalyticsService.SERIES, grain, lag, start, end)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_rolling(table, window=7, start=None, end=None):
+        """ Moving average / sum over `window` days, see AnalyticsService.get_rolling """
+        return WindowAnalytics.table_rolling(table, '日期', FeishuAnalyticsService.SERIES, window, start, end)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_dashboard(table, panels=PANELS, points=None, method='lttb'):
+        """ All requested panels from one SheetTable """
+        builders = {
+            "overview": FeishuAnalyticsService.get_overview,
+            "trend": lambda t: FeishuAnalyticsService.get_trend(t, points, method),
+            "funnel": FeishuAnalyticsService.get_funnel,
+            "service": FeishuAnalyticsService.get_service_metrics,
+        }
+        return {panel: builders[panel](table) for panel in panels}
+
+
+class LiveAnalyticsService:
+    """ 直播间数据 - 聚合全部基于 SheetTable 列运算 """
+    SCHEMA = (
+        ColumnSpec('统计日期', 'date'),
+        ColumnSpec('开播场次', 'integer'),
+        ColumnSpec('直播间GMV'),
+        ColumnSpec('直播间访问人数（uv）', 'integer'),
+        ColumnSpec('直播间营收'),
+        ColumnSpec('直播间新增粉丝数', 'integer'),
+        ColumnSpec('GPM（千次展现成交）'),
+        ColumnSpec('UV价值'),
+        ColumnSpec('uv转化率', 'percent'),
+        ColumnSpec('店铺成交金额'),
+        ColumnSpec('直播成交人数', 'integer'),
+        ColumnSpec('店铺转化率', 'percent'),
+        ColumnSpec('店铺客单'),
+        ColumnSpec('店铺退款率', 'percent'),
+        ColumnSpec('活动节点', 'text'),
+    )
+    PANELS = ('overview', 'trend', 'metrics', 'shop')
+    # comparison / rolling series -> sheet column
+    SERIES = {"gmv": '直播间GMV', "uv": '直播间访问人数（uv）', "revenue": '直播间营收'}
+
+    @staticmethod
+    def _dated(table):
+        """ Daily rows: skips rows without 统计日期 (合计 / summary rows) and repeated header rows """
+        dates = table.column('统计日期')
+        return (dates != '') & (dates != '统计日期')
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_overview(table):
+        dated = LiveAnalyticsService._dated(table)
         return {
-            "logistics_hours": round(res.logistics or 0, 1),
-            "chat_seconds": round(res.chat or 0, 1),
-            "refund_days": round(res.refund or 0, 1)
+            "total_gmv": round(table.sum('直播间GMV', dated), 2),
+            "total_uv": int(table.sum('直播间访问人数（uv）', dated)),
+            "total_sessions": int(table.sum('开播场次', dated)),
+            "total_fans": int(table.sum('直播间新增粉丝数', dated))
+        }
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_trend(table, points=None, method='lttb'):
+        """
+        One point per sheet row; skips blank dates and repeated header rows.
+        Downsampled to about `points` rows, 活动节点 rows always kept.
+        """
+        dates = table.column('统计日期')
+        mask = LiveAnalyticsService._dated(table)
+        columns = {
+            key: np.nan_to_num(table.column(name)[mask])
+            for key, name in (("gmv", '直播间GMV'), ("uv", '直播间访问人数（uv）'), ("revenue", '直播间营收'))
+        }
+        keep = downsample_indices(list(columns.values()), points, table.column('活动节点')[mask] != '', method)
+        dates = dates[mask][keep]
+        columns = {key: values[keep].tolist() for key, values in columns.items()}
+        return [
+            {"date": d, "gmv": g, "uv": u, "revenue": r}
+            for d, g, u, r in zip(dates.tolist(), columns["gmv"], columns["uv"], columns["revenue"])
+        ]
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_metrics(table):
+        dated = LiveAnalyticsService._dated(table)
+        return {
+            "avg_gpm": round(table.mean('GPM（千次展现成交）', dated), 2),
+            "avg_uv_value": round(table.mean('UV价值', dated), 2),
+            "avg_conversion": round(table.mean('uv转化率', dated) * 100, 2)
+        }
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_shop_metrics(table):
+        """ 店铺侧指标 (成交占比 / 转化 / 客单 / 退款) """
+        dated = LiveAnalyticsService._dated(table)
+        return {
+            "total_revenue": round(table.sum('直播间营收', dated), 2),
+            "total_shop_gmv": round(table.sum('店铺成交金额', dated), 2),
+            "total_buyers": int(table.sum('直播成交人数', dated)),
+            "avg_shop_conversion": round(table.mean('店铺转化率', dated) * 100, 2),
+            "avg_shop_aov": round(table.mean('店铺客单', dated), 2),
+            "avg_refund_rate": round(table.mean('店铺退款率', dated) * 100, 2)
+        }
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_comparison(table, grain='week', lag=1, start=None, end=None):
+        """ 环比 per day/week/month, see AnalyticsService.get_period_comparison """
+        return WindowAnalytics.table_comparison(table, '统计日期', LiveAnalyticsService.SERIES, grain, lag, start, end)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_rolling(table, window=7, start=None, end=None):
+        """ Moving average / sum over `window` days, see AnalyticsService.get_rolling """
+        return WindowAnalytics.table_rolling(table, '统计日期', LiveAnalyticsService.SERIES, window, start, end)
+
+    @staticmethod
+    @metrics.timed('aggregate')
+    def get_dashboard(table, panels=PANELS, points=None, method='lttb'):
+        """ All requested panels from one SheetTable """
+        builders = {
+            "overview": LiveAnalyticsService.get_overview,
+            "trend": lambda t: LiveAnalyticsService.get_trend(t, points, method),
+            "metrics": LiveAnalyticsService.get_metrics,
+            "shop": LiveAnalyticsService.get_shop_metrics,
         }
+        return {panel: builders[panel](table) for panel in panels}
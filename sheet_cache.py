@@ -0,0 +1,143 @@
+"""
+Sheet Cache - 进程级飞书表格数据缓存 (TTL + stale-while-revalidate + LRU)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class CacheEntry:
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.refreshing = False
+        self.failed_at = None  # last failed background refresh
+
+
+class _Load:
+    """ One in-flight loader() call; coalesced callers wait on done and share its result or error """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SheetCache:
+    def __init__(self, ttl=300, max_entries=32, retry_after=None):
+        """
+        ttl: 数据新鲜期 (秒), 过期后先返回旧数据, 同时后台刷新一次
+        max_entries: 最多缓存的 (spreadsheet_token, sheet_id, range) 组合数, 超出按 LRU 淘汰
+        retry_after: 后台刷新失败后, 这段时间 (秒, 默认 ttl) 内不再刷新, 继续返回旧数据
+        """
+        self.ttl = ttl
+        self.retry_after = ttl if retry_after is None else retry_after
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        Return the cached value for key, calling loader() on a miss.
+        Concurrent misses on the same key share a single loader call (and its
+        exception, if it fails).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                now = time.monotonic()
+                stale = now - entry.loaded_at >= self.ttl
+                # After a failed refresh (e.g. a Feishu outage) wait before calling upstream again
+                backing_off = entry.failed_at is not None and now - entry.failed_at < self.retry_after
+                if stale and not entry.refreshing and not backing_off:
+                    entry.refreshing = True
+                    threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                metrics.CACHE_REQUESTS.inc(result='stale' if stale else 'hit')
+                return entry.value
+
+            load = self._loading.get(key)
+            owner = load is None
+            if owner:
+                load = self._loading[key] = _Load()
+            metrics.CACHE_REQUESTS.inc(result='miss' if owner else 'coalesced')
+
+        if not owner:
+            load.done.wait()
+            # The owner's failure is ours too: retrying here would multiply the
+            # upstream calls by the number of waiters (e.g. during an outage)
+            if load.error is not None:
+                raise load.error
+            return load.value
+
+        try:
+            load.value = loader()
+            self._store(key, load.value)
+            return load.value
+        except Exception as e:
+            load.error = e
+            raise
+        except BaseException:
+            load.error = RuntimeError(f"Loading {key} was interrupted")
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            load.done.set()
+
+    def peek(self, key):
+        """ The cached value (fresh or stale) without counting a lookup or starting a refresh, or None """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else None
+
+    def put(self, key, value):
+        """ Store a value loaded elsewhere (e.g. by the background refresher) """
+        self._store(key, value)
+
+    def seed(self, key, value):
+        """
+        Store a value that is served immediately but already stale (e.g. an
+        on-disk snapshot), so the first get() also starts a background refresh
+        """
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = CacheEntry(value, time.monotonic() - self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """ Drop one key, or everything when key is None """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            self._store(key, value)
+            print(f"🔄 Refreshed cache for {key}")
+        except Exception as e:
+            print(f"❌ Cache refresh failed for {key}: {e}")
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+                    entry.failed_at = time.monotonic()
+
+    def _store(self, key, value):
+        with self._lock:
+            old = self._entries.get(key)
+            # A refresh that returned the same content keeps its original modification time
+            version = getattr(value, 'version', None)
+            if old is not None and version is not None and getattr(old.value, 'version', None) == version:
+                value.modified_at = old.value.modified_at
+            self._entries[key] = CacheEntry(value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
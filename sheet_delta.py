@@ -0,0 +1,165 @@
+"""
+Sheet Delta - 按行 key/hash 记录每个版本, 计算两个版本之间的增/改/删行
+
+    deltas = SheetDeltaLog(key_columns=('统计日期', '日期'))
+    deltas.record(sheet_id, table)
+    deltas.delta(sheet_id, table, since='<old revision>')
+
+The revision is the table's content version (identical across workers for
+the same content). Each worker keeps the row hashes of the last few versions
+in memory; with a `root` directory they are also written to disk, so a
+`since` served by another worker (or before a restart) still diffs. An
+unknown `since` gets a full reset instead.
+
+Layout on disk:
+    <root>/<sheet_id>/<version>.json   -> [[row key, row hash], ...] in row order
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+KEEP_VERSIONS = 4
+KEEP_PERSISTED = 16
+
+
+class RowIndex:
+    """ Row key -> (hash, position) for one table version """
+    def __init__(self, keys, hashes):
+        self.keys = list(keys)
+        self.rows = {key: (row_hash, position) for position, (key, row_hash) in enumerate(zip(self.keys, hashes))}
+
+    @classmethod
+    def build(cls, table, key_columns):
+        values = [table.raw[name].tolist() for name in table.headers]
+        # sha1 of the JSON row like the SQLite mirror: hash() collides for -1/-2 and 1/1.0/True
+        hashes = [hashlib.sha1(json.dumps(row, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+                  for row in (zip(*values) if values else [])]
+        return cls(cls._row_keys(table, key_columns), hashes)
+
+    @staticmethod
+    def _row_keys(table, key_columns):
+        """ '<date>#<n-th row of that date>', same scheme as the SQLite mirror; '#<position>' without a date """
+        key_column = next((c for c in key_columns if c in table.raw), None)
+        if key_column is None:
+            return [f"#{i}" for i in range(len(table))]
+        keys, seen = [], {}
+        for i, value in enumerate(table.raw[key_column].tolist()):
+            if not value:
+                keys.append(f"#{i}")
+                continue
+            value = str(value)
+            n = seen.get(value, 0)
+            seen[value] = n + 1
+            keys.append(f"{value}#{n}")
+        return keys
+
+
+class SheetDeltaLog:
+    def __init__(self, key_columns, keep=KEEP_VERSIONS, root=None, keep_persisted=KEEP_PERSISTED):
+        self.key_columns = tuple(key_columns)
+        self.keep = keep
+        self.root = root
+        self.keep_persisted = keep_persisted
+        self._versions = {}  # sheet_id -> OrderedDict(version -> RowIndex)
+        self._lock = threading.Lock()
+
+    def _remember(self, sheet_id, version, index):
+        with self._lock:
+            versions = self._versions.setdefault(sheet_id, OrderedDict())
+            versions[version] = index
+            versions.move_to_end(version)
+            while len(versions) > self.keep:
+                versions.popitem(last=False)
+
+    def _path(self, sheet_id, version):
+        return os.path.join(self.root, sheet_id, f"{version}.json")
+
+    def _save(self, sheet_id, version, index):
+        """ Write the row hashes atomically (tmp file + rename), then drop the oldest files """
+        path = self._path(sheet_id, version)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump([[key, index.rows[key][0]] for key in index.keys], f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        entries = [e for e in os.scandir(directory) if e.is_file() and not e.name.startswith('.')]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[self.keep_persisted:]:
+            if entry.path != path:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _load(self, sheet_id, version):
+        """ Row hashes another worker (or an earlier process) recorded, or None """
+        if self.root is None or not version.isalnum():  # versions are hex digests; never a path
+            return None
+        try:
+            with open(self._path(sheet_id, version), encoding='utf-8') as f:
+                pairs = json.load(f)
+        except (OSError, ValueError):
+            return None
+        index = RowIndex([key for key, _ in pairs], [row_hash for _, row_hash in pairs])
+        self._remember(sheet_id, version, index)
+        return index
+
+    def record(self, sheet_id, table):
+        """ Remember this version's row hashes (no-op if already known) """
+        with self._lock:
+            versions = self._versions.setdefault(sheet_id, OrderedDict())
+            index = versions.get(table.version)
+            if index is not None:
+                versions.move_to_end(table.version)
+                return index
+        index = RowIndex.build(table, self.key_columns)
+        self._remember(sheet_id, table.version, index)
+        if self.root is not None:
+            try:
+                self._save(sheet_id, table.version, index)
+            except OSError as e:
+                print(f"⚠️ Could not save row hashes of {sheet_id} @ {table.version[:8]}: {e}")
+        return index
+
+    def delta(self, sheet_id, table, since, columns=None):
+        """
+        Rows changed between revision `since` and `table`:
+            {revision, since, reset, inserted: [{key, row}], updated: [{key, row}], deleted: [key]}
+        reset=True (every row in inserted) when `since` is unknown (not in memory or on disk).
+        """
+        current = self.record(sheet_id, table)
+        with self._lock:
+            previous = self._versions.get(sheet_id, {}).get(since)
+        if previous is None:
+            previous = self._load(sheet_id, since)
+        names = list(columns) if columns else table.headers
+
+        def entry(key):
+            position = current.rows[key][1]
+            return {"key": key, "row": {name: table.raw[name][position] for name in names}}
+
+        if previous is None:
+            return {"revision": table.version, "since": since, "reset": True,
+                    "inserted": [entry(key) for key in current.keys], "updated": [], "deleted": []}
+
+        inserted, updated = [], []
+        for key in current.keys:
+            old = previous.rows.get(key)
+            if old is None:
+                inserted.append(entry(key))
+            elif old[0] != current.rows[key][0]:
+                updated.append(entry(key))
+        deleted = [key for key in previous.keys if key not in current.rows]
+        return {"revision": table.version, "since": since, "reset": False,
+                "inserted": inserted, "updated": updated, "deleted": deleted}
@@ -0,0 +1,198 @@
+"""
+Sheet Refresher - 后台定时刷新飞书表格, 聚合只算一次, 通过 SSE 推送变化的面板
+"""
+import json
+import queue
+import threading
+import time
+
+
+class StreamLimitReached(Exception):
+    """ max_streams SSE clients are already connected to this process """
+
+
+class EventBroker:
+    """
+    Fan-out of dashboard updates to connected SSE clients (one queue per client).
+
+    Every open stream holds a server thread (gunicorn gthread), so at most
+    max_streams clients are subscribed at once and each stream ends after
+    max_lifetime seconds; EventSource reconnects by itself after `retry`.
+    """
+    def __init__(self, queue_size=16, max_streams=None, max_lifetime=None):
+        self.queue_size = queue_size
+        self.max_streams = max_streams
+        self.max_lifetime = max_lifetime
+        self._subscribers = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """
+        New client queue, primed with the latest full snapshot of the channel.
+        Raises StreamLimitReached when max_streams clients are already subscribed.
+        """
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_streams and sum(len(s) for s in self._subscribers.values()) >= self.max_streams:
+                raise StreamLimitReached(f"{self.max_streams} live update streams already open")
+            self._subscribers.setdefault(channel, set()).add(q)
+            latest = self._latest.get(channel)
+        if latest is not None:
+            q.put(('snapshot', latest))
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            self._subscribers.get(channel, set()).discard(q)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, channel, version, payload):
+        """
+        Store the new snapshot and push only the panels that changed.
+        Returns the changed panel names.
+        """
+        with self._lock:
+            previous = self._latest.get(channel)
+            self._latest[channel] = {"version": version, "panels": payload}
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        if previous is None:
+            changed = payload
+        else:
+            changed = {k: v for k, v in payload.items() if previous["panels"].get(k) != v}
+        if not changed:
+            return []
+
+        delta = {"version": version, "panels": changed}
+        for q in subscribers:
+            try:
+                q.put_nowait(('delta', delta))
+            except queue.Full:
+                # Slow client: drop its backlog and let it resync from a full snapshot
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(('snapshot', {"version": version, "panels": payload}))
+        return list(changed)
+
+    def stream(self, channel, heartbeat=15):
+        """
+        SSE generator for one client; heartbeats keep proxies from closing the connection.
+        Subscribes right away (not on the first next()), so StreamLimitReached is raised
+        here and the route can still answer 503.
+        """
+        q = self.subscribe(channel)
+        return _Stream(self._events(channel, q, heartbeat), lambda: self.unsubscribe(channel, q))
+
+    def _events(self, channel, q, heartbeat):
+        deadline = time.monotonic() + self.max_lifetime if self.max_lifetime else None
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                timeout = heartbeat
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        # Hand the thread back; the client reconnects (and gets a fresh snapshot)
+                        return
+                try:
+                    event, data = q.get(timeout=timeout)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            self.unsubscribe(channel, q)
+
+
+class _Stream:
+    """ Response body of one SSE client; close() unsubscribes even if iteration never started """
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        self._events.close()
+        self._release()
+
+
+class SheetRefresher:
+    """
+    One background thread per process refreshing the dashboards every
+    `interval` seconds while this process has SSE subscribers. With nobody
+    watching it makes no Feishu calls at all; wake() (on subscribe) resumes it.
+
+    refresh_fn() returns {channel: (version, {panel: data})}; unchanged
+    versions are not recomputed into deltas.
+    """
+    def __init__(self, refresh_fn, broker, interval=60):
+        self.refresh_fn = refresh_fn
+        self.broker = broker
+        self.interval = interval
+        self._versions = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """ Start the refresh loop once (idempotent, safe from any request thread) """
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='sheet-refresher', daemon=True)
+                self._thread.start()
+                print(f"🔄 Sheet refresher started (every {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """ A client subscribed: refresh now if the loop is idle and the last refresh is older than interval """
+        self._wake.set()
+
+    def refresh_once(self):
+        """ Refresh every channel once and publish what changed """
+        started = time.monotonic()
+        results = self.refresh_fn()
+        for channel, (version, payload) in results.items():
+            if self._versions.get(channel) == version:
+                continue
+            self._versions[channel] = version
+            changed = self.broker.publish(channel, version, payload)
+            if changed:
+                print(f"📋 {channel}: pushed {', '.join(changed)} to {self.broker.subscriber_count(channel)} clients")
+        print(f"✅ Sheet refresh took {time.monotonic() - started:.2f}s")
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.broker.subscriber_count():
+                # Nobody is watching: no upstream calls until a dashboard subscribes
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                continue
+            if self._refreshed_at is not None:
+                remaining = self.interval - (time.monotonic() - self._refreshed_at)
+                if remaining > 0:
+                    self._stop.wait(remaining)
+                    continue
+            self._refreshed_at = time.monotonic()
+            try:
+                self.refresh_once()
+            except Exception as e:
+                # Keep serving the previous snapshot; try again next tick
+                print(f"❌ Sheet refresh failed: {e}")
@@ -0,0 +1,220 @@
+"""
+Sheet Snapshots - SheetTable 落盘 (列式 .npy, 数值列可 mmap), 用于冷启动和飞书不可用时兜底
+
+Layout per cache key:
+    <root>/<slug>/CURRENT          -> name of the latest snapshot directory
+    <root>/<slug>/<version>/meta.json
+    <root>/<slug>/<version>/typed_<i>.npy             number/percent: float64, date/text: unicode
+    <root>/<slug>/<version>/raw_<i>.npy + raw_<i>.off.npy + raw_<i>.null.npy
+                                                      raw cells: UTF-8 text, char offsets, None mask
+
+Snapshot directories are written under a temporary name and renamed, then
+CURRENT is replaced atomically, so readers never see a partial snapshot.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from sheet_table import ColumnSpec, SheetTable
+
+SNAPSHOT_FORMAT = 1
+KEEP_SNAPSHOTS = 2
+
+
+class LazyColumns(dict):
+    """ Raw columns decoded on first access (aggregates never touch them) """
+    def __init__(self, loaders):
+        super().__init__()
+        self._loaders = loaders
+
+    def __missing__(self, name):
+        if name not in self._loaders:
+            raise KeyError(name)
+        values = self[name] = self._loaders[name]()
+        return values
+
+    def __contains__(self, name):
+        return name in self._loaders
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def keys(self):
+        return self._loaders.keys()
+
+    def values(self):
+        return (self[name] for name in self._loaders)
+
+    def items(self):
+        return ((name, self[name]) for name in self._loaders)
+
+
+def _encode_raw(values):
+    """ object column -> (utf-8 text, char offsets, None mask, json-encoded?) """
+    is_null = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    as_json = any(v is not None and not isinstance(v, str) for v in values)
+    if as_json:
+        cells = ['' if v is None else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+    else:
+        cells = ['' if v is None else v for v in values]
+    offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in cells], out=offsets[1:])
+    text = np.frombuffer(''.join(cells).encode('utf-8'), dtype=np.uint8)
+    return text, offsets, is_null, as_json
+
+
+def _open_raw(path):
+    """
+    Memory-map a raw column's files. Done when the snapshot is loaded: the
+    mappings stay readable after another worker prunes the version directory.
+    """
+    return tuple(np.load(path + suffix, mmap_mode='r') for suffix in ('.npy', '.off.npy', '.null.npy'))
+
+
+def _decode_raw(parts, as_json):
+    text, offsets, is_null = parts
+    text = text.tobytes().decode('utf-8')
+    offsets = offsets.tolist()
+    column = np.empty(len(offsets) - 1, dtype=object)
+    column[:] = [text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    if as_json:
+        column[:] = [json.loads(c) if c else c for c in column]
+    column[np.asarray(is_null)] = None
+    return column
+
+
+class SnapshotStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def slug(key):
+        """ Cache key -> directory name ('spreadsheet_sheet_columnsHash') """
+        token, sheet_id, columns = key
+        suffix = 'all' if columns == '*' else hashlib.sha1(json.dumps(list(columns), ensure_ascii=False)
+                                                           .encode('utf-8')).hexdigest()[:12]
+        return f"{token}_{sheet_id}_{suffix}"
+
+    def _current(self, key):
+        directory = os.path.join(self.root, self.slug(key))
+        try:
+            with open(os.path.join(directory, 'CURRENT'), encoding='utf-8') as f:
+                return directory, f.read().strip()
+        except FileNotFoundError:
+            return directory, None
+
+    def save(self, key, table, revision=None):
+        """ Persist a table; no-op for empty tables or an unchanged version """
+        if not len(table):
+            return False
+        directory, current = self._current(key)
+        if current == table.version:
+            return False
+
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix='.tmp-', dir=directory)
+            try:
+                columns = []
+                for i, name in enumerate(table.headers):
+                    text, offsets, is_null, as_json = _encode_raw(table.raw[name])
+                    base = os.path.join(tmp, f"raw_{i}")
+                    np.save(base + '.npy', text)
+                    np.save(base + '.off.npy', offsets)
+                    np.save(base + '.null.npy', is_null)
+                    columns.append({"name": name, "json": as_json})
+
+                typed = []
+                for i, (name, values) in enumerate(table.typed.items()):
+                    if values.dtype == object:
+                        values = values.astype(str)
+                    np.save(os.path.join(tmp, f"typed_{i}.npy"), values)
+                    typed.append(name)
+
+                meta = {
+                    "format": SNAPSHOT_FORMAT,
+                    "key": [key[0], key[1], key[2] if key[2] == '*' else list(key[2])],
+                    "version": table.version,
+                    "revision": revision,
+                    "modified_at": table.modified_at,
+                    "saved_at": time.time(),
+                    "length": len(table),
+                    "columns": columns,
+                    "schema": [[spec.name, spec.kind] for spec in table.schema.values()],
+                    "typed": typed,
+                }
+                with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False)
+
+                final = os.path.join(directory, table.version)
+                try:
+                    os.rename(tmp, final)
+                except OSError:
+                    # Another worker saved the same content first
+                    if not os.path.isdir(final):
+                        raise
+                    shutil.rmtree(tmp, ignore_errors=True)
+                fd, pointer = tempfile.mkstemp(prefix='.CURRENT-', dir=directory)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(table.version)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(pointer, os.path.join(directory, 'CURRENT'))
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            self._prune(directory, table.version)
+        print(f"💾 Saved snapshot {self.slug(key)} @ {table.version[:8]} (revision {revision})")
+        return True
+
+    def _prune(self, directory, current):
+        """
+        Keep the newest KEEP_SNAPSHOTS versions. Loaded tables map their files at
+        load time, so removing a version a worker still serves is safe (POSIX).
+        """
+        entries = [e for e in os.scandir(directory) if e.is_dir() and not e.name.startswith('.')]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[KEEP_SNAPSHOTS:]:
+            if entry.name != current:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def load(self, key):
+        """ Latest snapshot as a SheetTable (float columns memory-mapped), or None """
+        directory, current = self._current(key)
+        if current is None:
+            return None
+        path = os.path.join(directory, current)
+        try:
+            with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("format") != SNAPSHOT_FORMAT:
+                return None
+
+            schema = [ColumnSpec(name, kind) for name, kind in meta["schema"]]
+            typed = {}
+            for i, name in enumerate(meta["typed"]):
+                values = np.load(os.path.join(path, f"typed_{i}.npy"), mmap_mode='r')
+                typed[name] = values if values.dtype == np.float64 else np.asarray(values).astype(object)
+
+            raw = LazyColumns({
+                column["name"]: (lambda p=_open_raw(os.path.join(path, f"raw_{i}")), j=column["json"]: _decode_raw(p, j))
+                for i, column in enumerate(meta["columns"])
+            })
+            table = SheetTable.restore([c["name"] for c in meta["columns"]], raw, typed, schema,
+                                       meta["length"], meta["version"], meta["modified_at"])
+            table.revision = meta.get("revision")
+            table.saved_at = meta.get("saved_at")
+            return table
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not load snapshot {path}: {e}")
+            return None
@@ -0,0 +1,179 @@
+"""
+Sheet Table - 列式表格 + 声明式列清洗 (number / integer / percent / date / text)
+"""
+import hashlib
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+# 飞书公式报错/列宽不足时渲染出的值, 按 0 处理
+ERROR_SENTINELS = ('#DIV/0!', '######', '#N/A', '#VALUE!', '#REF!', '#NAME?', '#NUM!')
+# 视为空值
+EMPTY_VALUES = ('', 'None', 'nan', 'NaN', '-', '--')
+
+
+class ColumnSpec:
+    def __init__(self, name, kind='number'):
+        """
+        name: 表头名称
+        kind: number (去千分位), integer (同 number, 计数类汇总结果取整),
+              percent ('12.3%' 和不带 % 的 12.3 -> 0.123; 不大于 1 的值已是比例: '0.123' -> 0.123),
+              date ('YYYY-MM-DD'), text
+        """
+        self.name = name
+        self.kind = kind
+
+
+def _clean_text(values):
+    text = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+    return text.where(~text.isin(EMPTY_VALUES), '')
+
+
+def clean_column(values, kind):
+    """
+    Vectorized cleaning of one raw column.
+    number/integer/percent -> float64 with NaN for missing, date/text -> object array of str.
+    """
+    text = _clean_text(values)
+    if kind == 'text':
+        return text.to_numpy(dtype=object)
+
+    if kind == 'date':
+        # 2024/1/5 and 2024年1月5日 -> 2024-1-5
+        normalized = text.str.replace('/', '-', regex=False)
+        if normalized.str.contains('年', regex=False).any():
+            normalized = normalized.str.replace(r'(\d{4})年(\d{1,2})月(\d{1,2})日?', r'\1-\2-\3', regex=True)
+        parsed = pd.to_datetime(normalized, errors='coerce', format='%Y-%m-%d')
+        # Fall back to per-element parsing only for the cells the fast path missed
+        retry = parsed.isna() & (text != '')
+        if retry.any():
+            parsed[retry] = pd.to_datetime(normalized[retry], errors='coerce', format='mixed')
+        iso = parsed.dt.strftime('%Y-%m-%d')
+        return iso.where(parsed.notna(), text).to_numpy(dtype=object)
+
+    text = text.str.replace(',', '', regex=False)
+    sentinel = text.isin(ERROR_SENTINELS)
+    is_percent = text.str.endswith('%')
+    numbers = pd.to_numeric(text.str.rstrip('%').where(~sentinel, '0'), errors='coerce')
+    if kind == 'percent':
+        # A rate above 1 is a percentage even without the '%' sign (same rule as migrations._rate_sql)
+        numbers = numbers.where(~(is_percent | (numbers > 1)), numbers / 100)
+    return numbers.to_numpy(dtype=np.float64)
+
+
+class SheetTable:
+    """
+    Column-oriented view of one parsed sheet. Raw cell values are kept per
+    column (for the /data routes); schema columns are cleaned once into typed
+    numpy arrays and every aggregate runs on those arrays.
+    """
+    def __init__(self, headers, raw_columns, schema=()):
+        self.headers = list(headers)
+        self.raw = raw_columns
+        self.length = len(next(iter(raw_columns.values()))) if raw_columns else 0
+        # Content hash (identical across workers) and when this content was first seen
+        self.version = self._content_hash()
+        self.modified_at = time.time()
+        self.schema = {spec.name: spec for spec in schema}
+        self.typed = {
+            name: clean_column(raw_columns[name], spec.kind)
+            for name, spec in self.schema.items() if name in raw_columns
+        }
+
+    @classmethod
+    def from_rows(cls, headers, rows, schema=()):
+        """ Build from a header row plus data rows (lists of cells) """
+        keep = [(i, str(h)) for i, h in enumerate(headers) if h]
+        rows = [row for row in rows if len(row) > keep[0][0]] if keep else []
+        raw_columns = {}
+        for i, name in keep:
+            column = np.empty(len(rows), dtype=object)
+            column[:] = [row[i] if i < len(row) else None for row in rows]
+            raw_columns[name] = column
+        return cls(list(raw_columns), raw_columns, schema)
+
+    @classmethod
+    def from_records(cls, records, schema=(), headers=None):
+        """
+        Build from a list of {header: value} dicts.
+        headers: column order (e.g. the sheet's header row); keys it doesn't list come after
+        """
+        headers = list(dict.fromkeys([*(headers or ()), *(key for record in records for key in record)]))
+        raw_columns = {}
+        for name in headers:
+            column = np.empty(len(records), dtype=object)
+            column[:] = [record.get(name) for record in records]
+            raw_columns[name] = column
+        return cls(headers, raw_columns, schema)
+
+    @classmethod
+    def restore(cls, headers, raw_columns, typed, schema, length, version, modified_at):
+        """ Rebuild from already-cleaned columns (sheet_snapshot), skipping hashing and cleaning """
+        table = cls.__new__(cls)
+        table.headers = list(headers)
+        table.raw = raw_columns
+        table.length = length
+        table.version = version
+        table.modified_at = modified_at
+        table.schema = {spec.name: spec for spec in schema}
+        table.typed = typed
+        return table
+
+    def __len__(self):
+        return self.length
+
+    def _content_hash(self):
+        digest = hashlib.sha1()
+        for name in self.headers:
+            digest.update(json.dumps([name, self.raw[name].tolist()], ensure_ascii=False, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def column(self, name):
+        """ Typed column; all-NaN (or empty strings) when the sheet lacks it """
+        if name in self.typed:
+            return self.typed[name]
+        kind = self.schema[name].kind if name in self.schema else 'text'
+        if kind in ('number', 'integer', 'percent'):
+            return np.full(self.length, np.nan)
+        return np.full(self.length, '', dtype=object)
+
+    def sum(self, name, mask=None):
+        values = self.column(name)
+        return float(np.nansum(values if mask is None else values[mask]))
+
+    def mean(self, name, mask=None):
+        values = self.column(name)
+        if mask is not None:
+            values = values[mask]
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else 0.0
+
+    def group_sum(self, key, names, mask=None):
+        """
+        Sum number columns grouped by a text/date column.
+        Returns (sorted keys, {name: sums aligned with keys}); empty keys are skipped.
+        """
+        keys = self.column(key)
+        mask = (keys != '') if mask is None else (mask & (keys != ''))
+        uniq, inverse = np.unique(keys[mask].astype(str), return_inverse=True)
+        sums = {
+            name: np.bincount(inverse, weights=np.nan_to_num(self.column(name)[mask]), minlength=len(uniq))
+            for name in names
+        }
+        return uniq.tolist(), sums
+
+    def to_records(self):
+        """ Rows as {header: raw value} dicts, in sheet order """
+        columns = [(name, self.raw[name]) for name in self.headers]
+        return [{name: values[i] for name, values in columns} for i in range(self.length)]
+
+    def iter_records(self, columns=None, start=0, stop=None, batch_rows=1000):
+        """ Rows start..stop as lists of {header: raw value} dicts, batch_rows at a time """
+        names = list(columns) if columns else self.headers
+        stop = self.length if stop is None else min(stop, self.length)
+        for lo in range(start, stop, batch_rows):
+            hi = min(lo + batch_rows, stop)
+            values = [self.raw[name][lo:hi].tolist() for name in names]
+            yield [dict(zip(names, row)) for row in zip(*values)]
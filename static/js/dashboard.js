@@ -185,8 +185,15 @@ async function renderDemographicsChart() {
 // --- Sales Page Functions ---
 
 async function fetchSalesData() {
+    // Only the sales page has these panels
+    if (!document.getElementById('salesTrendChart')) return;
+
+    // KPI + trend + funnel in a single request (one SQL query on the server)
+    const data = await fetchData('/api/dashboard/sales?panels=overview,trend,funnel');
+    if (!data) return;
+
     // 1. KPI
-    const overview = await fetchData('/api/sales/overview');
+    const overview = data.overview;
     if (overview) {
         if (document.getElementById('sales-total')) document.getElementById('sales-total').textContent = `¥${overview.total_sales.toLocaleString()}`;
         if (document.getElementById('sales-visitors')) document.getElementById('sales-visitors').textContent = overview.total_visitors.toLocaleString();
@@ -194,10 +201,35 @@ async function fetchSalesData() {
     }
 
     // 2. Trend Chart
-    const trend = await fetchData('/api/sales/trend');
-    if (trend) {
-        renderSalesTrendChart(trend);
+    if (data.trend) {
+        renderSalesTrendChart(data.trend);
     }
+
+    // 3. Funnel Chart
+    if (data.funnel) {
+        renderFunnelChart(data.funnel);
+    }
+}
+
+function renderFunnelChart(data) {
+    const chartDom = document.getElementById('funnelChart');
+    if (!chartDom) return;
+    const chart = echarts.init(chartDom);
+    chart.setOption({
+        tooltip: { trigger: 'item' },
+        legend: { data: ['访客', '加购', '支付订单'] },
+        series: [{
+            name: '全店转化漏斗', type: 'funnel', left: '10%', width: '80%',
+            sort: 'descending',
+            label: { show: true, position: 'inside', formatter: '{b}: {c}' },
+            data: [
+                { value: data.visitors, name: '访客' },
+                { value: data.cart, name: '加购' },
+                { value: data.orders, name: '支付订单' }
+            ]
+        }]
+    });
+    window.addEventListener('resize', () => chart.resize());
 }
 
 function renderSalesTrendChart(data) {
@@ -0,0 +1,53 @@
+// Sheet Delta - 本地保存一份原始数据, 轮询 ?since=<revision> 只拉取变化的行
+//
+//   const rows = new SheetRows('/api/live/data', { columns: [...], onChange: rows => ... }).start();
+//
+// The first request (since= empty) returns every row; after that the server
+// only sends inserted / updated / deleted rows, or reset when it no longer
+// knows our revision.
+class SheetRows {
+    constructor(url, { columns = null, interval = 30000, onChange = () => {} } = {}) {
+        this.url = url;
+        this.columns = columns;
+        this.interval = interval;
+        this.onChange = onChange;
+        this.rows = new Map();  // row key -> row, in sheet order
+        this.revision = '';
+        this.timer = null;
+    }
+
+    async refresh() {
+        const params = new URLSearchParams({ since: this.revision });
+        if (this.columns) params.set('columns', this.columns.join(','));
+        try {
+            // no-cache: revalidate with the ETag (a cheap 304 while the sheet is unchanged)
+            const response = await fetch(`${this.url}?${params}`, { cache: 'no-cache' });
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            this.apply(await response.json());
+        } catch (error) {
+            console.error('Delta fetch error:', error);
+        }
+    }
+
+    apply(delta) {
+        if (delta.reset) this.rows.clear();
+        delta.inserted.forEach(item => this.rows.set(item.key, item.row));
+        delta.updated.forEach(item => this.rows.set(item.key, item.row));
+        delta.deleted.forEach(key => this.rows.delete(key));
+        this.revision = delta.revision;
+        if (delta.reset || delta.inserted.length || delta.updated.length || delta.deleted.length) {
+            this.onChange(Array.from(this.rows.values()), delta);
+        }
+    }
+
+    start() {
+        this.refresh();
+        this.timer = setInterval(() => this.refresh(), this.interval);
+        return this;
+    }
+
+    stop() {
+        clearInterval(this.timer);
+        this.timer = null;
+    }
+}
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """ The app module on a throwaway database (app reads its configuration at import) """
+    workdir = tmp_path_factory.mktemp('app')
+    os.environ.update(
+        ECOMMERCE_DB_PATH=str(workdir / 'test.db'),
+        SNAPSHOT_DIR=str(workdir / 'snapshots'),
+        ANALYTICS_PARQUET_PATH=str(workdir / 'analytics' / 'daily_sales.parquet'),
+        INGEST_DIR=str(workdir / 'drop'),
+        # No background refresher / Feishu traffic during tests
+        FEISHU_REFRESH_INTERVAL='0',
+        FEISHU_BASE_URL='http://127.0.0.1:9',
+    )
+    import app as app_module
+    app_module.ensure_schema(app_module.app, app_module.DB_SCHEMA_LOCK_PATH,
+                             app_module.upgrade_schema, app_module.schema_current)
+    return app_module
@@ -0,0 +1,93 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func
+
+from bench import synth
+from database import db
+from models import DailySales
+from services import AnalyticsService, DuckDBAnalyticsBackend, IngestionService, RollupService, SQLiteAnalyticsBackend
+
+CALLS = [
+    ('get_sales_overview', {}),
+    ('get_sales_overview', {'start': date(2020, 2, 1), 'end': date(2020, 3, 1), 'category': '彩妆'}),
+    ('get_sales_funnel', {'start': date(2020, 2, 1)}),
+    ('get_service_metrics', {}),
+    ('get_service_metrics', {'category': '个护', 'end': date(2020, 5, 5)}),
+    ('get_sales_trend', {}),
+    ('get_sales_trend', {'start': date(2020, 1, 15), 'end': date(2020, 2, 1), 'points': 5}),
+    ('get_dashboard', {}),
+    ('get_dashboard', {'panels': ('overview', 'service'), 'category': '香氛'}),
+    ('get_period_comparison', {'grain': 'week'}),
+    ('get_period_comparison', {'grain': 'month', 'start': date(2020, 3, 10), 'end': date(2020, 6, 30), 'category': '护肤'}),
+    ('get_period_comparison', {'grain': 'day', 'lag': 7, 'start': date(2020, 2, 1)}),
+    ('get_rolling', {'window': 7}),
+    ('get_rolling', {'window': 30, 'start': date(2020, 2, 1), 'end': date(2020, 2, 20), 'category': '彩妆'}),
+]
+
+
+def approx_tree(value):
+    """ pytest.approx for every number in nested dicts / lists (sums differ in the last bits by summation order) """
+    if isinstance(value, dict):
+        return {k: approx_tree(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [approx_tree(v) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return pytest.approx(value, rel=1e-9, abs=1e-6)
+    return value
+
+
+def run_calls():
+    return [getattr(AnalyticsService, name)(**kwargs) for name, kwargs in CALLS]
+
+
+@pytest.fixture(scope='module')
+def sales(app_module, tmp_path_factory):
+    workbook = synth.excel_file(str(tmp_path_factory.mktemp('excel') / 'sales.xlsx'), 2000)
+    with app_module.app.app_context():
+        IngestionService.bulk_import(workbook, mode='replace')
+        # A row without a date and one without service metrics
+        db.session.add(DailySales(date=None, category='彩妆', payment_amount=5, visitors=1))
+        db.session.add(DailySales(date=date(2020, 1, 3), category='彩妆', payment_amount=7.5, visitors=2))
+        db.session.commit()
+        RollupService.rebuild()
+        yield app_module
+
+
+@pytest.fixture(scope='module')
+def expected(sales):
+    """ Reference: the SQLite backend scanning daily_sales row by row """
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(AnalyticsService, 'backend', SQLiteAnalyticsBackend())
+        patch.setattr(RollupService, 'available', staticmethod(lambda: False))
+        return run_calls()
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def backend(request, sales, tmp_path, monkeypatch):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+        backend = DuckDBAnalyticsBackend(str(tmp_path / 'daily_sales.parquet'))
+        backend.refresh()
+    else:
+        assert RollupService.available()
+        backend = SQLiteAnalyticsBackend()
+    monkeypatch.setattr(AnalyticsService, 'backend', backend)
+    return backend
+
+
+@pytest.mark.parametrize('index', range(len(CALLS)), ids=[f"{name}-{i}" for i, (name, _) in enumerate(CALLS)])
+def test_backend_matches_row_scan(backend, expected, index):
+    name, kwargs = CALLS[index]
+    assert getattr(AnalyticsService, name)(**kwargs) == approx_tree(expected[index])
+
+
+def test_unfiltered_totals_keep_undated_rows(backend):
+    total = db.session.query(func.sum(DailySales.payment_amount)).scalar()
+    makeup = db.session.query(func.sum(DailySales.payment_amount)).filter(DailySales.category == '彩妆').scalar()
+
+    assert AnalyticsService.get_sales_overview()['total_sales'] == pytest.approx(total, rel=0, abs=1e-3)
+    assert AnalyticsService.get_dashboard(category='彩妆')['overview']['total_sales'] == pytest.approx(makeup, rel=0, abs=1e-3)
+    # A date range leaves the undated row out
+    dated = db.session.query(func.sum(DailySales.payment_amount)).filter(DailySales.date.isnot(None)).scalar()
+    assert AnalyticsService.get_sales_overview(start=date(2000, 1, 1))['total_sales'] == pytest.approx(dated, rel=0, abs=1e-3)
@@ -0,0 +1,59 @@
+import pytest
+
+from bench import synth
+from services import FeishuAnalyticsService, IngestionService, RollupService
+from sheet_table import SheetTable
+
+FEISHU_HEADERS = [spec.name for spec in FeishuAnalyticsService.SCHEMA]
+QUERIES = ['', 'points=20', 'start=2020-02-01&end=2020-03-15&category=彩妆']
+
+
+def approx_tree(value):
+    """ pytest.approx for every number (the combined payload sums per-day rows in another order) """
+    if isinstance(value, dict):
+        return {k: approx_tree(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [approx_tree(v) for v in value]
+    if isinstance(value, float):
+        return pytest.approx(value, rel=1e-9, abs=1e-6)
+    return value
+
+
+@pytest.fixture(scope='module')
+def client(app_module, tmp_path_factory):
+    workbook = synth.excel_file(str(tmp_path_factory.mktemp('excel') / 'sales.xlsx'), 300)
+    with app_module.app.app_context():
+        IngestionService.bulk_import(workbook, mode='replace')
+        RollupService.rebuild()
+
+    rows = [[f'2024-01-{d:02d}', d * 100.5, d * 10, d, d * 3, 20 + d % 5, 30 + d, 1.5, '大促' if d % 7 == 0 else '']
+            for d in range(1, 29)]
+    key = app_module.sheet_key(app_module.FEISHU_SHEET_ID)
+    app_module.sheet_cache.put(key, SheetTable.from_rows(FEISHU_HEADERS, rows, FeishuAnalyticsService.SCHEMA))
+    yield app_module.app.test_client()
+    app_module.sheet_cache.invalidate()
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_sales_dashboard_matches_the_panel_routes(client, query):
+    routes = {'overview': '/api/sales/overview', 'trend': '/api/sales/trend',
+              'funnel': '/api/sales/funnel', 'service': '/api/service/metrics'}
+
+    combined = client.get(f'/api/dashboard/sales?{query}')
+
+    assert combined.status_code == 200
+    assert combined.get_json() == approx_tree({panel: client.get(f'{url}?{query}').get_json()
+                                               for panel, url in routes.items()})
+
+
+@pytest.mark.parametrize('query', QUERIES[:2])
+def test_feishu_dashboard_matches_the_panel_routes(client, query):
+    routes = {'overview': '/api/feishu/overview', 'trend': '/api/feishu/trend',
+              'funnel': '/api/feishu/funnel', 'service': '/api/feishu/service'}
+
+    combined = client.get(f'/api/dashboard/feishu?{query}')
+
+    assert combined.status_code == 200
+    assert combined.get_json() == {panel: client.get(f'{url}?{query}').get_json() for panel, url in routes.items()}
+    assert client.get(f'/api/dashboard/feishu?panels=funnel,overview&{query}').get_json() == {
+        panel: client.get(f'{routes[panel]}?{query}').get_json() for panel in ('funnel', 'overview')}
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from downsample import downsample_indices, lttb, minmax
+
+WAVE = np.sin(np.linspace(0, 20, 1000)) * 100 + np.linspace(0, 50, 1000)
+
+
+@pytest.mark.parametrize('sampler', [lttb, minmax])
+def test_samplers_keep_the_ends_within_budget(sampler):
+    keep = sampler(WAVE, 50)
+    assert keep[0] == 0 and keep[-1] == len(WAVE) - 1
+    assert len(keep) <= 52
+    assert (np.diff(keep) > 0).all()
+
+
+@pytest.mark.parametrize('sampler', [lttb, minmax])
+def test_samplers_keep_everything_under_budget(sampler):
+    assert sampler([1, 2, 3], 10).tolist() == [0, 1, 2]
+
+
+def test_lttb_keeps_an_isolated_spike():
+    y = np.zeros(500)
+    y[321] = 1000
+    assert 321 in lttb(y, 20)
+
+
+def test_minmax_keeps_each_bucket_extremes():
+    y = [5, 1, 9, 3, 0, 7, 2, 8]
+    # two buckets of four: (1, 9) and (0, 8)
+    assert minmax(y, 4).tolist() == [0, 1, 2, 4, 7]
+
+
+def test_nan_is_treated_as_zero():
+    y = [1.0, np.nan, 3.0, np.nan, 2.0]
+    assert len(lttb(y, 3)) == 3
+
+
+def test_every_series_keeps_its_extremes():
+    sales = np.linspace(0, 1, 400)
+    visitors = np.full(400, 10.0)
+    visitors[123], visitors[321] = 500, -5
+    keep = downsample_indices([sales, visitors], 20).tolist()
+    assert {0, 399, 123, 321} <= set(keep)
+    assert len(keep) <= 20 + 4
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_pinned_rows_are_kept_on_top_of_the_budget(method):
+    pinned = np.zeros(len(WAVE), dtype=bool)
+    pinned[[10, 500, 777]] = True
+    keep = downsample_indices([WAVE], 30, pinned, method=method)
+    assert {10, 500, 777} <= set(keep.tolist())
+    assert len(keep) <= 30 + 3 + 2
+
+    # Index lists work as well as masks
+    assert {10, 500} <= set(downsample_indices([WAVE], 30, [10, 500], method=method).tolist())
+
+
+def test_no_budget_keeps_every_row():
+    assert downsample_indices([WAVE], None).tolist() == list(range(len(WAVE)))
+    assert downsample_indices([WAVE], 0).tolist() == list(range(len(WAVE)))
+    assert downsample_indices([], 10).tolist() == []
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample_indices([WAVE], 10, method='average')
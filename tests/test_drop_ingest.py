@@ -0,0 +1,93 @@
+import contextlib
+import os
+import shutil
+
+import pytest
+
+from bench import synth
+from database import db
+from drop_ingest import DropIngestor
+from models import DailySales, IngestedFile
+from services import RollupService
+
+
+@pytest.fixture
+def drop(app_module, tmp_path):
+    """ An empty drop directory; rows and ingested_files written by the test are removed afterwards """
+    with app_module.app.app_context():
+        max_id = db.session.query(db.func.max(DailySales.id)).scalar() or 0
+        directory = tmp_path / 'drop'
+        directory.mkdir()
+        yield directory
+        db.session.rollback()
+        db.session.query(DailySales).filter(DailySales.id > max_id).delete()
+        db.session.query(IngestedFile).delete()
+        db.session.commit()
+        RollupService.rebuild()
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    return synth.excel_file(str(tmp_path_factory.mktemp('excel') / 'sales.xlsx'), 40)
+
+
+def statuses(results):
+    return sorted((os.path.basename(r['path']), r['status']) for r in results)
+
+
+def test_redropped_content_is_imported_once(drop, workbook):
+    shutil.copy(workbook, drop / 'a.xlsx')
+    ingestor = DropIngestor(str(drop), workers=1, settle=0)
+    assert statuses(ingestor.run()) == [('a.xlsx', 'ok')]
+    assert IngestedFile.query.one().row_count == 40
+
+    # Same bytes under another name, and again in a later process
+    shutil.copy(workbook, drop / 'b.xlsx')
+    assert ingestor.run() == []
+    assert DropIngestor(str(drop), workers=1, settle=0).run() == []
+    assert DailySales.query.count() >= 40
+    assert IngestedFile.query.count() == 1
+
+
+def test_unreadable_file_is_not_reparsed_until_it_changes(drop, workbook):
+    (drop / 'broken.xlsx').write_bytes(b'not a workbook')
+    ingestor = DropIngestor(str(drop), workers=1, settle=0)
+    assert statuses(ingestor.run()) == [('broken.xlsx', 'error')]
+    assert IngestedFile.query.one().status == 'error'
+
+    # Unchanged: skipped by this watcher, retried by a new run
+    assert ingestor.run(quiet=True) == []
+    assert statuses(DropIngestor(str(drop), workers=1, settle=0).run()) == [('broken.xlsx', 'error')]
+
+    # Fixed in place: parsed again and imported
+    shutil.copy(workbook, drop / 'broken.xlsx')
+    assert statuses(ingestor.run()) == [('broken.xlsx', 'ok')]
+    assert ingestor._failed == {}
+
+
+def test_write_failure_is_retried_on_the_next_pass(drop, workbook):
+    shutil.copy(workbook, drop / 'a.xlsx')
+    failures = [OSError("database is locked")]
+
+    @contextlib.contextmanager
+    def flaky_lock():
+        if failures:
+            raise failures.pop()
+        yield
+
+    ingestor = DropIngestor(str(drop), workers=1, settle=0, lock=flaky_lock)
+    assert statuses(ingestor.run()) == [('a.xlsx', 'error')]
+    assert statuses(ingestor.run()) == [('a.xlsx', 'ok')]
+    assert IngestedFile.query.one().status == 'ok'
+
+
+def test_hash_memo_forgets_removed_files(drop, workbook):
+    ingestor = DropIngestor(str(drop), workers=1, settle=0)
+    for name in ('a.xlsx', 'b.xlsx'):
+        shutil.copy(workbook, drop / name)
+    ingestor.scan()
+    assert len(ingestor._hashes) == 2
+
+    os.remove(drop / 'a.xlsx')
+    ingestor.scan()
+    assert [os.path.basename(path) for path, _, _ in ingestor._hashes] == ['b.xlsx']
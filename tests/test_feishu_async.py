@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+import feishu_async
+from feishu_async import AsyncFeishuSheetService
+from feishu_scheduler import SchedulerTimeout, TokenBucket
+
+
+async def get_json_with_retry(monkeypatch, retry_after):
+    """ _get_json against a local server answering 429 (+ Retry-After) once, then code 0 """
+    answers = [web.json_response({"code": 0, "msg": "rate limited"}, status=429,
+                                 headers={"Retry-After": retry_after} if retry_after else None),
+               web.json_response({"code": 0, "data": {}})]
+
+    async def handler(request):
+        return answers.pop(0)
+
+    app = web.Application()
+    app.router.add_get('/open-apis/sheets/v2/spreadsheets/token/metainfo', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    async def get_token(stale_token=None):
+        return 'token'
+
+    monkeypatch.setattr(feishu_async.asyncio, 'sleep', sleep)
+    try:
+        async with AsyncFeishuSheetService('app', 'secret') as client:
+            monkeypatch.setattr(client, '_get_token', get_token)
+            data = await client._get_json(f"http://127.0.0.1:{port}/open-apis/sheets/v2/spreadsheets/token/metainfo")
+            return data, list(delays), client.transport
+    finally:
+        await runner.cleanup()
+
+
+def test_retry_after_is_honoured(monkeypatch):
+    data, delays, _ = asyncio.run(get_json_with_retry(monkeypatch, '2'))
+    assert data["code"] == 0
+    assert delays == [2.0]
+
+
+def test_backoff_uses_the_transport_settings(monkeypatch):
+    transport = feishu_async.FeishuTransport.for_base_url(feishu_async.FEISHU_BASE_URL)
+    monkeypatch.setattr(transport, 'backoff_base', 0.001)
+    monkeypatch.setattr(transport, 'backoff_max', 0.002)
+    data, delays, used = asyncio.run(get_json_with_retry(monkeypatch, None))
+    assert used is transport
+    assert data["code"] == 0
+    assert len(delays) == 1 and 0 <= delays[0] <= 0.002
+
+
+def test_async_acquire_waits_on_the_event_loop():
+    bucket = TokenBucket(rate=50, burst=1)
+    ticks = []
+
+    async def ticker():
+        while len(ticks) < 5:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.005)
+
+    async def run():
+        started = time.monotonic()
+        ticking = asyncio.create_task(ticker())
+        waits = await asyncio.gather(*(bucket.acquire_async() for _ in range(3)))
+        await ticking
+        return time.monotonic() - started, waits
+
+    elapsed, waits = asyncio.run(run())
+
+    # 1 token in the bucket, then one per 20ms; the loop kept running meanwhile
+    assert elapsed >= 0.035 and sorted(waits)[0] < 0.005
+    assert len(ticks) == 5
+
+
+def test_async_acquire_times_out():
+    bucket = TokenBucket(rate=1, burst=1)
+    bucket.try_acquire()
+
+    with pytest.raises(SchedulerTimeout):
+        asyncio.run(bucket.acquire_async(timeout=0.02))
+
+
+def test_sheet_missing_from_metainfo_raises(monkeypatch):
+    async def run():
+        async with AsyncFeishuSheetService('app', 'secret') as client:
+            async def get_meta(spreadsheet_token):
+                return {'known': (10, 3)}, 5
+            monkeypatch.setattr(client, 'get_meta', get_meta)
+            monkeypatch.setattr(client, 'batch_get', pytest.fail)
+            await client.read_sheets('token', ['known', 'gone'])
+
+    with pytest.raises(RuntimeError, match='Metainfo unavailable for sheet gone'):
+        asyncio.run(run())
@@ -0,0 +1,151 @@
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import feishu_service
+from feishu_service import FeishuSheetService, TenantTokenManager
+
+HEADERS = ['日期', '备注', '支付金额', '访客数', '活动节点']
+GRID = [HEADERS] + [[f'2024-01-{d:02d}', f'note {d}', d * 10, d, None] for d in range(1, 8)]
+META = {"revision": 7, "row_count": len(GRID), "column_count": len(HEADERS)}
+
+
+def column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+class FakeRanges:
+    """ _read_range stand-in serving GRID; like Feishu it drops trailing empty cells and rows """
+    def __init__(self):
+        self.ranges = []
+
+    def __call__(self, spreadsheet_token, range_str):
+        self.ranges.append(range_str)
+        c1, r1, c2, r2 = re.match(r'^\w+!([A-Z]+)(\d+):([A-Z]+)(\d+)$', range_str).groups()
+        rows = [row[column_index(c1):column_index(c2) + 1] for row in GRID[int(r1) - 1:int(r2)]]
+        rows = [row[:max([i + 1 for i, cell in enumerate(row) if cell is not None], default=0)] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+
+def service(monkeypatch, chunk_rows):
+    feishu = FeishuSheetService('app', 'secret', chunk_rows=chunk_rows, max_workers=3)
+    fake = FakeRanges()
+    monkeypatch.setattr(feishu, '_read_range', fake)
+    return feishu, fake
+
+
+def test_row_blocks_are_stitched_in_order(monkeypatch):
+    feishu, fake = service(monkeypatch, chunk_rows=3)
+    values = feishu._read_sheet_chunked('token', 'sheet', meta=META)
+
+    assert values == GRID
+    assert fake.ranges == ['sheet!A1:E3', 'sheet!A4:E6', 'sheet!A7:E8']
+    assert feishu.last_revision == 7
+
+
+def test_projection_reads_only_the_wanted_column_spans(monkeypatch):
+    feishu, fake = service(monkeypatch, chunk_rows=5)
+    values = feishu._read_sheet_chunked('token', 'sheet', columns=['日期', '支付金额', '访客数'], meta=META)
+
+    assert fake.ranges[0] == 'sheet!A1:E10'  # header probe
+    # 日期 alone, then 支付金额 + 访客数 as one span; 备注 / 活动节点 are never read
+    assert sorted(fake.ranges[1:]) == sorted(['sheet!A1:A5', 'sheet!C1:D5', 'sheet!A6:A8', 'sheet!C6:D8'])
+    assert values == [[row[0], row[2], row[3]] for row in GRID]
+
+
+def test_unknown_columns_read_the_whole_width(monkeypatch):
+    feishu, fake = service(monkeypatch, chunk_rows=10)
+    assert feishu._read_sheet_chunked('token', 'sheet', columns=['不存在'], meta=META) == GRID
+    assert fake.ranges[1:] == ['sheet!A1:E8']
+
+
+def test_missing_metainfo_raises_instead_of_reading_a_fixed_window(monkeypatch):
+    feishu, fake = service(monkeypatch, chunk_rows=3)
+    monkeypatch.setattr(feishu, 'get_sheet_meta', lambda token, sheet_id: None)
+
+    with pytest.raises(RuntimeError, match='Metainfo unavailable'):
+        feishu.get_sheet_data('token', 'sheet')
+    assert fake.ranges == []
+
+
+class FakeAuth:
+    """ Transport stand-in: counts token requests, rejects GETs made with a token in `rejected` """
+    scheduler = None
+
+    def __init__(self, expire=7200, delay=0, reject_code=99991663):
+        self.expire = expire
+        self.delay = delay
+        self.reject_code = reject_code
+        self.issued = 0
+        self.rejected = set()
+        self.gets = []
+
+    def request_json(self, method, url, headers=None, params=None, json=None, priority=None):
+        if method == 'POST':
+            time.sleep(self.delay)
+            self.issued += 1
+            return {"code": 0, "tenant_access_token": f"t{self.issued}", "expire": self.expire}
+        token = headers['Authorization'].split()[-1]
+        self.gets.append(token)
+        if token in self.rejected:
+            return {"code": self.reject_code, "msg": "invalid access token"}
+        return {"code": 0, "data": {}}
+
+
+def test_concurrent_callers_share_one_token_refresh():
+    auth = FakeAuth(delay=0.05)
+    manager = TenantTokenManager('http://feishu', 'app', 'secret', auth)
+    barrier = threading.Barrier(8)
+    tokens = []
+
+    def call():
+        barrier.wait()
+        tokens.append(manager.get_token())
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert auth.issued == 1
+    assert tokens == ['t1'] * 8
+
+
+def test_token_is_refreshed_within_the_margin_before_expiry(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(feishu_service, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    auth = FakeAuth(expire=7200)
+    manager = TenantTokenManager('http://feishu', 'app', 'secret', auth)
+
+    assert manager.get_token() == 't1'
+    clock[0] += 7200 - 301
+    assert manager.get_token() == 't1'
+    clock[0] += 2  # 299s left: inside the 300s margin
+    assert manager.get_token() == 't2'
+    assert auth.issued == 2
+
+
+@pytest.mark.parametrize('code', [99991663, 99991664])
+def test_rejected_token_is_refreshed_once_and_retried(code):
+    auth = FakeAuth(reject_code=code)
+    feishu = FeishuSheetService('app', 'secret')
+    feishu.transport = auth
+    feishu.token_manager = TenantTokenManager('http://feishu', 'app', 'secret', auth)
+    feishu.token_manager.get_token()
+    auth.rejected.add('t1')
+
+    assert feishu._get_json('http://feishu/sheets/v2/spreadsheets/x/metainfo')['code'] == 0
+    assert auth.issued == 2
+    assert auth.gets == ['t1', 't2']
+    # A second caller that still holds the rejected token reuses the refreshed one
+    assert feishu.token_manager.get_token(stale_token='t1') == 't2'
+    assert auth.issued == 2
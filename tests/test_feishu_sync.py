@@ -0,0 +1,81 @@
+import pytest
+
+from database import db
+from feishu_service import FeishuSheetService
+from models import FeishuSheetRow, FeishuSyncState
+from services import FeishuAnalyticsService, FeishuSyncService
+
+# Header order deliberately not alphabetical; a trailing column no row fills
+RAW = [
+    ['飞书销售数据', None, None, None, None],
+    ['日期', '支付金额', '访客数', '备注', '活动节点'],
+    ['2024-01-01', 100, 10, 'a'],
+    ['2024-01-02', 200.5, 20, None, '大促'],
+    ['2024-01-02', 50, 5],
+]
+
+
+@pytest.fixture
+def feishu(app_module, monkeypatch):
+    service = FeishuSheetService('app', 'secret')
+    monkeypatch.setattr(service, 'get_sheet_meta', lambda token, sheet_id: {"revision": 3})
+    monkeypatch.setattr(service, 'get_sheet_data', lambda token, sheet_id, meta=None: RAW)
+    with app_module.app.app_context():
+        yield service
+        db.session.query(FeishuSheetRow).filter_by(spreadsheet_token='sync-test').delete()
+        db.session.query(FeishuSyncState).filter_by(spreadsheet_token='sync-test').delete()
+        db.session.commit()
+
+
+def test_mirrored_table_matches_the_direct_read(feishu):
+    assert FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')['status'] == 'synced'
+    direct = feishu.parse_to_table(RAW, FeishuAnalyticsService.SCHEMA)
+    mirrored = FeishuSyncService.load_table('sync-test', 'sheet', FeishuAnalyticsService.SCHEMA)
+
+    assert mirrored.headers == direct.headers == ['日期', '支付金额', '访客数', '备注', '活动节点']
+    assert mirrored.to_records() == direct.to_records()
+    assert mirrored.version == direct.version
+
+
+def test_projected_columns_keep_sheet_order(feishu):
+    FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')
+    table = FeishuSyncService.load_table('sync-test', 'sheet', columns=('访客数', '日期'))
+    assert table.headers == ['日期', '访客数']
+
+
+def test_mirror_without_header_order_resyncs_once(feishu):
+    FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')
+    state = FeishuSyncState.query.filter_by(spreadsheet_token='sync-test').one()
+    state.headers = None  # synced before the column existed
+    db.session.commit()
+
+    assert FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')['status'] == 'synced'
+    assert FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')['status'] == 'unchanged'
+
+
+def test_missing_metainfo_keeps_the_mirror(feishu, monkeypatch):
+    FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet')
+    monkeypatch.setattr(feishu, 'get_sheet_meta', lambda token, sheet_id: None)
+
+    with pytest.raises(RuntimeError, match='Metainfo unavailable'):
+        FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet', force=True)
+    assert FeishuSheetRow.query.filter_by(spreadsheet_token='sync-test').count() == 3
+
+
+def test_mirror_is_reloaded_only_when_the_revision_moves(app_module, feishu, monkeypatch):
+    key = ('sync-test', 'sheet', '*')
+    loads = []
+    load_table = FeishuSyncService.load_table
+    monkeypatch.setattr(FeishuSyncService, 'load_table', lambda *args: loads.append(args) or load_table(*args))
+    try:
+        first = app_module.load_mirror_table(key, FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet'), ())
+        app_module.sheet_cache.put(key, first)
+        again = app_module.load_mirror_table(key, FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet'), ())
+        assert again is first and len(loads) == 1
+
+        monkeypatch.setattr(feishu, 'get_sheet_meta', lambda token, sheet_id: {"revision": 4})
+        moved = app_module.load_mirror_table(key, FeishuSyncService.sync_sheet(feishu, 'sync-test', 'sheet'), ())
+        assert moved is not first and len(loads) == 2
+        assert moved.to_records() == first.to_records()
+    finally:
+        app_module.sheet_cache.invalidate(key)
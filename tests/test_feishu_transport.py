@@ -0,0 +1,215 @@
+import time
+
+import pytest
+import requests
+
+import feishu_transport
+from feishu_scheduler import SchedulerTimeout
+from feishu_transport import CircuitBreaker, CircuitOpenError, FeishuTransport, FeishuTransportError
+
+URL = 'http://feishu.test/open-apis/sheets/v2/spreadsheets/token/values/sheet!A1:B2'
+RESET_TIMEOUT = 0.05
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = {"code": 0, "data": {}} if body is None else body
+
+    def json(self):
+        if isinstance(self._body, Exception):
+            raise self._body
+        return self._body
+
+
+class FakeSession:
+    """ Answers with the queued outcomes in order (an exception is raised) """
+    def __init__(self):
+        self.outcomes = []
+        self.calls = 0
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.timeouts = 0
+
+    def acquire(self, url, priority):
+        if self.timeouts:
+            self.timeouts -= 1
+            raise SchedulerTimeout("No Feishu rate limit token within 0s")
+        return 0.0
+
+
+@pytest.fixture
+def transport():
+    transport = FeishuTransport(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=RESET_TIMEOUT),
+                                scheduler=FakeScheduler())
+    transport.session = FakeSession()
+    return transport
+
+
+def open_breaker(transport):
+    transport.session.outcomes.append(requests.ConnectionError("refused"))
+    with pytest.raises(FeishuTransportError):
+        transport.request_json('GET', URL)
+    with pytest.raises(CircuitOpenError):
+        transport.request_json('GET', URL)
+    time.sleep(RESET_TIMEOUT * 1.5)
+
+
+def test_probe_queue_timeout_does_not_wedge_the_breaker(transport):
+    open_breaker(transport)
+
+    transport.scheduler.timeouts = 1
+    with pytest.raises(FeishuTransportError) as error:
+        transport.request_json('GET', URL)
+    assert not isinstance(error.value, CircuitOpenError)
+
+    transport.session.outcomes.append(FakeResponse())
+    assert transport.request_json('GET', URL)["code"] == 0
+    assert transport.breaker._opened_at is None
+
+
+def test_probe_retry_queue_timeout_reopens_then_recovers(transport):
+    open_breaker(transport)
+    transport.max_retries = 1
+    transport.backoff_max = 0
+
+    # The probe's first attempt fails, its retry times out in the queue
+    transport.session.outcomes.append(requests.ConnectionError("refused"))
+    acquired = []
+
+    def acquire(url, priority):
+        acquired.append(url)
+        if len(acquired) == 2:
+            raise SchedulerTimeout("No Feishu rate limit token within 0s")
+        return 0.0
+
+    transport.scheduler.acquire = acquire
+    with pytest.raises(FeishuTransportError):
+        transport.request_json('GET', URL)
+    with pytest.raises(CircuitOpenError):
+        transport.request_json('GET', URL)
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    transport.session.outcomes.append(FakeResponse())
+    assert transport.request_json('GET', URL)["code"] == 0
+
+
+@pytest.mark.parametrize('probe_error', [
+    requests.exceptions.InvalidURL("bad url"),
+    requests.exceptions.TooManyRedirects("loop"),
+])
+def test_non_retryable_request_errors_are_transport_errors(transport, probe_error):
+    open_breaker(transport)
+
+    transport.session.outcomes.append(probe_error)
+    with pytest.raises(FeishuTransportError):
+        transport.request_json('GET', URL)
+    # The failed probe re-opened the breaker instead of leaving it half-open
+    with pytest.raises(CircuitOpenError):
+        transport.request_json('GET', URL)
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    transport.session.outcomes.append(FakeResponse())
+    assert transport.request_json('GET', URL)["code"] == 0
+
+
+def test_interrupted_probe_frees_the_breaker(transport):
+    open_breaker(transport)
+
+    transport.session.outcomes.append(KeyboardInterrupt())
+    with pytest.raises(KeyboardInterrupt):
+        transport.request_json('GET', URL)
+
+    # No verdict: the next call probes right away
+    transport.session.outcomes.append(FakeResponse())
+    assert transport.request_json('GET', URL)["code"] == 0
+
+
+def test_non_json_body_counts_as_failure(transport):
+    transport.session.outcomes.append(FakeResponse(body=ValueError("<html>502 Bad Gateway</html>")))
+    with pytest.raises(FeishuTransportError):
+        transport.request_json('GET', URL)
+    with pytest.raises(CircuitOpenError):
+        transport.request_json('GET', URL)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """ Backoff delays, without waiting them out """
+    delays = []
+    monkeypatch.setattr(feishu_transport.time, 'sleep', delays.append)
+    return delays
+
+
+def retrying_transport(max_retries=3, failure_threshold=5):
+    transport = FeishuTransport(max_retries=max_retries, backoff_base=0.5, backoff_max=8,
+                                breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=30),
+                                scheduler=FakeScheduler())
+    transport.session = FakeSession()
+    return transport
+
+
+def test_transient_failures_are_retried_until_success(sleeps):
+    transport = retrying_transport()
+    transport.session.outcomes = [FakeResponse(503, {}), requests.ConnectionError("reset"),
+                                  FakeResponse(200, {"code": 99991400, "msg": "rate limited"}),
+                                  FakeResponse(200, {"code": 0, "data": {"ok": 1}})]
+
+    assert transport.request_json('GET', URL) == {"code": 0, "data": {"ok": 1}}
+    assert transport.session.calls == 4
+    # Full jitter: uniform in [0, min(backoff_max, base * 2^attempt)]
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= cap for delay, cap in zip(sleeps, (0.5, 1, 2)))
+
+
+def test_retry_after_is_honoured_and_capped(sleeps):
+    transport = retrying_transport(max_retries=2)
+    transport.session.outcomes = [FakeResponse(429, {}, headers={"Retry-After": "3"}),
+                                  FakeResponse(429, {}, headers={"Retry-After": "120"}),
+                                  FakeResponse()]
+
+    transport.request_json('GET', URL)
+
+    assert sleeps == [3.0, 8]
+
+
+def test_api_errors_and_client_errors_are_not_retried(sleeps):
+    transport = retrying_transport()
+    transport.session.outcomes = [FakeResponse(200, {"code": 1254040, "msg": "sheet not found"})]
+
+    assert transport.request_json('GET', URL)["code"] == 1254040
+    assert transport.session.calls == 1 and sleeps == []
+
+
+def test_exhausted_retries_open_the_breaker(sleeps):
+    transport = retrying_transport(max_retries=1, failure_threshold=2)
+    transport.session.outcomes = [FakeResponse(502, {})] * 4
+
+    for _ in range(2):
+        with pytest.raises(FeishuTransportError, match='failed after 2 attempts: HTTP 502'):
+            transport.request_json('GET', URL)
+    assert transport.session.calls == 4
+
+    with pytest.raises(CircuitOpenError):
+        transport.request_json('GET', URL)
+    assert transport.session.calls == 4
+
+
+def test_half_open_probe_success_closes_the_breaker(transport):
+    open_breaker(transport)
+    transport.session.outcomes = [FakeResponse(), FakeResponse()]
+
+    transport.request_json('GET', URL)
+    transport.request_json('GET', URL)
+
+    assert transport.session.calls == 3
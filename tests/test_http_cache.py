@@ -0,0 +1,36 @@
+import pytest
+
+from feishu_transport import FeishuTransportError
+
+
+class UnreachableFeishu:
+    """ FeishuSheetService stand-in: every sheet read fails like an exhausted retry cycle """
+    reads = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_sheet_data(self, *args, **kwargs):
+        UnreachableFeishu.reads += 1
+        raise FeishuTransportError("GET sheet failed after 4 attempts: ConnectionError")
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'FeishuSheetService', UnreachableFeishu)
+    monkeypatch.setattr(UnreachableFeishu, 'reads', 0)
+    app_module.sheet_cache.invalidate()
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize('url', [
+    '/api/sales/compare?source=feishu',
+    '/api/feishu/overview',
+    '/api/dashboard/live',
+])
+def test_failing_version_reads_upstream_once(client, url):
+    response = client.get(url)
+    assert response.status_code == 500
+    assert 'failed after 4 attempts' in response.get_json()['error']
+    assert UnreachableFeishu.reads == 1
+    assert 'ETag' not in response.headers
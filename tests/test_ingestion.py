@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from database import db
+from models import DailySales, SalesRollup
+from services import IngestionService, RollupService
+
+CATEGORY = '导入测试'
+
+
+def row(day, amount, category=CATEGORY):
+    return {"date": date(2030, 1, day) if day else None, "category": category, "payment_amount": amount}
+
+
+def stored():
+    return sorted((r.date.day if r.date else 0, r.category, r.payment_amount)
+                  for r in DailySales.query.filter(DailySales.category.in_([CATEGORY, '其他'])))
+
+
+@pytest.fixture
+def session(app_module):
+    with app_module.app.app_context():
+        yield db.session
+        db.session.rollback()
+        db.session.query(DailySales).filter(DailySales.category.in_([CATEGORY, '其他'])).delete()
+        db.session.commit()
+        RollupService.rebuild()
+
+
+@pytest.fixture
+def deletes(session):
+    """ DELETE statements sent to daily_sales """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('DELETE FROM daily_sales'):
+            statements.append(statement)
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_upsert_replaces_keys_in_batches(session, deletes, monkeypatch):
+    monkeypatch.setattr(IngestionService, 'KEY_BATCH', 2)
+    session.add_all(DailySales(**r) for r in [row(1, 1), row(4, 4), row(5, 5), row(1, 9, '其他')])
+    session.commit()
+    RollupService.rebuild()
+
+    chunks = [[row(1, 10), row(2, 20), row(3, 30)],
+              # (3, CATEGORY) was replaced by the first chunk: this import's row is kept
+              [row(3, 31), row(4, 40), row(None, 99)]]
+    written = IngestionService.write_rows(iter(chunks), mode='upsert')
+    session.commit()
+
+    assert written == 5
+    assert stored() == [(1, '其他', 9), (1, CATEGORY, 10), (2, CATEGORY, 20), (3, CATEGORY, 30),
+                        (3, CATEGORY, 31), (4, CATEGORY, 40), (5, CATEGORY, 5)]
+    # 3 new keys in two batches of <= 2, then the one new key of the second chunk
+    assert len(deletes) == 3
+    # The touched periods are re-rolled in the same transaction
+    assert RollupService.available()
+    month = SalesRollup.query.filter_by(grain='month', category=CATEGORY).one()
+    assert month.payment_amount == 10 + 20 + 30 + 31 + 40 + 5
+
+
+def test_append_keeps_existing_rows(session):
+    session.add(DailySales(**row(1, 1)))
+    session.commit()
+
+    assert IngestionService.write_rows(iter([[row(1, 10), row(None, 3)]]), mode='append') == 2
+    session.commit()
+    assert stored() == [(0, CATEGORY, 3), (1, CATEGORY, 1), (1, CATEGORY, 10)]
@@ -0,0 +1,96 @@
+import re
+import threading
+import time
+
+from flask import Flask, jsonify
+
+import metrics
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? -?[0-9.e+-]+$')
+
+
+def stage_count(stage):
+    series = metrics.STAGE_SECONDS._values.get((stage,))
+    return series[2] if series else 0
+
+
+def test_nested_spans_of_a_stage_count_once():
+    token = metrics._request_spans.set({})
+    try:
+        before = stage_count('test_nested')
+        with metrics.span('test_nested'):
+            with metrics.span('test_nested'):
+                with metrics.span('test_inner'):
+                    pass
+        spans = metrics._request_spans.get()
+    finally:
+        metrics._request_spans.reset(token)
+
+    assert stage_count('test_nested') == before + 1
+    assert spans['test_nested'][1] == 1 and spans['test_inner'][1] == 1
+    assert spans['test_nested'][0] >= spans['test_inner'][0]
+
+
+def test_request_spans_are_isolated_between_threads():
+    barrier = threading.Barrier(2)
+    seen = {}
+
+    def request(name, delay):
+        metrics._request_spans.set({})
+        barrier.wait()
+        with metrics.span(name):
+            barrier.wait()
+            time.sleep(delay)
+        seen[name] = metrics._request_spans.get()
+
+    threads = [threading.Thread(target=request, args=('test_a', 0.01)),
+               threading.Thread(target=request, args=('test_b', 0.05))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(seen['test_a']) == {'test_a'} and set(seen['test_b']) == {'test_b'}
+    assert seen['test_b']['test_b'][0] >= 0.05 > seen['test_a']['test_a'][0]
+    assert metrics._request_spans.get() is None
+
+
+def test_server_timing_header_lists_each_stage():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/work')
+    def work():
+        for _ in range(2):
+            with metrics.span('parse'):
+                pass
+        return jsonify({"ok": True})
+
+    header = app.test_client().get('/work').headers['Server-Timing']
+
+    entries = [entry.strip() for entry in header.split(',')]
+    assert re.fullmatch(r'parse;dur=\d+\.\d;desc="x2"', entries[0])
+    assert re.fullmatch(r'serialize;dur=\d+\.\d', entries[1])
+    assert re.fullmatch(r'total;dur=\d+\.\d', entries[-1])
+
+
+def test_metrics_endpoint_is_prometheus_text(app_module):
+    client = app_module.app.test_client()
+    client.get('/metrics')
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'version=0.0.4' in response.headers['Content-Type']
+    lines = response.get_data(as_text=True).splitlines()
+    for name in ('http_request_duration_seconds', 'stage_duration_seconds', 'feishu_requests_total', 'sheet_rows'):
+        assert f'# TYPE {name} ' in '\n'.join(lines)
+    for line in lines:
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or SAMPLE_RE.match(line), line
+
+    route = 'route="/metrics",method="GET",status="200"'
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines
+               if line.startswith('http_request_duration_seconds_bucket{') and route in line]
+    count = next(int(line.rsplit(' ', 1)[1]) for line in lines
+                 if line.startswith('http_request_duration_seconds_count{') and route in line)
+    assert buckets == sorted(buckets) and buckets[-1] == count >= 1
@@ -0,0 +1,121 @@
+import sqlite3
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from database import db
+from migrations import RATE_COLUMNS, schema_current, upgrade_schema
+from models import DailySales, FeishuSyncState, SalesRollup
+from sheet_table import clean_column
+
+COLUMNS = [c.name for c in DailySales.__table__.columns]
+
+
+def legacy_db(path, rows):
+    """ daily_sales as the old schema stored it: date and rate columns as text """
+    types = {name: 'VARCHAR' if name == 'date' or name in RATE_COLUMNS else 'FLOAT' for name in COLUMNS}
+    types.update(id='INTEGER PRIMARY KEY', category='VARCHAR')
+    con = sqlite3.connect(path)
+    con.execute(f"CREATE TABLE daily_sales ({', '.join(f'{n} {t}' for n, t in types.items())})")
+    for row in rows:
+        con.execute(f"INSERT INTO daily_sales ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    list(row.values()))
+    con.commit()
+    con.close()
+
+
+@pytest.fixture
+def migrate(tmp_path):
+    def run(rows):
+        path = str(tmp_path / 'legacy.db')
+        legacy_db(path, rows)
+        app = Flask('migration_test')
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+        db.init_app(app)
+        ctx = app.app_context()
+        ctx.push()
+        db.create_all()
+        assert not schema_current()
+        upgrade_schema()
+        return ctx
+    contexts = []
+    yield lambda rows: contexts.append(run(rows))
+    for ctx in contexts:
+        db.session.remove()
+        ctx.pop()
+
+
+def test_mixed_dates_and_percent_rates(migrate):
+    migrate([
+        {"date": '2024-01-05', "category": '彩妆', "payment_amount": 10, "pay_conversion_rate": '12.5%'},
+        {"date": '2024/1/6', "category": '彩妆', "payment_amount": 20, "pay_conversion_rate": '0.2'},
+        {"date": '2024年1月7日', "category": '个护', "payment_amount": 30, "consult_rate": ' 1,000% '},
+        {"date": 'nan', "category": '个护', "payment_amount": 40, "dispute_rate": 'abc'},
+    ])
+
+    assert schema_current()
+    rows = DailySales.query.order_by(DailySales.id).all()
+    assert [row.date for row in rows] == [date(2024, 1, 5), date(2024, 1, 6), date(2024, 1, 7), None]
+    assert rows[0].pay_conversion_rate == pytest.approx(0.125)
+    assert rows[1].pay_conversion_rate == pytest.approx(0.2)
+    assert rows[2].consult_rate == pytest.approx(10.0)
+    assert rows[3].dispute_rate == 0.0
+    assert [row.payment_amount for row in rows] == [10, 20, 30, 40]
+    # 'nan' is an empty date, not a parse failure: the old table is dropped
+    assert 'daily_sales_unmigrated' not in inspect(db.engine).get_table_names()
+    assert 'daily_sales_old' not in inspect(db.engine).get_table_names()
+    # Rollups are rebuilt from the migrated rows
+    month = SalesRollup.query.filter_by(grain='month').all()
+    assert sum(row.payment_amount for row in month) == 60
+
+
+def test_rates_follow_the_ingest_percent_rule(migrate):
+    raw = ['5', '12.5%', '0.3', '1', '150', ' 2,000 ']
+    migrate([{"date": '2024-01-05', "category": '彩妆', "payment_amount": 1, "pay_conversion_rate": value}
+             for value in raw])
+
+    rates = [row.pay_conversion_rate for row in DailySales.query.order_by(DailySales.id)]
+    assert rates == pytest.approx(clean_column(raw, 'percent').tolist())
+    assert rates == pytest.approx([0.05, 0.125, 0.3, 1.0, 1.5, 20.0])
+
+
+def test_unparseable_dates_keep_the_old_table(migrate, capsys):
+    migrate([
+        {"date": '2024-01-05', "category": '彩妆', "payment_amount": 10},
+        {"date": 'last tuesday', "category": '彩妆', "payment_amount": 20},
+    ])
+
+    rows = DailySales.query.order_by(DailySales.id).all()
+    assert [row.date for row in rows] == [date(2024, 1, 5), None]
+    assert [row.payment_amount for row in rows] == [10, 20]
+    assert 'daily_sales_unmigrated' in inspect(db.engine).get_table_names()
+    kept = db.session.execute(text("SELECT date FROM daily_sales_unmigrated ORDER BY id")).scalars().all()
+    assert kept == ['2024-01-05', 'last tuesday']
+    assert "'last tuesday'" in capsys.readouterr().out
+
+    # A second run is a no-op
+    upgrade_schema()
+    assert DailySales.query.count() == 2
+
+
+def test_added_columns_are_created(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE feishu_sync_state (id INTEGER PRIMARY KEY, spreadsheet_token VARCHAR NOT NULL, "
+                "sheet_id VARCHAR NOT NULL, revision INTEGER, row_count INTEGER, synced_at DATETIME)")
+    con.execute("INSERT INTO feishu_sync_state (spreadsheet_token, sheet_id, revision) VALUES ('t', 's', 3)")
+    con.commit()
+    con.close()
+
+    app = Flask('migration_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        assert not schema_current()
+        upgrade_schema()
+        assert schema_current()
+        assert FeishuSyncState.query.one().headers is None
+        db.session.remove()
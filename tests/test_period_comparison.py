@@ -0,0 +1,119 @@
+from datetime import date
+
+import pytest
+
+from database import db
+from models import DailySales, SalesRollup
+from services import (AnalyticsService, DuckDBAnalyticsBackend, FeishuAnalyticsService, RollupService,
+                      SQLiteAnalyticsBackend)
+from sheet_table import SheetTable
+
+# No sales in the week of 2024-01-08 nor in February
+SALES = [
+    (date(2024, 1, 1), 100.0),
+    (date(2024, 1, 3), 50.0),
+    (date(2024, 1, 17), 200.0),
+    (date(2024, 1, 22), 300.0),
+    (date(2024, 3, 5), 400.0),
+]
+
+# (period, previous_period, sales, sales_previous, sales_change)
+EXPECTED = {
+    'week': [
+        ('2024-01-01', '2023-12-25', 150.0, None, None),
+        ('2024-01-15', '2024-01-08', 200.0, None, None),
+        ('2024-01-22', '2024-01-15', 300.0, 200.0, 100.0),
+        ('2024-03-04', '2024-02-26', 400.0, None, None),
+    ],
+    'month': [
+        ('2024-01-01', '2023-12-01', 650.0, None, None),
+        ('2024-03-01', '2024-02-01', 400.0, None, None),
+    ],
+    'day': [
+        ('2024-01-01', '2023-12-31', 100.0, None, None),
+        ('2024-01-03', '2024-01-02', 50.0, None, None),
+        ('2024-01-17', '2024-01-16', 200.0, None, None),
+        ('2024-01-22', '2024-01-21', 300.0, None, None),
+        ('2024-03-05', '2024-03-04', 400.0, None, None),
+    ],
+}
+
+
+def summary(rows):
+    return [(r['period'], r['previous_period'], r['sales'], r['sales_previous'], r['sales_change']) for r in rows]
+
+
+@pytest.fixture(scope='module')
+def gapped_sales(app_module):
+    with app_module.app.app_context():
+        db.session.query(DailySales).delete()
+        db.session.query(SalesRollup).delete()
+        db.session.add_all(DailySales(date=day, category='彩妆', payment_amount=sales, visitors=10, order_count=1)
+                           for day, sales in SALES)
+        db.session.commit()
+        RollupService.rebuild()
+        yield app_module
+
+
+@pytest.fixture(params=['sqlite-rollup', 'sqlite-scan', 'duckdb'])
+def backend(request, gapped_sales, tmp_path, monkeypatch):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+        backend = DuckDBAnalyticsBackend(str(tmp_path / 'daily_sales.parquet'))
+        backend.refresh()
+    else:
+        backend = SQLiteAnalyticsBackend()
+        if request.param == 'sqlite-scan':
+            monkeypatch.setattr(RollupService, 'available', staticmethod(lambda: False))
+        else:
+            assert RollupService.available()
+    monkeypatch.setattr(AnalyticsService, 'backend', backend)
+    return backend
+
+
+@pytest.mark.parametrize('grain', ['week', 'month', 'day'])
+def test_missing_periods_are_not_compared(backend, grain):
+    assert summary(AnalyticsService.get_period_comparison(grain=grain)) == EXPECTED[grain]
+
+
+@pytest.mark.parametrize('grain', ['week', 'month', 'day'])
+def test_sheet_table_missing_periods_are_not_compared(grain):
+    table = SheetTable.from_rows(['日期', '支付金额', '访客数', '支付子订单数'],
+                                 [[day.isoformat(), sales, 10, 1] for day, sales in SALES],
+                                 FeishuAnalyticsService.SCHEMA)
+    assert summary(FeishuAnalyticsService.get_comparison(table, grain)) == EXPECTED[grain]
+
+
+def test_lag_counts_calendar_periods(backend):
+    # 同比-style lag: 2024-01-22 against the week two weeks earlier (no sales), not two rows back
+    rows = AnalyticsService.get_period_comparison(grain='week', lag=2, start=date(2024, 1, 20))
+    assert summary(rows) == [
+        ('2024-01-15', '2024-01-01', 200.0, 150.0, 50.0),
+        ('2024-01-22', '2024-01-08', 300.0, None, None),
+        ('2024-03-04', '2024-02-19', 400.0, None, None),
+    ]
+
+
+def sales_table(sales=SALES):
+    return SheetTable.from_rows(['日期', '支付金额', '访客数', '支付子订单数'],
+                                [[day.isoformat(), amount, 10, 1] for day, amount in sales],
+                                FeishuAnalyticsService.SCHEMA)
+
+
+def typed(rows):
+    return [{key: (value, type(value).__name__) for key, value in row.items()} for row in rows]
+
+
+def test_sheet_rows_match_sql_rows(backend):
+    table = sales_table()
+    assert typed(FeishuAnalyticsService.get_rolling(table, 7)) == typed(AnalyticsService.get_rolling(window=7))
+    for grain in ('week', 'month'):
+        assert typed(FeishuAnalyticsService.get_comparison(table, grain)) == \
+            typed(AnalyticsService.get_period_comparison(grain=grain))
+
+
+def test_sheet_rolling_sums_are_rounded():
+    table = sales_table([(date(2024, 1, 1), 0.1), (date(2024, 1, 2), 0.2)])
+    rows = FeishuAnalyticsService.get_rolling(table, 7)
+    assert [row['sales_sum'] for row in rows] == [0.1, 0.3]
+    assert [row['orders_sum'] for row in rows] == [1, 2]
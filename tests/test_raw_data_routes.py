@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from record_stream import StaleCursor, decode_cursor, encode_cursor
+from sheet_table import SheetTable
+
+HEADERS = ['日期', '支付金额', '访客数']
+
+
+def table(n, amount=10):
+    return SheetTable.from_rows(HEADERS, [[f'2024-01-{d:02d}', amount * d, d] for d in range(1, n + 1)])
+
+
+@pytest.fixture
+def serve(app_module):
+    """ Put a table in the sheet cache as the full /api/feishu/data table """
+    key = app_module.sheet_key(app_module.FEISHU_SHEET_ID, projected=False)
+
+    def put(t):
+        app_module.sheet_cache.put(key, t)
+        return t
+    yield put
+    app_module.sheet_cache.invalidate()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('abcdef0123456789ffff', 1500)
+    assert decode_cursor(cursor, 'abcdef0123456789ffff') == 1500
+    assert decode_cursor(None, 'whatever') == 0
+    with pytest.raises(StaleCursor):
+        decode_cursor(cursor, '0000000000000000ffff')
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor', 'abcdef0123456789ffff')
+
+
+def test_pages_follow_the_cursor_to_the_end(serve, client):
+    full = serve(table(5))
+    rows, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/feishu/data', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        assert response.headers['X-Total-Count'] == '5'
+        rows += response.get_json()
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+        assert f'cursor={cursor}' in response.headers['Link']
+    assert pages == 3
+    assert rows == full.to_records()
+
+
+def test_ndjson_with_column_selection(serve, client):
+    serve(table(3))
+    response = client.get('/api/feishu/data?format=ndjson&columns=日期,访客数')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == [{'日期': f'2024-01-0{d}', '访客数': d} for d in (1, 2, 3)]
+
+
+def test_cursor_from_an_older_version_is_a_conflict(serve, client):
+    serve(table(5))
+    cursor = client.get('/api/feishu/data?limit=2').headers['X-Next-Cursor']
+    serve(table(5, amount=11))
+
+    response = client.get(f'/api/feishu/data?limit=2&cursor={cursor}')
+    assert response.status_code == 409
+    assert 'changed' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('query', ['columns=日期,不存在', 'limit=0', 'limit=abc', 'cursor=!!!'])
+def test_bad_parameters_are_rejected(serve, client, query):
+    serve(table(3))
+    response = client.get(f'/api/feishu/data?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from sheet_cache import SheetCache
+
+CALLERS = 8
+
+
+def concurrent_gets(cache, loader):
+    """ CALLERS threads calling cache.get at once: [(value, exception), ...] """
+    results = []
+    barrier = threading.Barrier(CALLERS)
+
+    def call():
+        barrier.wait()
+        try:
+            results.append((cache.get('sheet', loader), None))
+        except Exception as e:
+            results.append((None, e))
+
+    threads = [threading.Thread(target=call) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_failing_loader_is_called_once_for_concurrent_misses():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)  # long enough for every caller to queue behind the owner
+        raise ConnectionError("Feishu unreachable")
+
+    results = concurrent_gets(SheetCache(), loader)
+    assert len(calls) == 1
+    assert len(results) == CALLERS
+    assert all(isinstance(error, ConnectionError) for _, error in results)
+
+
+def test_concurrent_misses_share_one_load():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'table'
+
+    results = concurrent_gets(SheetCache(), loader)
+    assert len(calls) == 1
+    assert results == [('table', None)] * CALLERS
+
+
+def test_next_miss_after_a_failure_loads_again():
+    cache = SheetCache()
+
+    def failing():
+        raise ConnectionError("Feishu unreachable")
+
+    with pytest.raises(ConnectionError):
+        cache.get('sheet', failing)
+    assert cache.get('sheet', lambda: 'table') == 'table'
+
+
+def wait_for_refresh(cache, key='sheet'):
+    deadline = time.monotonic() + 2
+    while cache._entries[key].refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_failed_refresh_backs_off_before_calling_upstream_again(monkeypatch):
+    cache = SheetCache(ttl=10, retry_after=30)
+    cache.seed('sheet', 'snapshot')
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ConnectionError("Feishu unreachable")
+
+    assert cache.get('sheet', failing) == 'snapshot'
+    wait_for_refresh(cache)
+    assert len(calls) == 1
+
+    # Every stale read during the outage keeps serving the old value without new upstream calls
+    for _ in range(5):
+        assert cache.get('sheet', failing) == 'snapshot'
+    assert len(calls) == 1
+
+    # Once the backoff has passed, the next stale read tries again
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+    assert cache.get('sheet', lambda: 'table') == 'snapshot'
+    monkeypatch.undo()
+    wait_for_refresh(cache)
+    assert cache.get('sheet', failing) == 'table'
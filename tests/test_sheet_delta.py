@@ -0,0 +1,71 @@
+from sheet_delta import SheetDeltaLog
+from sheet_table import SheetTable
+
+HEADERS = ['日期', '销售额']
+
+
+def table(rows):
+    return SheetTable.from_rows(HEADERS, rows)
+
+
+def test_delta_reports_inserts_updates_and_deletes():
+    log = SheetDeltaLog(key_columns=('日期',))
+    old = table([['2024-01-01', 10], ['2024-01-02', 20], ['2024-01-03', 30]])
+    log.record('s', old)
+    new = table([['2024-01-01', 10], ['2024-01-02', 25], ['2024-01-04', 40]])
+
+    delta = log.delta('s', new, since=old.version)
+
+    assert delta['reset'] is False
+    assert delta['revision'] == new.version and delta['since'] == old.version
+    assert delta['inserted'] == [{"key": '2024-01-04#0', "row": {'日期': '2024-01-04', '销售额': 40}}]
+    assert delta['updated'] == [{"key": '2024-01-02#0', "row": {'日期': '2024-01-02', '销售额': 25}}]
+    assert delta['deleted'] == ['2024-01-03#0']
+
+
+def test_delta_sees_edits_that_hash_equal():
+    # hash(-1) == hash(-2) and 1 == 1.0 == True for hash()
+    for before, after in ((-1, -2), (1, True), (1, 1.0)):
+        log = SheetDeltaLog(key_columns=('日期',))
+        old = table([['2024-01-01', before]])
+        log.record('s', old)
+        delta = log.delta('s', table([['2024-01-01', after]]), since=old.version)
+        assert [entry['key'] for entry in delta['updated']] == ['2024-01-01#0'], (before, after)
+
+
+def test_expired_since_resets():
+    log = SheetDeltaLog(key_columns=('日期',), keep=2)
+    first = table([['2024-01-01', 1]])
+    log.record('s', first)
+    for n in range(2, 5):
+        log.record('s', table([['2024-01-01', n]]))
+    current = table([['2024-01-01', 9], ['2024-01-02', 10]])
+
+    delta = log.delta('s', current, since=first.version, columns=['销售额'])
+
+    assert delta['reset'] is True
+    assert delta['inserted'] == [{"key": '2024-01-01#0', "row": {'销售额': 9}},
+                                 {"key": '2024-01-02#0', "row": {'销售额': 10}}]
+    assert delta['updated'] == [] and delta['deleted'] == []
+
+
+def test_since_from_another_worker_diffs_through_the_shared_log(tmp_path):
+    old = table([['2024-01-01', 10], ['2024-01-02', 20]])
+    SheetDeltaLog(key_columns=('日期',), root=str(tmp_path)).record('s', old)
+    # A worker that never served `old` itself
+    other = SheetDeltaLog(key_columns=('日期',), root=str(tmp_path))
+
+    delta = other.delta('s', table([['2024-01-01', 10], ['2024-01-02', 21]]), since=old.version)
+
+    assert delta['reset'] is False
+    assert delta['updated'] == [{"key": '2024-01-02#0', "row": {'日期': '2024-01-02', '销售额': 21}}]
+    assert delta['inserted'] == [] and delta['deleted'] == []
+    assert other.delta('s', old, since='../../etc/passwd')['reset'] is True
+
+
+def test_persisted_versions_are_pruned(tmp_path):
+    log = SheetDeltaLog(key_columns=('日期',), root=str(tmp_path), keep_persisted=2)
+    for n in range(4):
+        log.record('s', table([['2024-01-01', n]]))
+
+    assert len(list((tmp_path / 's').iterdir())) == 2
@@ -0,0 +1,44 @@
+import os
+import runpy
+
+from sheet_snapshot import KEEP_SNAPSHOTS, SnapshotStore
+from sheet_table import ColumnSpec, SheetTable
+
+KEY = ('token', 'sheet', '*')
+SCHEMA = [ColumnSpec('日期', 'date'), ColumnSpec('销售额', 'number')]
+
+
+def table(n):
+    return SheetTable.from_rows(['日期', '销售额', '备注'],
+                                [['2024-01-01', n, f'note {n}'], ['2024-01-02', n + 1, None]], SCHEMA)
+
+
+def test_loaded_snapshot_survives_pruning(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.save(KEY, table(1))
+    loaded = store.load(KEY)
+
+    # Another worker saves newer versions until this one is pruned
+    for n in range(2, KEEP_SNAPSHOTS + 3):
+        assert store.save(KEY, table(n))
+    assert not os.path.isdir(os.path.join(str(tmp_path), store.slug(KEY), loaded.version))
+
+    assert loaded.to_records() == table(1).to_records()
+    assert loaded.sum('销售额') == 3
+
+
+def test_gunicorn_worker_hook_seeds_snapshots(app_module, monkeypatch):
+    key = app_module.sheet_key(app_module.FEISHU_SHEET_ID, projected=False)
+    app_module.snapshots.save(key, table(1))
+    app_module.sheet_cache.invalidate()
+    monkeypatch.setattr(app_module, '_snapshots_seeded', False)
+    try:
+        # Requests don't load snapshots (nor do CLI commands): only the worker start hook does
+        assert app_module.app.test_client().get('/api/sales/overview').status_code == 200
+        assert key not in app_module.sheet_cache._entries
+
+        hooks = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+        hooks['post_worker_init'](worker=None)
+        assert app_module.sheet_cache._entries[key].value.version == table(1).version
+    finally:
+        app_module.sheet_cache.invalidate()
@@ -0,0 +1,64 @@
+import numpy as np
+
+from sheet_table import ColumnSpec, SheetTable, clean_column
+
+
+def test_number_strips_thousands_and_zeroes_error_sentinels():
+    values = clean_column(['1,234.5', 12, ' 7 ', '#DIV/0!', '######', '#N/A', '', None, '-', 'abc'], 'number')
+
+    assert values.dtype == np.float64
+    assert values[:6].tolist() == [1234.5, 12.0, 7.0, 0.0, 0.0, 0.0]
+    assert np.isnan(values[6:]).all()
+
+
+def test_percent_values_become_fractions():
+    values = clean_column(['12.5%', '0.3', '1,050%', 0.25, '#VALUE!', 'nan'], 'percent')
+
+    assert values[:5].tolist() == [0.125, 0.3, 10.5, 0.25, 0.0]
+    assert np.isnan(values[5])
+
+
+def test_bare_percentages_above_one_become_fractions():
+    values = clean_column(['5', 12.5, '1', 0.5, '100', '150%'], 'percent')
+
+    assert values.tolist() == [0.05, 0.125, 1.0, 0.5, 1.0, 1.5]
+
+
+def test_number_kind_keeps_percent_cells_as_written():
+    assert clean_column(['12.5%'], 'number').tolist() == [12.5]
+
+
+def test_dates_are_normalized_to_iso():
+    values = clean_column(['2024-01-05', '2024/1/6', '2024年1月7日', '2024年12月8', '2024-1-9 00:00:00',
+                           '', 'None', '统计日期'], 'date')
+
+    assert values.tolist() == ['2024-01-05', '2024-01-06', '2024-01-07', '2024-12-08', '2024-01-09',
+                               '', '', '统计日期']
+
+
+def test_text_blanks_empty_markers():
+    assert clean_column([' a ', None, 'nan', '--', 3], 'text').tolist() == ['a', '', '', '', '3']
+
+
+def test_table_aggregates_use_the_cleaned_columns():
+    table = SheetTable.from_rows(['日期', '支付金额', '转化率'],
+                                 [['2024/1/1', '1,000', '10%'], ['2024年1月2日', '#DIV/0!', '30%'], ['', '', '']],
+                                 [ColumnSpec('日期', 'date'), ColumnSpec('支付金额'), ColumnSpec('转化率', 'percent')])
+
+    assert table.sum('支付金额') == 1000
+    assert table.mean('转化率') == 0.2
+    assert table.column('日期').tolist() == ['2024-01-01', '2024-01-02', '']
+
+
+def test_live_panels_skip_undated_summary_rows():
+    from services import LiveAnalyticsService
+    headers = ['统计日期', '直播间GMV', '开播场次', 'UV价值', '店铺转化率']
+    rows = [['2024-01-01', '100', '1', '2', '10%'], ['2024-01-02', '300', '2', '4', '30%'],
+            ['合计', '', '', '', ''], ['', '400', '3', '3', '20%'], ['统计日期', '直播间GMV', '开播场次', 'UV价值', '店铺转化率']]
+    table = SheetTable.from_rows(headers, rows, LiveAnalyticsService.SCHEMA)
+
+    assert LiveAnalyticsService.get_overview(table)['total_gmv'] == 400
+    assert LiveAnalyticsService.get_overview(table)['total_sessions'] == 3
+    assert LiveAnalyticsService.get_metrics(table)['avg_uv_value'] == 3
+    assert LiveAnalyticsService.get_shop_metrics(table)['avg_shop_conversion'] == 20
+    assert table.sum('直播间GMV') == 800
@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+from sheet_refresher import EventBroker, SheetRefresher, StreamLimitReached
+
+THREADS = 4
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """ Fixed pool of request threads, like gunicorn --worker-class gthread --threads N """
+    def __init__(self, app, threads):
+        super().__init__('127.0.0.1', 0, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+@pytest.fixture
+def server(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'FEISHU_REFRESH_INTERVAL', 60)
+    monkeypatch.setattr(app_module.dashboard_events, 'max_streams', THREADS // 2)
+    monkeypatch.setattr(app_module.dashboard_events, 'max_lifetime', 2)
+    httpd = PooledWSGIServer(app_module.app, THREADS)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.pool.shutdown(wait=True)
+    httpd.server_close()
+
+
+def test_api_still_answers_with_more_streams_than_threads(server):
+    streams = []
+    try:
+        for _ in range(THREADS + 2):
+            streams.append(requests.get(f"{server}/api/dashboard/live/stream", stream=True, timeout=5))
+
+        statuses = [r.status_code for r in streams]
+        assert statuses.count(200) == THREADS // 2
+        assert statuses.count(503) == len(streams) - THREADS // 2
+        rejected = next(r for r in streams if r.status_code == 503)
+        assert rejected.headers['Retry-After']
+        assert rejected.text.startswith('retry: ')
+
+        response = requests.get(f"{server}/api/sales/overview", timeout=5)
+        assert response.status_code == 200
+    finally:
+        for r in streams:
+            r.close()
+
+
+def test_stream_slot_is_released_after_lifetime(server):
+    first = requests.get(f"{server}/api/dashboard/live/stream", stream=True, timeout=5)
+    second = requests.get(f"{server}/api/dashboard/live/stream", stream=True, timeout=5)
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert requests.get(f"{server}/api/dashboard/live/stream", timeout=5).status_code == 503
+
+    # Both streams end after max_lifetime; the server closes them
+    started = time.monotonic()
+    for r in (first, second):
+        assert r.content.startswith(b'retry: ')
+    assert time.monotonic() - started < 5
+
+    third = requests.get(f"{server}/api/dashboard/live/stream", stream=True, timeout=5)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_broker_cap_counts_every_channel():
+    broker = EventBroker(max_streams=2, max_lifetime=0.1)
+    a = broker.stream('live')
+    b = broker.stream('feishu')
+    with pytest.raises(StreamLimitReached):
+        broker.stream('live')
+
+    # Closing a stream that was never iterated still frees its slot
+    b.close()
+    assert broker.subscriber_count() == 1
+    broker.stream('feishu').close()
+
+    assert list(a) == ["retry: 5000\n\n"]
+    a.close()
+    assert broker.subscriber_count() == 0
+
+
+@pytest.mark.parametrize('interval, connects', [(60, True), (0, False)])
+def test_live_page_only_connects_when_streams_exist(app_module, monkeypatch, interval, connects):
+    monkeypatch.setattr(app_module, 'FEISHU_REFRESH_INTERVAL', interval)
+    page = app_module.app.test_client().get('/dashboard/live').get_data(as_text=True)
+    assert f"window.EventSource && {'true' if connects else 'false'}" in page
+
+
+def test_refresher_only_polls_while_someone_watches():
+    broker = EventBroker()
+    calls = []
+    refresher = SheetRefresher(lambda: calls.append(1) or {}, broker, interval=0.05)
+    refresher.ensure_started()
+    try:
+        time.sleep(0.3)
+        assert calls == []
+
+        q = broker.subscribe('live')
+        refresher.wake()
+        time.sleep(0.3)
+        assert 2 <= len(calls) <= 8
+
+        broker.unsubscribe('live', q)
+        time.sleep(0.1)
+        idle = len(calls)
+        time.sleep(0.3)
+        assert len(calls) == idle
+    finally:
+        refresher.stop()